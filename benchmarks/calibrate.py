@@ -0,0 +1,167 @@
+#!/usr/bin/python
+
+"""Calibration of the confidence of search results (see imdbtag/scoring.py).
+
+Scene-style names of random movies of the synthetic catalogue (see
+synthlib.py) are cleaned and searched for like imdbtag does, against a local
+fake TMDb server, and the best result is compared with the movie the name was
+made from. Some names have no year, and some are junk that should not match
+anything. The script prints, for ranges of confidence, how often the best
+result was right, and for thresholds of --auto-accept, how many names would be
+taken without asking (see scoring.acceptable()) and how many of those would
+be wrong:
+
+    $ python benchmarks/calibrate.py --names 2000
+"""
+
+import os
+import sys
+import getopt
+import random
+import shutil
+import logging
+import tempfile
+
+import synthlib
+import fakeserver
+
+# Upper bounds of the confidence ranges in the table.
+buckets = [0.5, 0.7, 0.8, 0.9, 0.95, 0.99, 1.0]
+
+# Thresholds of --auto-accept to evaluate.
+thresholds = [0.5, 0.7, 0.8, 0.9, 0.95]
+
+
+def usage():
+    print """Usage: calibrate.py [options]
+
+Options: -h      Display help text.
+         --names <n>
+                 Number of names to search for (default 1000).
+         --catalogue <n>
+                 Number of movies in the catalogue (default 10000).
+         --no-year <fraction>
+                 Fraction of names without a year (default 0.25).
+         --junk <fraction>
+                 Fraction of names that match no movie (default 0.05).
+         --seed <n>
+                 Seed for the names (default 1).
+"""
+
+
+def names(catalogue, count, no_year, junk, seed):
+    """Returns pairs (name, TMDb id or None) to search for."""
+    rnd = random.Random(seed)
+    out = []
+    for i in range(count):
+        if rnd.random() < junk:
+            out.append(('%s %d' % (rnd.choice(synthlib._junk), i), None))
+            continue
+        m = rnd.choice(catalogue.movies)
+        year = catalogue.year(m)
+        name = synthlib.scene_name(rnd, m, year)
+        if rnd.random() < no_year:
+            name = name.replace(' (%d)' % year, '').replace('.%d.' % year,
+                                                            '.')
+        out.append((name, str(m['id'])))
+    return out
+
+
+def calibrate(core, scoring, samples):
+    """Returns a list of triples (confidence, right, confirmed) for the
+    samples, where confirmed tells whether the year or the margin over the
+    runner-up confirms the best result (see scoring.acceptable())."""
+    results = []
+    for name, id in samples:
+        s = core._clean_name(name)
+        year = core._clean_year(name)
+        ranked = scoring.rank(s, year, core._imdb_query(s))
+        if not ranked:
+            # Nothing to accept; right if there was nothing to find.
+            continue
+        c, m = ranked[0]
+        results.append((c, m.id == id,
+                        scoring.acceptable(s, year, ranked, 0.0)))
+    return results
+
+
+def report(results, total):
+    print '%-12s %8s %9s' % ('confidence', 'names', 'accuracy')
+    low = 0.0
+    for high in buckets:
+        r = [right for c, right, confirmed in results
+             if low <= c < high or (high == 1.0 and c == 1.0)]
+        if r:
+            print '%4.2f - %4.2f  %8d %8.1f%%' % (
+                    low, high, len(r), 100.0 * sum(r) / len(r))
+        else:
+            print '%4.2f - %4.2f  %8d %9s' % (low, high, 0, '-')
+        low = high
+
+    print
+    print '%-12s %8s %9s' % ('threshold', 'accepted', 'wrong')
+    for t in thresholds:
+        r = [right for c, right, confirmed in results
+             if c >= t and confirmed]
+        wrong = len(r) - sum(r)
+        print '%-12.2f %7.1f%% %8.1f%%' % (
+                t, 100.0 * len(r) / total,
+                r and 100.0 * wrong / len(r) or 0.0)
+
+
+def main():
+    logging.basicConfig(format='%(message)s', level=logging.INFO)
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "h", [
+            "names=", "catalogue=", "no-year=", "junk=", "seed="])
+    except getopt.GetoptError, err:
+        logging.error(str(err))
+        usage()
+        sys.exit(2)
+
+    count = 1000
+    size = 10000
+    no_year = 0.25
+    junk = 0.05
+    seed = 1
+    for opt, val in opts:
+        if opt == "-h":
+            usage()
+            sys.exit()
+        elif opt == "--names":
+            count = int(val)
+        elif opt == "--catalogue":
+            size = int(val)
+        elif opt == "--no-year":
+            no_year = float(val)
+        elif opt == "--junk":
+            junk = float(val)
+        elif opt == "--seed":
+            seed = int(val)
+
+    catalogue = synthlib.Catalogue(size)
+    server = fakeserver.FakeTMDb(catalogue).start()
+    workdir = tempfile.mkdtemp(prefix='imdbtag-calibrate-')
+    try:
+        # imdbtag reads its configuration from ~/.imdbtagrc when it is
+        # imported.
+        fh = open(os.path.join(workdir, '.imdbtagrc'), 'w')
+        fh.write('[general]\napi_key = benchmark\napi_url = %s\n' %
+                 server.url)
+        fh.close()
+        os.environ['HOME'] = workdir
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from imdbtag import imdbtag as core
+        from imdbtag import scoring
+
+        samples = names(catalogue, count, no_year, junk, seed)
+        report(calibrate(core, scoring, samples), len(samples))
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/python
+
+"""A fake TMDb API server for the benchmarks.
+
+It serves canned responses built from a ``synthlib.Catalogue`` for the parts of
+the TMDb API that imdbtag uses, and delays every response by a configurable
+latency to mimic the real network. A fraction ``stall`` of the responses is
+delayed by ``stall_time`` more, to mimic a degraded endpoint.
+"""
+
+import re
+import time
+import json
+import random
+import threading
+import urlparse
+import BaseHTTPServer
+import SocketServer
+
+_results_per_page = 20
+
+
+class FakeTMDb(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, catalogue, latency=0.0, jitter=0.0, port=0, seed=0,
+                 stall=0.0, stall_time=0.0):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', port),
+                                           _Handler)
+        self.catalogue = catalogue
+        self.latency = latency
+        self.jitter = jitter
+        self.stall = stall
+        self.stall_time = stall_time
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = {}
+
+    @property
+    def url(self):
+        return 'http://%s:%d/3' % self.server_address
+
+    def start(self):
+        t = threading.Thread(target=self.serve_forever)
+        t.daemon = True
+        t.start()
+        return self
+
+    def count(self, endpoint):
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def total_requests(self):
+        with self.lock:
+            return sum(self.requests.values())
+
+    def reset_counts(self):
+        with self.lock:
+            self.requests = {}
+
+    def delay(self):
+        with self.lock:
+            d = self.latency + self.random.uniform(0, self.jitter)
+            if self.stall and self.random.random() < self.stall:
+                d += self.stall_time
+        if d > 0:
+            time.sleep(d)
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    # Routes: (regular expression on the path, method name)
+    routes = [
+        (r'^/3/configuration$', 'configuration'),
+        (r'^/3/search/movie$', 'search'),
+        (r'^/3/movie/changes$', 'changes'),
+        (r'^/3/movie/(\d+)$', 'movie'),
+        (r'^/3/find/(tt\d+)$', 'find'),
+        ]
+
+    def do_GET(self):
+        u = urlparse.urlparse(self.path)
+        query = dict((k, v[0]) for k, v in urlparse.parse_qs(u.query).items())
+        for pattern, name in self.routes:
+            m = re.match(pattern, u.path)
+            if m:
+                self.server.count(name)
+                self.server.delay()
+                status, body = getattr(self, name)(query, *m.groups())
+                break
+        else:
+            self.server.count('unknown')
+            status, body = 404, {'status_code': 34,
+                                 'status_message': 'Not found.'}
+        s = json.dumps(body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=utf-8')
+        self.send_header('Content-Length', str(len(s)))
+        self.end_headers()
+        self.wfile.write(s)
+
+    def log_message(self, format, *args):
+        pass
+
+    def configuration(self, query):
+        return 200, {'images': {
+            'base_url': 'http://image.tmdb.org/t/p/',
+            'backdrop_sizes': ['w300', 'w780', 'w1280', 'original'],
+            'poster_sizes': ['w92', 'w185', 'w500', 'original'],
+            'profile_sizes': ['w45', 'h632', 'original'],
+            }}
+
+    def search(self, query):
+        catalogue = self.server.catalogue
+        q = query.get('query', '').lower()
+        results = list(catalogue.by_title.get(q, []))
+        # Add some near misses, like the real search does: movies that share
+        # a word with the query.
+        for w in q.split():
+            for m in catalogue.by_word.get(w, [])[:_results_per_page]:
+                if m not in results:
+                    results.append(m)
+        # The catalogue has one release date per movie, so both filters are
+        # the same here.
+        year = query.get('primary_release_year') or query.get('year')
+        if year:
+            results = [m for m in results if m['release_date'][0:4] == year]
+        return 200, _page(results, int(query.get('page', 1)), _search_result)
+
+    def changes(self, query):
+        catalogue = self.server.catalogue
+        rnd = random.Random(query.get('start_date'))
+        changed = rnd.sample(catalogue.movies, len(catalogue.movies) // 100)
+        return 200, _page(changed, int(query.get('page', 1)),
+                          lambda m: {'id': m['id'], 'adult': False},
+                          per_page=100)
+
+    def movie(self, query, id):
+        m = self.server.catalogue.by_id.get(int(id))
+        if m is None:
+            return 404, {'status_code': 34,
+                         'status_message': 'The resource you requested could '
+                                           'not be found.'}
+        if 'credits' in query.get('append_to_response', '').split(','):
+            m = dict(m)
+            m['credits'] = {'cast': [], 'crew': [
+                {'job': 'Director', 'name': _director(m['id'])}]}
+        return 200, m
+
+
+    def find(self, query, id):
+        m = None
+        if query.get('external_source') == 'imdb_id':
+            m = self.server.catalogue.by_imdb_id.get(id)
+        return 200, {'movie_results': m is not None and [_search_result(m)]
+                     or [], 'person_results': [], 'tv_results': []}
+
+
+def _director(id):
+    # Deterministic, without changing the catalogue.
+    first = ['Ann', 'Bo', 'Carl', 'Dana', 'Eli', 'Fay', 'Gus']
+    last = ['Adler', 'Berg', 'Cohen', 'Diaz', 'Ernst', 'Frey', 'Gray', 'Hahn']
+    return '%s %s' % (first[id % len(first)], last[id % len(last)])
+
+
+def _search_result(m):
+    keys = ['id', 'title', 'original_title', 'release_date', 'vote_average',
+            'vote_count', 'popularity', 'adult']
+    return dict((k, m[k]) for k in keys)
+
+
+def _page(items, page, convert, per_page=_results_per_page):
+    start = (page - 1) * per_page
+    return {
+        'page': page,
+        'results': [convert(m) for m in items[start:start + per_page]],
+        'total_results': len(items),
+        'total_pages': max(1, (len(items) + per_page - 1) // per_page),
+        }
+
+
+if __name__ == "__main__":
+    import sys
+    import synthlib
+    port = len(sys.argv) > 1 and int(sys.argv[1]) or 8765
+    latency = len(sys.argv) > 2 and float(sys.argv[2]) or 0.0
+    server = FakeTMDb(synthlib.Catalogue(10000), latency=latency, port=port)
+    print "Serving fake TMDb API at " + server.url
+    server.serve_forever()
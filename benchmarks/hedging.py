@@ -0,0 +1,135 @@
+#!/usr/bin/python
+
+"""Latency of movie lookups, with and without hedged requests.
+
+Movies of the synthetic catalogue (see synthlib.py) are fetched one after the
+other from a local fake TMDb server, of which a fraction of the responses
+stall, like those of a degraded endpoint. This is done once with the plain
+TMDb backend and once hedged with TMDb itself (see imdbtag/apis/hedged.py).
+For both, the script prints the percentiles of the lookup latency, the total
+time and the number of requests:
+
+    $ python benchmarks/hedging.py --lookups 600 --stall 0.05
+"""
+
+import os
+import sys
+import time
+import getopt
+import random
+import shutil
+import logging
+import tempfile
+
+import synthlib
+import fakeserver
+
+
+def usage():
+    print """Usage: hedging.py [options]
+
+Options: -h      Display help text.
+         --lookups <n>
+                 Number of movies to fetch (default 600).
+         --latency <seconds>
+                 Latency of the fake server (default 0.02).
+         --jitter <seconds>
+                 Random extra latency of up to <seconds> (default 0.02).
+         --stall <fraction>
+                 Fraction of the responses that stall (default 0.05).
+         --stall-time <seconds>
+                 Extra latency of the responses that stall (default 1).
+         --hedge-after <seconds>
+                 Latency after which lookups are hedged (default 0.1).
+"""
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def measure(server, core, ids):
+    server.reset_counts()
+    latencies = []
+    start = time.time()
+    for id in ids:
+        t = time.time()
+        core.lookup_backend.api_get_movie(id)
+        latencies.append(time.time() - t)
+    total = time.time() - start
+    latencies.sort()
+    return latencies, total, server.total_requests()
+
+
+def main():
+    logging.basicConfig(format='%(message)s', level=logging.INFO)
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "h", [
+            "lookups=", "latency=", "jitter=", "stall=", "stall-time=",
+            "hedge-after="])
+    except getopt.GetoptError, err:
+        logging.error(str(err))
+        usage()
+        sys.exit(2)
+
+    count = 600
+    latency = 0.02
+    jitter = 0.02
+    stall = 0.05
+    stall_time = 1.0
+    hedgeafter = 0.1
+    for opt, val in opts:
+        if opt == "-h":
+            usage()
+            sys.exit()
+        elif opt == "--lookups":
+            count = int(val)
+        elif opt == "--latency":
+            latency = float(val)
+        elif opt == "--jitter":
+            jitter = float(val)
+        elif opt == "--stall":
+            stall = float(val)
+        elif opt == "--stall-time":
+            stall_time = float(val)
+        elif opt == "--hedge-after":
+            hedgeafter = float(val)
+
+    catalogue = synthlib.Catalogue(1000)
+    server = fakeserver.FakeTMDb(catalogue, latency=latency, jitter=jitter,
+                                 stall=stall, stall_time=stall_time).start()
+    workdir = tempfile.mkdtemp(prefix='imdbtag-hedging-')
+    try:
+        # imdbtag reads its configuration from ~/.imdbtagrc when it is
+        # imported.
+        fh = open(os.path.join(workdir, '.imdbtagrc'), 'w')
+        fh.write('[general]\napi_key = benchmark\napi_url = %s\n' %
+                 server.url)
+        fh.close()
+        os.environ['HOME'] = workdir
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from imdbtag import imdbtag as core
+
+        rnd = random.Random(1)
+        ids = [str(rnd.choice(catalogue.movies)['id']) for i in range(count)]
+
+        print '%-8s %8s %8s %8s %8s %8s %9s' % (
+                'lookups', 'p50', 'p90', 'p99', 'max', 'total', 'requests')
+        for label, hedge in [('plain', None), ('hedged', 'tmdb')]:
+            core.setConfig(offlinemode=True, quietmode=True, hedge=hedge,
+                           hedgeafter=hedgeafter)
+            latencies, total, requests = measure(server, core, ids)
+            print '%-8s %6.0fms %6.0fms %6.0fms %6.0fms %7.2fs %9d' % (
+                    label, 1000 * percentile(latencies, 50),
+                    1000 * percentile(latencies, 90),
+                    1000 * percentile(latencies, 99),
+                    1000 * latencies[-1], total, requests)
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/python
+
+"""Compatibility check and micro-benchmark of the release name parser.
+
+The parser (imdbtag/releasename.py) is checked on the names in
+releasenames.txt, which come with the expected title and year, and on
+synthetic scene names of the catalogue of the benchmarks (see synthlib.py),
+whose title and year are known. If PTN (parse-torrent-name) is installed, it
+is checked on the same names for comparison, and the names on which the two
+parsers differ are listed. Then the time per name is measured, for the first
+parse of a name and for the memoized ones, and for PTN:
+
+    $ python benchmarks/parser.py --names 10000
+
+The script exits with status 1 if the parser gets any name wrong.
+"""
+
+import os
+import sys
+import time
+import getopt
+import random
+
+import synthlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'imdbtag'))
+import releasename
+
+try:
+    import PTN
+except ImportError:
+    PTN = None
+
+corpus_file = os.path.join(os.path.dirname(__file__), 'releasenames.txt')
+
+
+def usage():
+    print """Usage: parser.py [options]
+
+Options: -h      Display help text.
+         --names <n>
+                 Number of synthetic names (default 10000).
+         --repeat <n>
+                 Number of times each name is parsed for the timing (default
+                 3).
+"""
+
+
+def corpus(count):
+    """Returns triples (name, title, year) of the names to check."""
+    out = []
+    fh = open(corpus_file, 'r')
+    for line in fh:
+        line = line.rstrip('\n')
+        if line and not line.startswith('#'):
+            name, title, year = line.split('\t')
+            out.append((name, title, year and int(year) or None))
+    fh.close()
+
+    rnd = random.Random(1)
+    catalogue = synthlib.Catalogue(1000)
+    for i in range(count):
+        m = rnd.choice(catalogue.movies)
+        year = catalogue.year(m)
+        out.append((synthlib.scene_name(rnd, m, year), m['title'], year))
+    return out
+
+
+def check(parse, names):
+    """Returns the names that ``parse`` gets wrong."""
+    wrong = []
+    for name, title, year in names:
+        info = parse(name)
+        if (info['title'], info.get('year')) != (title, year):
+            wrong.append(name)
+    return wrong
+
+
+def timing(parse, names, repeat):
+    """Returns the time per parse in microseconds."""
+    start = time.time()
+    for i in range(repeat):
+        for name in names:
+            parse(name)
+    return (time.time() - start) * 1e6 / (repeat * len(names))
+
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "h", ["names=", "repeat="])
+    except getopt.GetoptError, err:
+        sys.stderr.write(str(err) + '\n')
+        usage()
+        sys.exit(2)
+
+    count = 10000
+    repeat = 3
+    for opt, val in opts:
+        if opt == "-h":
+            usage()
+            sys.exit()
+        elif opt == "--names":
+            count = int(val)
+        elif opt == "--repeat":
+            repeat = int(val)
+
+    names = corpus(count)
+    wrong = check(releasename._parse, names)
+    print 'releasename: %d of %d names wrong' % (len(wrong), len(names))
+    for name in wrong:
+        print '    %s -> %r' % (name, releasename.parse(name))
+    if PTN is not None:
+        ptn_wrong = check(PTN.parse, names)
+        print 'PTN:         %d of %d names wrong' % (len(ptn_wrong),
+                                                      len(names))
+        for name in ptn_wrong:
+            info = PTN.parse(name)
+            print '    %s -> %r, %r (releasename: %r, %r)' % (
+                    name, info['title'], info.get('year'),
+                    releasename.parse(name)['title'],
+                    releasename.parse(name).get('year'))
+
+    print
+    plain = [n for n, t, y in names]
+    print 'releasename, first parse: %7.1f us/name' % timing(
+            releasename._parse, plain, repeat)
+    releasename._cache.clear()
+    releasename.cache_size = max(releasename.cache_size, len(plain))
+    for n in plain:
+        releasename.parse(n)
+    print 'releasename, memoized:    %7.1f us/name' % timing(
+            releasename.parse, plain, repeat)
+    if PTN is not None:
+        print 'PTN:                      %7.1f us/name' % timing(
+                PTN.parse, plain, repeat)
+
+    if wrong:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/python
+
+"""Searches per resolved directory, with and without the query planner.
+
+Scene-style names of random movies of the synthetic catalogue (see
+synthlib.py and calibrate.py) are searched for against a local fake TMDb
+server, once with a single search for the cleaned name (as imdbtag did
+before the query planner) and once with the query planner (see
+imdbtag/planner.py). A name is resolved if the best result is the right
+movie and confident enough to be taken without asking. For both, the script
+prints the searches made, the names resolved and the searches per resolved
+name:
+
+    $ python benchmarks/queries.py --names 2000
+"""
+
+import os
+import sys
+import getopt
+import shutil
+import logging
+import tempfile
+
+import synthlib
+import fakeserver
+import calibrate
+
+
+def usage():
+    print """Usage: queries.py [options]
+
+Options: -h      Display help text.
+         --names <n>
+                 Number of names to search for (default 1000).
+         --catalogue <n>
+                 Number of movies in the catalogue (default 10000).
+         --no-year <fraction>
+                 Fraction of names without a year (default 0.25).
+         --junk <fraction>
+                 Fraction of names that match no movie (default 0.05).
+         --threshold <confidence>
+                 Confidence at which a match counts as resolved (default
+                 0.9).
+"""
+
+
+def single(core, name):
+    s = core._clean_name(name)
+    return s, core._clean_year(name), core._search_tmdb(s, None, False)
+
+
+def planned(core, name):
+    s, year = core._clean_query(name)
+    return s, year, core._planned_query((s, year))
+
+
+def measure(server, core, scoring, search, samples, threshold):
+    server.reset_counts()
+    resolved = 0
+    for name, id in samples:
+        s, year, results = search(core, name)
+        ranked = scoring.rank(s, year, results)
+        if ranked and ranked[0][0] >= threshold and ranked[0][1].id == id:
+            resolved += 1
+    return server.requests.get('search', 0), resolved
+
+
+def main():
+    logging.basicConfig(format='%(message)s', level=logging.INFO)
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "h", [
+            "names=", "catalogue=", "no-year=", "junk=", "threshold="])
+    except getopt.GetoptError, err:
+        logging.error(str(err))
+        usage()
+        sys.exit(2)
+
+    count = 1000
+    size = 10000
+    no_year = 0.25
+    junk = 0.05
+    threshold = 0.9
+    for opt, val in opts:
+        if opt == "-h":
+            usage()
+            sys.exit()
+        elif opt == "--names":
+            count = int(val)
+        elif opt == "--catalogue":
+            size = int(val)
+        elif opt == "--no-year":
+            no_year = float(val)
+        elif opt == "--junk":
+            junk = float(val)
+        elif opt == "--threshold":
+            threshold = float(val)
+
+    catalogue = synthlib.Catalogue(size)
+    server = fakeserver.FakeTMDb(catalogue).start()
+    workdir = tempfile.mkdtemp(prefix='imdbtag-queries-')
+    try:
+        # imdbtag reads its configuration from ~/.imdbtagrc when it is
+        # imported.
+        fh = open(os.path.join(workdir, '.imdbtagrc'), 'w')
+        fh.write('[general]\napi_key = benchmark\napi_url = %s\n' %
+                 server.url)
+        fh.close()
+        os.environ['HOME'] = workdir
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+        from imdbtag import imdbtag as core
+        from imdbtag import scoring
+        core.setConfig(offlinemode=True, quietmode=True)
+
+        samples = calibrate.names(catalogue, count, no_year, junk, 1)
+        print '%-8s %9s %9s %12s' % ('search', 'searches', 'resolved',
+                                     'per resolved')
+        for label, search in [('single', single), ('planned', planned)]:
+            searches, resolved = measure(server, core, scoring, search,
+                                         samples, threshold)
+            print '%-8s %9d %8.1f%% %12.2f' % (
+                    label, searches, 100.0 * resolved / len(samples),
+                    resolved and float(searches) / resolved or 0.0)
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
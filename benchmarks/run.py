@@ -0,0 +1,235 @@
+#!/usr/bin/python
+
+"""End-to-end benchmarks of ``imdbtag.process_directory``.
+
+For every library size, a synthetic library is generated (see synthlib.py) and
+processed in offline, force, recovery and clear mode, in that order, against a
+local fake TMDb server (see fakeserver.py) with injected latency. The results
+are printed and can be saved as a JSON baseline, against which later runs are
+compared:
+
+    $ python benchmarks/run.py --sizes 1000,10000 --save baseline.json
+    $ python benchmarks/run.py --sizes 1000,10000 --compare baseline.json
+
+With --compare, the script exits with status 1 if the throughput of any mode
+dropped by more than the tolerance (default 20%).
+"""
+
+import os
+import sys
+import json
+import time
+import getopt
+import shutil
+import logging
+import platform
+import tempfile
+
+import synthlib
+import fakeserver
+
+# Modes in the order in which they are run; each one works on the library as
+# left behind by the previous one.
+modes = ['offline', 'force', 'recovery', 'clear']
+
+
+def usage():
+    print """Usage: run.py [options]
+
+Options: -h      Display help text.
+         --sizes <n,n,...>
+                 Library sizes to benchmark (default 1000). Sizes of 10000 and
+                 100000 are realistic, but take a while.
+         --latency <seconds>
+                 Latency of the fake TMDb server (default 0.005).
+         --jitter <seconds>
+                 Additional random latency, up to <seconds> (default 0.002).
+         --save <file>
+                 Save the results as a baseline to <file>.
+         --compare <file>
+                 Compare the results to the baseline in <file>.
+         --tolerance <fraction>
+                 Allowed throughput drop before a mode counts as a regression
+                 (default 0.2).
+"""
+
+
+class _AcceptAll(object):
+    """Stands in for stdin in recovery mode; answers every prompt with the
+    default (choose the first match, confirm, no custom title)."""
+
+    encoding = 'UTF-8'
+
+    def readline(self):
+        return '\n'
+
+
+def run_mode(core, mode, library):
+    core.reset_notifications()
+
+    core.setConfig(
+            offlinemode=(mode != 'recovery'),
+            forcemode=(mode == 'force'),
+            clearmode=(mode == 'clear'),
+            recoverymode=(mode == 'recovery'),
+            quietmode=True)
+
+    # Synthetic libraries contain duplicates, which makes imdbtag log errors
+    # for renamings that would collide; we don't want to see those.
+    level = logging.getLogger().level
+    logging.getLogger().setLevel(logging.CRITICAL)
+    stdin, stdout = sys.stdin, sys.stdout
+    sys.stdin = _AcceptAll()
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        start = time.time()
+        core.process_directory(library)
+        elapsed = time.time() - start
+    finally:
+        sys.stdout.close()
+        sys.stdin, sys.stdout = stdin, stdout
+        logging.getLogger().setLevel(level)
+
+    return elapsed, {
+        'renamed': len(core.notifications_rename),
+        'unknown': len(core.notifications_unknown),
+        'unchanged': core.notifications_nb_unchanged,
+        'ignored': core.notifications_nb_ignored,
+        }
+
+
+def benchmark(size, latency, jitter, workdir):
+    catalogue = synthlib.Catalogue(max(size, 1000))
+    server = fakeserver.FakeTMDb(catalogue, latency=latency,
+                                 jitter=jitter).start()
+
+    # imdbtag reads its configuration from ~/.imdbtagrc when it is imported.
+    home = os.path.join(workdir, 'home')
+    os.mkdir(home)
+    fh = open(os.path.join(home, '.imdbtagrc'), 'w')
+    fh.write('[general]\napi_key = benchmark\napi_url = %s\n' % server.url)
+    fh.close()
+    os.environ['HOME'] = home
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+    from imdbtag.apis.tmdb import tmdb
+    from imdbtag import imdbtag as core
+    # The module may already be configured for a previous size.
+    tmdb.configure('benchmark', base_url=server.url)
+
+    library = os.path.join(workdir, 'library-%d' % size)
+    start = time.time()
+    counts = synthlib.generate_library(library, size, catalogue)
+    logging.info('Generated library of %d entries in %.1fs: %s' %
+                 (size, time.time() - start, counts))
+
+    results = {}
+    for mode in modes:
+        server.reset_counts()
+        elapsed, outcome = run_mode(core, mode, library)
+        results[mode] = {
+            'seconds': round(elapsed, 3),
+            'entries_per_second': round(size / elapsed, 1),
+            'requests': dict(server.requests),
+            'requests_per_entry': round(
+                float(server.total_requests()) / size, 3),
+            'outcome': outcome,
+            }
+        logging.info('%6d entries, %-8s %8.2fs %9.1f entries/s %6.2f '
+                     'requests/entry' % (size, mode, elapsed, size / elapsed,
+                                         results[mode]['requests_per_entry']))
+
+    server.shutdown()
+    server.server_close()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Returns the list of regressions of ``results`` against ``baseline``."""
+    regressions = []
+    for size, modes in sorted(results.items()):
+        for mode, r in sorted(modes.items()):
+            try:
+                b = baseline['results'][size][mode]
+            except KeyError:
+                continue
+            ratio = r['entries_per_second'] / b['entries_per_second']
+            logging.info('%6s entries, %-8s %6.1f%% of baseline throughput' %
+                         (size, mode, ratio * 100))
+            if ratio < 1 - tolerance:
+                regressions.append('%s/%s: %.1f instead of %.1f entries/s' %
+                                   (size, mode, r['entries_per_second'],
+                                    b['entries_per_second']))
+    return regressions
+
+
+def main():
+    logging.basicConfig(format='%(message)s', level=logging.INFO)
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "h", [
+            "sizes=", "latency=", "jitter=", "save=", "compare=",
+            "tolerance="])
+    except getopt.GetoptError, err:
+        logging.error(str(err))
+        usage()
+        sys.exit(2)
+
+    sizes = [1000]
+    latency = 0.005
+    jitter = 0.002
+    save = None
+    baseline = None
+    tolerance = 0.2
+    for opt, val in opts:
+        if opt == "-h":
+            usage()
+            sys.exit()
+        elif opt == "--sizes":
+            sizes = [int(s) for s in val.split(',')]
+        elif opt == "--latency":
+            latency = float(val)
+        elif opt == "--jitter":
+            jitter = float(val)
+        elif opt == "--save":
+            save = val
+        elif opt == "--compare":
+            baseline = val
+        elif opt == "--tolerance":
+            tolerance = float(val)
+
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='imdbtag-bench.')
+    try:
+        for size in sizes:
+            d = os.path.join(workdir, str(size))
+            os.mkdir(d)
+            results[str(size)] = benchmark(size, latency, jitter, d)
+    finally:
+        shutil.rmtree(workdir)
+
+    doc = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'latency': latency,
+        'jitter': jitter,
+        'results': results,
+        }
+
+    if save is not None:
+        fh = open(save, 'w')
+        json.dump(doc, fh, indent=2, sort_keys=True)
+        fh.close()
+        logging.info('Saved results to "%s".' % save)
+
+    if baseline is not None:
+        fh = open(baseline, 'r')
+        regressions = compare(results, json.load(fh), tolerance)
+        fh.close()
+        if regressions:
+            logging.error('Regressions found:\n' + '\n'.join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
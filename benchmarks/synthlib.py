@@ -0,0 +1,177 @@
+#!/usr/bin/python
+
+"""Synthetic movie catalogue and library generator for the benchmarks.
+
+The catalogue is generated deterministically from a seed, so that the fake
+TMDb server (see fakeserver.py) and the library generator agree on which
+movies exist without sharing any files.
+"""
+
+import os
+import random
+
+# Words to build titles from. Titles are made of one to four of these.
+_words = """
+    night day last first dark light red blue black white city river road
+    house dead love war king queen man woman girl boy star moon sun sky
+    fire ice storm heart blood gold silver iron stone dream shadow ghost
+    secret lost hidden wild quiet long short big little old young new
+    return rise fall empire kingdom island ocean desert mountain forest
+    garden winter summer spring autumn north south east west club fight
+    game hunter killer doctor soldier stranger angel devil hero legend
+    """.split()
+
+# Release name decorations, in the style of scene releases.
+_qualities = ['720p', '1080p', '2160p', 'DVDRip', 'BDRip', 'WEB-DL', 'HDTV']
+_sources = ['BluRay', 'WEBRip', 'HDRip', '']
+_codecs = ['x264', 'x265', 'XviD', 'DivX', 'H.264']
+_audio = ['DTS', 'AC3', 'AAC', 'DD5.1', '']
+_groups = ['SPARKS', 'CHD', 'AMIABLE', 'DIMENSION', 'YIFY', 'FGT', 'GECKOS']
+_editions = ['UNRATED', 'DIRECTORS.CUT', 'REMASTERED', 'TELESYNC']
+_extensions = ['mkv', 'avi', 'mp4', 'm4v']
+
+# Names that no catalogue search can resolve.
+_junk = ['movie', 'sample', 'video', 'untitled', 'new folder', 'rip']
+
+
+class Catalogue(object):
+    """A deterministic list of ``size`` fake movies.
+
+    Each movie is a dictionary in the format of TMDb's movie details.
+    """
+
+    def __init__(self, size, seed=0):
+        rnd = random.Random(seed)
+        self.movies = []
+        self.by_id = {}
+        self.by_imdb_id = {}
+        self.by_title = {}
+        self.by_word = {}
+        for i in range(size):
+            title = ' '.join(rnd.choice(_words)
+                             for _ in range(rnd.randint(1, 4))).title()
+            year = rnd.randint(1930, 2025)
+            m = {
+                'id': i + 1,
+                'title': title,
+                'original_title': title,
+                'release_date': '%d-%02d-%02d' % (year, rnd.randint(1, 12),
+                                                  rnd.randint(1, 28)),
+                'vote_average': round(rnd.uniform(2, 9), 1),
+                'vote_count': rnd.randint(0, 50000),
+                'popularity': round(rnd.uniform(0, 100), 3),
+                'imdb_id': 'tt%07d' % (100000 + i),
+                'runtime': rnd.randint(70, 200),
+                'adult': False,
+                }
+            self.movies.append(m)
+            self.by_id[m['id']] = m
+            self.by_imdb_id[m['imdb_id']] = m
+            self.by_title.setdefault(title.lower(), []).append(m)
+            for w in set(title.lower().split()):
+                self.by_word.setdefault(w, []).append(m)
+
+    def year(self, m):
+        return int(m['release_date'][0:4])
+
+
+def scene_name(rnd, m, year):
+    """Returns a scene-style release name for the movie ``m``."""
+    parts = m['title'].split(' ')
+    if rnd.random() < 0.3:
+        # Some releases use spaces and brackets instead of dots.
+        name = ' '.join(parts) + ' (%d) [%s]' % (year, rnd.choice(_qualities))
+        return name
+
+    parts.append(str(year))
+    if rnd.random() < 0.1:
+        parts.append(rnd.choice(_editions))
+    parts.append(rnd.choice(_qualities))
+    for l in (_sources, _codecs, _audio):
+        p = rnd.choice(l)
+        if p:
+            parts.append(p)
+    return '.'.join(parts) + '-' + rnd.choice(_groups)
+
+
+def nice_title(m):
+    return '%s (%s)' % (m['title'].replace(': ', ' - '),
+                        m['release_date'][0:4])
+
+
+def generate_library(path, size, catalogue, seed=0, tagged=0.7, loose=0.1,
+                     junk=0.02):
+    """Creates a library of ``size`` entries in the directory ``path``.
+
+    A fraction ``tagged`` of the entries are directories already tagged by
+    imdbtag (with .name, .imdb, .rating and .original files), a fraction
+    ``loose`` are movie files not in a directory, a fraction ``junk`` are
+    directories with names that cannot be resolved, and the rest are untagged
+    directories with scene-style names. All movie files are empty.
+
+    Returns a dictionary with the number of entries of each kind.
+    """
+    rnd = random.Random(seed)
+    counts = {'tagged': 0, 'loose': 0, 'junk': 0, 'untagged': 0}
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    used = set()
+    for i in range(size):
+        m = rnd.choice(catalogue.movies)
+        year = catalogue.year(m)
+        r = rnd.random()
+
+        if r < tagged:
+            kind = 'tagged'
+            name = nice_title(m)
+        elif r < tagged + loose:
+            kind = 'loose'
+            name = scene_name(rnd, m, year) + '.' + rnd.choice(_extensions)
+        elif r < tagged + loose + junk:
+            kind = 'junk'
+            name = '%s %d' % (rnd.choice(_junk), i)
+        else:
+            kind = 'untagged'
+            name = scene_name(rnd, m, year)
+
+        # Make names unique; several entries can be the same movie.
+        if name in used:
+            if kind == 'loose':
+                n, e = name.rsplit('.', 1)
+                name = '%s.%d.%s' % (n, i, e)
+            else:
+                name = '%s.%d' % (name, i)
+        used.add(name)
+        counts[kind] += 1
+
+        full = os.path.join(path, name)
+        if kind == 'loose':
+            open(full, 'w').close()
+            continue
+
+        os.mkdir(full)
+        open(os.path.join(full, 'movie.' + rnd.choice(_extensions)),
+             'w').close()
+        if kind == 'tagged':
+            _write(full, '.name', name)
+            _write(full, '.imdb', 'tt%d' % m['id'])
+            _write(full, '.rating', str(m['vote_average']))
+            _write(full, '.original', scene_name(rnd, m, year))
+
+    return counts
+
+
+def _write(d, f, s):
+    fh = open(os.path.join(d, f), 'w')
+    fh.write(s + '\n')
+    fh.close()
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 3:
+        sys.stderr.write("Usage: synthlib.py <directory> <size>\n")
+        sys.exit(2)
+    size = int(sys.argv[2])
+    print generate_library(sys.argv[1], size, Catalogue(max(size, 1000)))
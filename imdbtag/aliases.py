@@ -0,0 +1,120 @@
+"""Aliases learned from the choices made in interactive mode.
+
+When the user doesn't take the first result of a search, but searches again
+or picks another result, or gives a custom name, the choice is remembered for
+the cleaned directory name that was searched for, and its year. Later
+directories with the same cleaned name and year are then tagged the same way,
+without any search or prompt, also in offline mode. Remakes have the same
+title, so a choice made for a name with a year is only used for that year, and
+one made for a name without a year only for names without a year or with the
+year of the movie.
+
+The aliases are kept in ``~/.imdbtag/aliases.json``:
+
+    {"heat (1995)": {"id": "949", "name": "Heat (Director's Cut)"}}
+
+where "id" is the TMDb id of the movie and "name" the custom name, or empty.
+Only the id is kept, so that the details of the movie, like its rating, are
+looked up when the alias is used.
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+
+import storage
+
+# File in which the aliases are kept.
+aliases_file = os.path.expanduser(os.path.join('~', '.imdbtag',
+                                               'aliases.json'))
+
+_lock = threading.Lock()
+_aliases = None   # normalized name -> {'id': movie id, 'name': custom name}
+
+
+def normalize(s):
+    """Returns the key for the cleaned name ``s``: lower case, with all
+    punctuation and repeated spaces removed. Byte strings are taken as UTF-8
+    (or Latin-1, if they are not valid UTF-8), and the key is UTF-8."""
+    if isinstance(s, str):
+        try:
+            s = s.decode('utf-8')
+        except UnicodeDecodeError:
+            s = s.decode('latin-1')
+    key = re.sub(r'[\W_]+', ' ', s.lower(), flags=re.UNICODE).strip()
+    return key.encode('utf-8')
+
+
+def lookup(s, year, movie):
+    """Returns the movie and the custom name (or "") for the cleaned name
+    ``s`` and the year ``year`` (a string, or None), or None if there is no
+    alias for them. ``movie(id)`` returns the movie with the id ``id``."""
+    with _lock:
+        a = _load().get(_key(s, year))
+        fallback = a is None and year is not None
+        if fallback:
+            # A choice made without a year, if it is a movie of that year.
+            a = _load().get(normalize(s))
+    if a is None:
+        return None
+    m = movie(a['id'])
+    if fallback and m.year != year:
+        return None
+    return m, a['name']
+
+
+def learn(s, year, m, name=''):
+    """Remembers the movie ``m`` and the custom name ``name`` for the cleaned
+    name ``s`` and the year ``year`` (or None)."""
+    if not normalize(s):
+        return
+    key = _key(s, year)
+    with _lock:
+        aliases = _load()
+        aliases[key] = {'id': m.id, 'name': name}
+        _save(aliases)
+    logging.debug('Learned alias "' + key + '" for movie ' + m.id + '.')
+
+
+def _key(s, year):
+    key = normalize(s)
+    if year is not None:
+        key += ' (' + year + ')'
+    return key
+
+
+def _load():
+    global _aliases
+    if _aliases is not None:
+        return _aliases
+
+    _aliases = {}
+    if os.path.exists(aliases_file):
+        fh = open(aliases_file, 'r')
+        try:
+            for k, a in json.load(fh).items():
+                # Older files kept all fields of the movie.
+                id = 'movie' in a and a['movie']['id'] or a['id']
+                _aliases[storage.decode_name(k)] = {
+                        'id': str(id), 'name': a['name'].encode('utf-8')}
+        except (ValueError, KeyError, TypeError, AttributeError):
+            logging.warning('Ignoring damaged alias file "' + aliases_file +
+                            '".')
+        finally:
+            fh.close()
+    return _aliases
+
+
+def _save(aliases):
+    d = os.path.dirname(aliases_file)
+    doc = dict((storage.encode_name(k), a) for k, a in aliases.items())
+    try:
+        if not os.path.isdir(d):
+            os.makedirs(d)
+        storage.atomic_write(aliases_file,
+                             json.dumps(doc, indent=2, sort_keys=True,
+                                        separators=(',', ': ')) + '\n')
+    except (IOError, OSError):
+        logging.error('Could not write aliases to "' + aliases_file + '".')
@@ -0,0 +1,40 @@
+"""Backends for movie lookups.
+
+A backend is a module with the functions ``api_get_movie(id)`` and
+``api_search_movie(querystr, year=None, primary=False)``, which return Movie
+objects (see movie.py), and the attribute ``ids``, the kind of movie ids it
+uses ("tmdb" or "imdb"). The backends are registered by name in ``backends``
+and only imported when they are first used, since each one needs its own
+packages and configuration.
+
+Only backends with TMDb ids are registered, as those are the ids that the
+.imdb files, NFO files and the id map hold. imdbapi.py (IMDbPY) gives IMDb ids;
+turning its results into TMDb ids would take a request to TMDb per result,
+which is what hedging is meant to get around, so it is not registered.
+"""
+
+import importlib
+
+from hedged import HedgedBackend
+
+# Backend name -> module in this package.
+backends = {
+    'tmdb': 'tmdbapi',
+    }
+
+
+def get(name):
+    """Returns the backend ``name``, importing it if necessary."""
+    if name not in backends:
+        raise ValueError('Unknown backend "' + name + '".')
+    return importlib.import_module('.' + backends[name], __name__)
+
+
+def hedged(primary, secondary, threshold, observer=None):
+    """Returns a backend that asks ``primary`` first and ``secondary`` too if
+    ``primary`` hasn't answered after ``threshold`` seconds (see hedged.py).
+    Both need to use the same kind of movie ids."""
+    if primary.ids != secondary.ids:
+        raise ValueError('Backends with %s ids and %s ids cannot be hedged.'
+                         % (primary.ids, secondary.ids))
+    return HedgedBackend(primary, secondary, threshold, observer)
@@ -0,0 +1,138 @@
+"""Hedged requests to two backends.
+
+A few slow responses of a degraded API endpoint dominate the time of a run,
+while most requests are fast. ``HedgedBackend`` sends each lookup to the
+primary backend, and only if that hasn't answered after ``threshold`` seconds
+(or failed), sends the same lookup to the secondary backend too. Whichever
+answers first is taken; the slower request is left to finish in the
+background, and its answer is dropped. With a threshold of about the 95th
+percentile of the latency, only about one request in twenty is sent twice.
+
+The secondary backend can be the same as the primary one: a repeated request
+usually ends up on another server of the API.
+"""
+
+import sys
+import time
+import Queue
+import threading
+import collections
+
+# Timeout of each wait for an answer. Python 2 only delivers Ctrl-C to a
+# thread that waits with a timeout, and such a wait polls with a delay that
+# doubles up to 50 ms, which would be added to the latency of every lookup.
+# Short waits in a loop keep the delay to a few milliseconds.
+poll_interval = 0.01
+
+
+class HedgedBackend(object):
+    """Backend that asks ``primary``, and also ``secondary`` if ``primary``
+    doesn't answer within ``threshold`` seconds. If given, ``observer`` is
+    called with "hedged" whenever a lookup is sent to ``secondary``, and with
+    "won" whenever the answer of ``secondary`` is taken."""
+
+    def __init__(self, primary, secondary, threshold, observer=None):
+        self.primary = primary
+        self.secondary = secondary
+        self.threshold = threshold
+        self.observer = observer
+        self.ids = primary.ids
+        self.timer = _Timer()
+
+    def api_get_movie(self, id):
+        return self._call('api_get_movie', id)
+
+    def api_search_movie(self, querystr, year=None, primary=False):
+        return self._call('api_search_movie', querystr, year, primary)
+
+    def _call(self, name, *args):
+        answers = Queue.Queue()
+        lock = threading.Lock()
+        hedged = []
+        done = []
+
+        # The backends can be the same, so answers are told apart by role.
+        def run(role, backend):
+            try:
+                answers.put((role, True, getattr(backend, name)(*args)))
+            except Exception:
+                answers.put((role, False, sys.exc_info()))
+
+        def hedge():
+            with lock:
+                if hedged:
+                    return
+                hedged.append(True)
+            self._notice('hedged')
+            _start(run, 'secondary', self.secondary)
+
+        def watch():
+            if not done:
+                hedge()
+
+        _start(run, 'primary', self.primary)
+        self.timer.schedule(self.threshold, watch)
+
+        primary_failed = False
+        failures = 0
+        while True:
+            try:
+                role, ok, result = answers.get(True, poll_interval)
+            except Queue.Empty:
+                continue
+            if ok:
+                done.append(True)
+                if role == 'secondary' and not primary_failed:
+                    self._notice('won')
+                return result
+            failures += 1
+            if role == 'primary':
+                # Ask the secondary backend right away, if it wasn't yet.
+                primary_failed = True
+                hedge()
+            if failures == 2:
+                raise result[0], result[1], result[2]
+
+    def _notice(self, event):
+        if self.observer is not None:
+            self.observer(event)
+
+
+class _Timer(object):
+    """Calls functions after a delay, all from one thread. All delays are the
+    same, so the calls are due in the order in which they are scheduled."""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.due = collections.deque()   # (time, function), earliest first
+        self.thread = None
+
+    def schedule(self, delay, f):
+        """Calls ``f()`` after ``delay`` seconds."""
+        with self.cond:
+            self.due.append((time.time() + delay, f))
+            if self.thread is None:
+                self.thread = _start(self._run)
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.due:
+                    self.cond.wait()
+                when, f = self.due.popleft()
+            # Timed waits poll in Python 2, which would delay the hedges, so
+            # the timer sleeps instead.
+            delay = when - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            f()
+
+
+def _start(f, *args):
+    # Daemon threads, so that requests still running don't keep the program
+    # from exiting.
+    t = threading.Thread(target=f, args=args)
+    t.daemon = True
+    t.start()
+    return t
@@ -5,6 +5,9 @@ from movie import Movie
 
 verbose = False
 
+# Movie ids of this backend, see apis/__init__.py.
+ids = 'imdb'
+
 try:
     import imdb
 except ImportError:
@@ -39,12 +42,16 @@ def api_get_movie(id):
     _debug("found title: \"" + imdb_m['title'] + "\"")
     return _imdb2movie(imdb_m)
 
-def api_search_movie(querystr):
+def api_search_movie(querystr, year=None, primary=False):
+    """Searches for movies by title; with ``year``, only for movies of that
+    year. IMDb only knows one year per movie, so ``primary`` makes no
+    difference."""
     global i
     r = []
     results = i.search_movie(querystr)
     for m in results:
-        r.append(_imdb2movie(m))
+        if year is None or str(m.get('year', '')) == str(year):
+            r.append(_imdb2movie(m))
     return r
 
 def _imdb2movie(imdb_m):
@@ -64,7 +71,8 @@ def _imdb2movie(imdb_m):
       idx,
       imdb_m.movieID.encode(out_encoding, 'replace'),
       imdb_m['kind'].encode(out_encoding, 'replace'),
-      imdb_m.has_key('rating') and str(imdb_m['rating']) or ''
+      imdb_m.has_key('rating') and str(imdb_m['rating']) or '',
+      "tt" + imdb_m.movieID.encode(out_encoding, 'replace')
       )
 
 def _debug(s):
@@ -3,13 +3,25 @@
 import re
 
 class Movie:
-  def __init__(self, title, year, index, id, kind, rating):
+  def __init__(self, title, year, index, id, kind, rating, imdb_id='',
+               runtime=0, director='', other_title='', popularity=0.0):
     self.title = title
     self.year = year
     self.index = index
     self.id = id
     self.kind = kind
     self.rating = rating
+    # The IMDb id ("tt0137523"), if the backend knows it. For IMDb itself, this
+    # is the same as id.
+    self.imdb_id = imdb_id
+    # Details to tell similar movies apart, if the backend knows them: the
+    # runtime in minutes, the director(s), and the title in the configured
+    # language if it differs from title.
+    self.runtime = runtime
+    self.director = director
+    self.other_title = other_title
+    # TMDb's popularity, to tell apart movies of the same name.
+    self.popularity = popularity
 
   def nice_title(self):
     # We only add the index if it is II or more.
@@ -14,32 +14,40 @@ try:
 except:
     import json as simplejson
 
+import time
+import threading
+import collections
+
 import fuzzywuzzy.fuzz
 import requests
 
-config = {}
+config = {'cassette': None, 'observers': [], 'rate_limit_observers': [], 'retries': 5}
 
-def configure(api_key, language='en'):
+def configure(api_key, language='en', base_url='https://api.themoviedb.org/3'):
     config['apikey'] = api_key
     config['language'] = language
+    config['baseurl'] = base_url
     config['urls'] = {}
-    config['urls']['movie.search'] = "https://api.themoviedb.org/3/search/movie?query=%%s&api_key=%(apikey)s&page=%%s" % (config)
-    config['urls']['movie.info'] = "https://api.themoviedb.org/3/movie/%%s?api_key=%(apikey)s" % (config)
-    config['urls']['people.search'] = "https://api.themoviedb.org/3/search/person?query=%%s&api_key=%(apikey)s&page=%%s" % (config)
-    config['urls']['collection.info'] = "https://api.themoviedb.org/3/collection/%%s&api_key=%(apikey)s" % (config)
-    config['urls']['movie.alternativetitles'] = "https://api.themoviedb.org/3/movie/%%s/alternative_titles?api_key=%(apikey)s" % (config)
-    config['urls']['movie.casts'] = "https://api.themoviedb.org/3/movie/%%s/casts?api_key=%(apikey)s" % (config)
-    config['urls']['movie.images'] = "https://api.themoviedb.org/3/movie/%%s/images?api_key=%(apikey)s" % (config)
-    config['urls']['movie.keywords'] = "https://api.themoviedb.org/3/movie/%%s/keywords?api_key=%(apikey)s" % (config)
-    config['urls']['movie.releases'] = "https://api.themoviedb.org/3/movie/%%s/releases?api_key=%(apikey)s" % (config)
-    config['urls']['movie.trailers'] = "https://api.themoviedb.org/3/movie/%%s/trailers?api_key=%(apikey)s" % (config)
-    config['urls']['movie.translations'] = "https://api.themoviedb.org/3/movie/%%s/translations?api_key=%(apikey)s" % (config)
-    config['urls']['person.info'] = "https://api.themoviedb.org/3/person/%%s?api_key=%(apikey)s&append_to_response=images,credits" % (config)
-    config['urls']['latestmovie'] = "https://api.themoviedb.org/3/latest/movie?api_key=%(apikey)s" % (config)
-    config['urls']['config'] = "https://api.themoviedb.org/3/configuration?api_key=%(apikey)s" % (config)
-    config['urls']['request.token'] = "https://api.themoviedb.org/3/authentication/token/new?api_key=%(apikey)s" % (config)
-    config['urls']['session.id'] = "https://api.themoviedb.org/3/authentication/session/new?api_key=%(apikey)s&request_token=%%s" % (config)
-    config['urls']['movie.add.rating'] = "https://api.themoviedb.org/3/movie/%%s/rating?session_id=%%s&api_key=%(apikey)s" % (config)
+    config['urls']['movie.search'] = "%(baseurl)s/search/movie?query=%%s&api_key=%(apikey)s&page=%%s" % (config)
+    # The credits come with the details, instead of another request.
+    config['urls']['movie.info'] = "%(baseurl)s/movie/%%s?api_key=%(apikey)s&append_to_response=credits" % (config)
+    config['urls']['people.search'] = "%(baseurl)s/search/person?query=%%s&api_key=%(apikey)s&page=%%s" % (config)
+    config['urls']['collection.info'] = "%(baseurl)s/collection/%%s&api_key=%(apikey)s" % (config)
+    config['urls']['movie.alternativetitles'] = "%(baseurl)s/movie/%%s/alternative_titles?api_key=%(apikey)s" % (config)
+    config['urls']['movie.casts'] = "%(baseurl)s/movie/%%s/casts?api_key=%(apikey)s" % (config)
+    config['urls']['movie.images'] = "%(baseurl)s/movie/%%s/images?api_key=%(apikey)s" % (config)
+    config['urls']['movie.keywords'] = "%(baseurl)s/movie/%%s/keywords?api_key=%(apikey)s" % (config)
+    config['urls']['movie.releases'] = "%(baseurl)s/movie/%%s/releases?api_key=%(apikey)s" % (config)
+    config['urls']['movie.trailers'] = "%(baseurl)s/movie/%%s/trailers?api_key=%(apikey)s" % (config)
+    config['urls']['movie.translations'] = "%(baseurl)s/movie/%%s/translations?api_key=%(apikey)s" % (config)
+    config['urls']['person.info'] = "%(baseurl)s/person/%%s?api_key=%(apikey)s&append_to_response=images,credits" % (config)
+    config['urls']['find'] = "%(baseurl)s/find/%%s?api_key=%(apikey)s&external_source=%%s" % (config)
+    config['urls']['movie.changes'] = "%(baseurl)s/movie/changes?api_key=%(apikey)s&start_date=%%s&end_date=%%s&page=%%s" % (config)
+    config['urls']['latestmovie'] = "%(baseurl)s/latest/movie?api_key=%(apikey)s" % (config)
+    config['urls']['config'] = "%(baseurl)s/configuration?api_key=%(apikey)s" % (config)
+    config['urls']['request.token'] = "%(baseurl)s/authentication/token/new?api_key=%(apikey)s" % (config)
+    config['urls']['session.id'] = "%(baseurl)s/authentication/session/new?api_key=%(apikey)s&request_token=%%s" % (config)
+    config['urls']['movie.add.rating'] = "%(baseurl)s/movie/%%s/rating?session_id=%%s&api_key=%(apikey)s" % (config)
     config['api'] = {}
     config['api']['backdrop.sizes'] = ""
     config['api']['base.url'] = ""
@@ -48,21 +56,126 @@ def configure(api_key, language='en'):
     config['api']['session.id'] = ""
 
 
+class Cassette(object):
+    """Records all requests made through Core.getJSON() to a file, one JSON
+    object per line, or replays them from such a file.
+
+    When replaying, each response is served after the latency it had when it
+    was recorded, unless original_latency is False. A request that was made
+    several times gets the recorded responses in order, and the last one once
+    they are used up. The API key is never written to the file, and URLs are
+    stored relative to the API URL.
+    """
+    def __init__(self, path, replay=False, original_latency=True):
+        self.path = path
+        self.replay = replay
+        self.original_latency = original_latency
+        self.lock = threading.Lock()
+        if replay:
+            self.responses = collections.defaultdict(collections.deque)
+            with open(path, 'r') as f:
+                for line in f:
+                    r = simplejson.loads(line)
+                    self.responses[(r['url'], r['language'])].append(r)
+        else:
+            self.file = open(path, 'a')
+            self.start = time.time()
+
+    def _mask(self, url):
+        # Relative to the API URL, so that a cassette can be replayed against
+        # another server too.
+        return url.replace(config['baseurl'], '', 1).replace(config['apikey'], 'API_KEY')
+
+    def play(self, url, language):
+        key = (self._mask(url), language)
+        with self.lock:
+            responses = self.responses.get(key)
+            if not responses:
+                raise IOError("Request not found in cassette %s: %s" % (self.path, key[0]))
+            r = responses[0]
+            if len(responses) > 1:
+                responses.popleft()
+        if self.original_latency:
+            time.sleep(r['elapsed'])
+        return r['status'], r['body'].encode('utf-8'), r.get('retry_after')
+
+    def record(self, url, language, status, body, elapsed, retry_after=None):
+        r = {'time': round(time.time() - self.start, 6), 'url': self._mask(url),
+             'language': language, 'status': status,
+             'body': body.decode('utf-8', 'replace'), 'elapsed': round(elapsed, 6)}
+        if retry_after is not None:
+            r['retry_after'] = retry_after
+        with self.lock:
+            self.file.write(simplejson.dumps(r) + '\n')
+            self.file.flush()
+
+def use_cassette(path, replay=False, original_latency=True):
+    """Records to (or with replay=True, replays from) the file at path."""
+    config['cassette'] = Cassette(path, replay, original_latency)
+
+def add_observer(observer):
+    """Calls observer(url, seconds, status) after every request. status is
+    None if the request failed without a response."""
+    config['observers'].append(observer)
+
+def add_rate_limit_observer(observer):
+    """Calls observer(seconds) whenever we waited because of rate limiting."""
+    config['rate_limit_observers'].append(observer)
+
 class Core(object):
     def getJSON(self, url, language=None):
         language = language or config['language']
-        page = requests.get(url, params={'language': language}).content
+        # When we are rate limited (HTTP status 429), we wait as long as the
+        # server asks us to in the Retry-After header, and try again.
+        attempt = 0
+        while True:
+            status, page, retry_after = self.request(url, language)
+            if status != 429 or attempt >= config['retries']:
+                break
+            attempt += 1
+            try:
+                wait = min(float(retry_after or 1), 30)
+            except ValueError:
+                wait = 1
+            cassette = config['cassette']
+            if cassette is not None and cassette.replay and not cassette.original_latency:
+                wait = 0
+            time.sleep(wait)
+            for observer in config['rate_limit_observers']:
+                observer(wait)
         try:
             return simplejson.loads(page)
         except:
             return simplejson.loads(page.decode('utf-8'))
 
+    def request(self, url, language):
+        """Makes a single request; returns status, content and Retry-After."""
+        cassette = config['cassette']
+        start = time.time()
+        status = None
+        try:
+            if cassette is not None and cassette.replay:
+                status, page, retry_after = cassette.play(url, language)
+            else:
+                r = requests.get(url, params={'language': language})
+                status, page = r.status_code, r.content
+                retry_after = r.headers.get('Retry-After')
+                if cassette is not None:
+                    cassette.record(url, language, status, page, time.time() - start, retry_after)
+        finally:
+            for observer in config['observers']:
+                observer(url, time.time() - start, status)
+        return status, page, retry_after
+
     def escape(self,text):
         if len(text) > 0:
             return requests.utils.quote(text)
         return False
 
     def update_configuration(self):
+        # The configuration hardly ever changes; get it once per configure().
+        if config['api']['base.url']:
+            return "ok"
         c = self.getJSON(config['urls']['config'])
         config['api']['backdrop.sizes'] = c['images']['backdrop_sizes']
         config['api']['base.url'] = c['images']['base_url']
@@ -93,17 +206,25 @@ class Core(object):
         return sess["session_id"]
 
 class Movies(Core):
-    def __init__(self, title="", limit=False, language=None):
+    """Search results for title. With year, only movies released in that
+    year (in any country); with primary_release_year, only movies first
+    released in that year."""
+    def __init__(self, title="", limit=False, language=None, year=None, primary_release_year=None):
         self.limit = limit
         self.update_configuration()
         self.searched = title
         title = self.escape(title)
-        self.movies = self.getJSON(config['urls']['movie.search'] % (title,str(1)), language=language)
+        url = config['urls']['movie.search']
+        if year:
+            url += "&year=%s" % year
+        if primary_release_year:
+            url += "&primary_release_year=%s" % primary_release_year
+        self.movies = self.getJSON(url % (title,str(1)), language=language)
         pages = self.movies["total_pages"]
         if not self.limit:
             if int(pages) > 1:                  #
                 for i in range(2,int(pages)+1): #  Thanks @tBuLi
-                    self.movies["results"].extend(self.getJSON(config['urls']['movie.search'] % (title,str(i)), language=language)["results"])
+                    self.movies["results"].extend(self.getJSON(url % (title,str(i)), language=language)["results"])
 
     def __iter__(self):
         for i in self.movies["results"]:
@@ -143,6 +264,33 @@ class Movies(Core):
         except IndexError:
             return
 
+class Changes(Core):
+    """Ids of the movies that changed between start_date and end_date
+    (YYYY-MM-DD). TMDb allows at most 14 days between the two."""
+    def __init__(self, start_date, end_date):
+        self.changes = self.getJSON(config['urls']['movie.changes'] % (start_date,end_date,str(1)))
+        pages = self.changes["total_pages"]
+        if int(pages) > 1:
+            for i in range(2,int(pages)+1):
+                self.changes["results"].extend(self.getJSON(config['urls']['movie.changes'] % (start_date,end_date,str(i)))["results"])
+
+    def get_total_results(self):
+        return self.changes["total_results"]
+
+    def iter_ids(self):
+        for i in self.changes["results"]:
+            yield i["id"]
+
+class Find(Core):
+    """Results of the lookup of an external id, e.g. an IMDb id
+    (source "imdb_id")."""
+    def __init__(self, external_id, source="imdb_id"):
+        self.results = self.getJSON(config['urls']['find'] % (external_id,source))
+
+    def iter_movie_ids(self):
+        for i in self.results.get("movie_results", []):
+            yield i["id"]
+
 class Movie(Core):
     def __init__(self, movie_id, language=None):
         self.movie_id = movie_id
@@ -225,6 +373,10 @@ class Movie(Core):
     def get_vote_count(self):
         return self.movies['vote_count']
 
+    def get_directors(self):
+        crew = self.movies.get('credits', {}).get('crew', [])
+        return [i["name"] for i in crew if i.get("job") == "Director"]
+
     def get_id(self):
         return self.movie_id
 
@@ -2,12 +2,17 @@
 
 import sys
 import os
+import re
+import datetime
 import ConfigParser
 from movie import Movie
 
 verbose = False
 configfile = '~/.imdbtagrc'
 
+# Movie ids of this backend, see apis/__init__.py.
+ids = 'tmdb'
+
 try:
     import tmdb.tmdb as tmdb
 except ImportError:
@@ -19,7 +24,11 @@ try:
     config = ConfigParser.ConfigParser()
     config.read(os.path.expanduser(configfile))
     api_key = config.get('general', 'api_key')
-    tmdb.configure(api_key)
+    # The API URL can be changed, e.g. to run against a local test server.
+    if config.has_option('general', 'api_url'):
+        tmdb.configure(api_key, base_url=config.get('general', 'api_url'))
+    else:
+        tmdb.configure(api_key)
 except ConfigParser.NoSectionError:
     sys.stderr.write("No section [general] found in config file " + configfile +
             "\n")
@@ -51,16 +60,65 @@ def api_get_movie(id):
     tmdb_m = tmdb.Movie(id)
     return _tmdb2movie(tmdb_m)
 
-def api_search_movie(querystr_enc):
+def api_find_movie_id(imdb_id):
+    """Returns the TMDb id of the movie with the IMDb id ``imdb_id``
+    ("tt0137523"), or None if TMDb doesn't know it."""
+    ids = list(tmdb.Find(imdb_id).iter_movie_ids())
+    return ids and str(ids[0]) or None
+
+def api_search_movie(querystr_enc, year=None, primary=False):
+    """Searches for movies by title; with ``year``, only for movies released
+    in that year, and with ``primary`` too, only for movies first released in
+    that year."""
     # Convert to ascii, because of a bug in urlllib (can't search for unicode)
     querystr = querystr_enc.encode('ascii', 'ignore')
 
     r = []
-    movies = tmdb.Movies(querystr, True) # True means only get first page results
+    if primary:
+        movies = tmdb.Movies(querystr, True, primary_release_year=year)
+    else:
+        movies = tmdb.Movies(querystr, True, year=year) # True means only get first page results
     for m in movies.iter_results():
         r.append(_tmdbhash2movie(m))
     return r
 
+def api_use_cassette(path, replay=False, original_latency=True):
+    """Records all API traffic to the file ``path``, or with ``replay``,
+    serves all requests from a file recorded earlier instead of the network."""
+    tmdb.use_cassette(path, replay, original_latency)
+
+def api_add_observer(observer):
+    """Calls ``observer(endpoint, seconds, ok)`` after every API request.
+    ``endpoint`` is the path of the request, with ids replaced by "{id}", e.g.
+    "/movie/{id}"."""
+    def observe(url, seconds, status):
+        path = url.replace(tmdb.config['baseurl'], '', 1).split('?')[0]
+        endpoint = re.sub(r"/(tt)?\d+", "/{id}", path)
+        # Rate limiting (429) is not an error, the request is repeated.
+        observer(endpoint, seconds,
+                 status is not None and (status < 400 or status == 429))
+    tmdb.add_observer(observe)
+
+def api_add_rate_limit_observer(observer):
+    """Calls ``observer(seconds)`` whenever we had to wait because TMDb's rate
+    limit was reached."""
+    tmdb.add_rate_limit_observer(observer)
+
+def api_changed_movies(since, until):
+    """Returns the set of ids of all movies that changed on TMDb between the
+    dates ``since`` and ``until``."""
+    ids = set()
+    # The changes API only allows queries for up to 14 days at once.
+    start = since
+    while True:
+        end = min(start + datetime.timedelta(days=14), until)
+        _debug("querying changes from %s to %s" % (start, end))
+        changes = tmdb.Changes(start.isoformat(), end.isoformat())
+        ids.update(str(i) for i in changes.iter_ids())
+        if end >= until:
+            return ids
+        start = end
+
 # TODO marius/2012-12-29: Refactor the two 2movie functions
 
 def _tmdb2movie(tmdb_m):
@@ -70,13 +128,22 @@ def _tmdb2movie(tmdb_m):
   # TMDb has no "index" field
   idx = ""
 
+  title = tmdb_m.get_title()
+  if title == tmdb_m.get_original_title():
+    title = ''
+
   return Movie(
       tmdb_m.get_original_title().encode(out_encoding, 'replace'),
       tmdb_m.get_release_date() and tmdb_m.get_release_date()[0:4] or '',
       idx,
       str(tmdb_m.get_id()),
       '',  # no "kind" field in tmdb
-      tmdb_m.get_vote_average() and str(tmdb_m.get_vote_average()) or ''
+      tmdb_m.get_vote_average() and str(tmdb_m.get_vote_average()) or '',
+      tmdb_m.get_imdb_id() or '',
+      tmdb_m.get_runtime() or 0,
+      ', '.join(tmdb_m.get_directors()).encode(out_encoding, 'replace'),
+      title.encode(out_encoding, 'replace'),
+      tmdb_m.get_popularity() or 0.0
       )
 
 def _tmdbhash2movie(m):
@@ -86,6 +153,10 @@ def _tmdbhash2movie(m):
   # TMDb has no "index" field
   idx = ""
 
+  title = m.get('title') or ''
+  if title == m['original_title']:
+    title = ''
+
   return Movie(
       m['original_title'].encode(out_encoding, 'replace'),
       # Only keep first 4 digits of release date
@@ -93,7 +164,9 @@ def _tmdbhash2movie(m):
       idx,
       str(m['id']),
       '',  # no "kind" field in tmdb
-      m['vote_average'] and str(m['vote_average']) or ''
+      m['vote_average'] and str(m['vote_average']) or '',
+      other_title=title.encode(out_encoding, 'replace'),
+      popularity=m.get('popularity') or 0.0
       )
 
 def _debug(s):
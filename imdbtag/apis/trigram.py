@@ -0,0 +1,305 @@
+#!/usr/bin/python
+
+"""Fuzzy title matching against a local title corpus.
+
+The matcher is backed by a character-trigram inverted index. Every title is
+broken up into trigrams (in the same way as PostgreSQL's pg_trgm does it), and
+for each trigram we keep a posting list of the titles that contain it. The
+posting lists and the trigrams of the titles are stored in ``array`` objects,
+and the movies of the corpus (``Titles``) in columns indexed by their number,
+so that a corpus of several hundred thousand titles stays compact.
+
+A search first collects candidates from the posting lists of the rarest query
+trigrams, scores all of them in one go by their trigram overlap (Dice
+coefficient), and finally reranks the best ones using fuzzywuzzy and the year
+and other attributes extracted from the release name.
+
+The ``LocalMovies`` class exposes the same ranking API as ``tmdb.Movies``
+(``iter_results()``, ``get_ordered_matches()`` and ``get_best_match()``).
+The corpus is IMDb's, so its movies have IMDb ids; ``to_movie()`` turns one
+into a Movie object once the id of the backend is known.
+"""
+
+import re
+import heapq
+from array import array
+
+import fuzzywuzzy.fuzz
+
+from movie import Movie
+
+# Title types of IMDb's title.basics.tsv that we keep when loading the corpus.
+title_types = ['movie', 'tvMovie', 'tvSeries', 'tvMiniSeries', 'video']
+
+_word_re = re.compile(r"\w+", re.UNICODE)
+
+
+def trigrams(s):
+    """Returns the set of trigrams of the string ``s``.
+
+    Each word is padded with two spaces in front and one at the end, so that
+    short words and word beginnings get more weight.
+
+    >>> sorted(trigrams("Up"))
+    [u'  u', u' up', u'up ']
+    """
+    if isinstance(s, str):
+        s = s.decode('utf-8', 'replace')
+
+    grams = set()
+    for w in _word_re.findall(s.lower()):
+        w = "  " + w + " "
+        for i in range(len(w) - 2):
+            grams.add(w[i:i + 3])
+    return grams
+
+
+class TrigramIndex(object):
+    """Inverted trigram index over titles.
+
+    Each title belongs to a document, numbered by the caller; a document can
+    have several titles (e.g. a title and an original title). ``search()``
+    returns the numbers of the documents along with their similarity scores.
+    """
+
+    def __init__(self):
+        self._gram_ids = {}            # trigram -> gram id
+        self._postings = []            # gram id -> array of titles (ascending)
+        self._grams = array('i')       # gram ids of all titles, in order
+        self._starts = array('i', [0])  # title -> start of its gram ids
+        self._docs = array('i')        # title -> document
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, title, doc):
+        """Adds ``title`` as a title of the document ``doc``, a number."""
+        t = len(self._docs)
+        for g in trigrams(title):
+            gid = self._gram_ids.get(g)
+            if gid is None:
+                gid = len(self._postings)
+                self._gram_ids[g] = gid
+                self._postings.append(array('i'))
+            self._postings[gid].append(t)
+            self._grams.append(gid)
+        self._starts.append(len(self._grams))
+        self._docs.append(doc)
+
+    def search(self, query, limit=20, threshold=0.3, max_postings=5000):
+        """Returns up to ``limit`` tuples ``(score, doc)``, best first.
+
+        ``score`` is the Dice coefficient of the trigram sets of ``query`` and
+        the best title of the document ``doc``, between 0 and 1. Titles with a
+        score below ``threshold`` are never returned.
+
+        At most ``max_postings`` posting list entries are visited to collect
+        candidates (but always at least the list of the rarest query trigram).
+        With a very common query this can miss titles that only share frequent
+        trigrams with the query, but those would not rank high anyway.
+        """
+        query_grams = trigrams(query)
+        nq = len(query_grams)
+        qgrams = [self._gram_ids[g] for g in query_grams
+                  if g in self._gram_ids]
+        if not qgrams:
+            return []
+
+        # A title can only reach the threshold if it shares at least
+        # min_overlap trigrams with the query, so it must contain at least one
+        # of the (len(qgrams) - min_overlap + 1) rarest query trigrams. We only
+        # walk the posting lists of those, which avoids the huge lists of
+        # common trigrams like "  t" or "the".
+        min_overlap = max(1, int(threshold * nq / 2.0))
+        qgrams.sort(key=lambda gid: len(self._postings[gid]))
+        prefix = qgrams[:max(1, len(qgrams) - min_overlap + 1)]
+
+        candidates = set()
+        visited = 0
+        for gid in prefix:
+            visited += len(self._postings[gid])
+            if visited > max_postings and candidates:
+                break
+            candidates.update(self._postings[gid])
+
+        # Score all candidates in one batch. The intersection of a set with an
+        # array is computed in C, which is what makes this fast.
+        qset = frozenset(qgrams)
+        best = {}
+        for t in candidates:
+            tgrams = self._grams[self._starts[t]:self._starts[t + 1]]
+            score = 2.0 * len(qset.intersection(tgrams)) / (nq + len(tgrams))
+            if score >= threshold:
+                doc = self._docs[t]
+                if score > best.get(doc, 0.0):
+                    best[doc] = score
+
+        return heapq.nlargest(limit, [(score, doc)
+                                      for doc, score in best.iteritems()])
+
+
+class Titles(object):
+    """A corpus of movies with a ``TrigramIndex`` over their titles.
+
+    The movies are numbered in insertion order, and their attributes are kept
+    in columns indexed by that number. ``movie()`` returns a movie as a hash in
+    the style of TMDb's search results, with the keys 'id', 'title',
+    'original_title', 'release_date' and 'kind'.
+    """
+
+    def __init__(self):
+        self.index = TrigramIndex()
+        self._ids = array('i')          # movie -> number of the IMDb id
+        self._titles = []               # movie -> title
+        self._original_titles = {}      # movie -> original title, if different
+        self._years = array('h')        # movie -> year, or 0
+        self._kinds = array('b')        # movie -> index in title_types
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, id, title, original_title, year, kind):
+        """Adds a movie with the IMDb id ``id`` ("tt" and a number), the year
+        ``year`` (or None) and the title type ``kind`` (see title_types).
+        Returns the number of the movie."""
+        doc = len(self._ids)
+        self._ids.append(int(id[2:]))
+        self._titles.append(title)
+        self._years.append(year or 0)
+        self._kinds.append(title_types.index(kind))
+        self.index.add(title, doc)
+        if original_title != title:
+            self._original_titles[doc] = original_title
+            self.index.add(original_title, doc)
+        return doc
+
+    def movie(self, doc):
+        """Returns the movie number ``doc`` as a movie hash."""
+        year = self._years[doc]
+        return {
+            'id': 'tt%07d' % self._ids[doc],
+            'title': self._titles[doc],
+            'original_title': self._original_titles.get(doc,
+                                                        self._titles[doc]),
+            'release_date': year and str(year) or '',
+            'kind': title_types[self._kinds[doc]],
+            }
+
+    def search(self, query, limit=20):
+        """Returns up to ``limit`` tuples ``(score, movie hash)``, best first;
+        see ``TrigramIndex.search()``."""
+        return [(score, self.movie(doc))
+                for score, doc in self.index.search(query, limit)]
+
+
+class LocalMovies(object):
+    """Search in local ``Titles``, with the ranking API of ``tmdb.Movies``.
+
+    ``info`` is the dictionary returned by ``releasename.parse()`` (or
+    ``PTN.parse()``) for the release name; its ``title`` is the search term and
+    its ``year`` (and ``season`` or ``episode``, if any) are used for reranking.
+    """
+
+    def __init__(self, titles, info, limit=20):
+        self.searched = info['title']
+        self.info = info
+        self.limit = limit
+        # We rerank more candidates than we return, since the year can move a
+        # candidate up considerably.
+        self.candidates = titles.search(self.searched, limit * 4)
+
+    def get_total_results(self):
+        return len(self.candidates)
+
+    def iter_results(self):
+        for score, m in self.candidates:
+            yield m
+
+    def get_ordered_matches(self):
+        """
+        Return a list of tuples. Each tuple's first element is a percentage
+        similarity between the search term and the tuple's second element's
+        'title' value, adjusted according to the year and the kind of the
+        release.
+
+        Ordered, descending, by the adjusted similarity.
+        """
+        our_results = []
+        for score, movie in self.candidates:
+            ratio = max(
+                    fuzzywuzzy.fuzz.ratio(self.searched, movie['title']),
+                    fuzzywuzzy.fuzz.ratio(self.searched,
+                                          movie['original_title']))
+            ratio += self._attribute_bonus(movie)
+            our_results.append((max(0, min(100, ratio)), movie))
+        our_results.sort(key=lambda r: r[0], reverse=True)
+        return our_results[:self.limit]
+
+    def get_best_match(self):
+        """
+        Returns a tuple whose first element is the percent similarity between
+        the search term and the tuple's second element's 'title' value.
+
+        The result is the best-matching result from the local index.
+        """
+        try:
+            return self.get_ordered_matches()[0]
+        except IndexError:
+            return
+
+    def _attribute_bonus(self, movie):
+        bonus = 0
+
+        year = self.info.get('year')
+        myear = movie['release_date'][0:4]
+        if year and myear.isdigit():
+            diff = abs(int(year) - int(myear))
+            if diff == 0:
+                bonus += 15
+            elif diff == 1:
+                # Festival vs. theatrical release dates often differ by a year.
+                bonus += 5
+            else:
+                bonus -= 10
+
+        # Season or episode numbers mean we are looking for a series.
+        series = 'season' in self.info or 'episode' in self.info
+        if series == (movie['kind'] in ['tvSeries', 'tvMiniSeries']):
+            bonus += 5
+
+        return bonus
+
+
+def to_movie(m, id):
+    """Converts the movie hash ``m`` of the corpus into a Movie object with
+    the id ``id`` (the IMDb id of ``m`` is kept as imdb_id)."""
+    title = m['title']
+    if title == m['original_title']:
+        title = ''
+    return Movie(m['original_title'], m['release_date'], '', str(id), '', '',
+                 imdb_id=m['id'], other_title=title)
+
+
+def load_title_basics(path, titles=None):
+    """Loads IMDb's ``title.basics.tsv`` (see datasets.imdbws.com) into
+    ``Titles`` and returns them."""
+    if titles is None:
+        titles = Titles()
+
+    fh = open(path, 'r')
+    try:
+        header = fh.readline().rstrip('\n').split('\t')
+        col = dict((name, i) for i, name in enumerate(header))
+        for line in fh:
+            f = line.rstrip('\n').split('\t')
+            if f[col['titleType']] not in title_types:
+                continue
+            year = f[col['startYear']]
+            titles.add(f[col['tconst']], f[col['primaryTitle']],
+                       f[col['originalTitle']],
+                       year != '\\N' and int(year) or None,
+                       f[col['titleType']])
+    finally:
+        fh.close()
+
+    return titles
@@ -0,0 +1,103 @@
+"""Journal of an offline run over a library, to resume it after a crash.
+
+While a run is going on, the file ``.imdbtag-journal`` in the library
+directory records, one JSON object per line:
+
+    {"done": "Heat (1995)"}
+    {"lookup": "name:Heat", "movie": {"title": "Heat", "year": "1995", ...}}
+
+that is, the entries that have been processed completely, and the results of
+lookups (null if nothing was found). The file is only ever appended to; lines
+are flushed as they are written and synced to disk at least every second. A
+run that finishes removes its journal, so a journal is only left behind by
+runs that were killed or crashed; a resumed run skips the entries that are
+done and takes the results of lookups from the journal.
+"""
+
+import os
+import json
+import time
+import logging
+
+import storage
+
+# Name of the journal file in the library directory.
+journal_file = '.imdbtag-journal'
+
+# Maximum time between two syncs of the journal to disk, in seconds.
+sync_interval = 1.0
+
+
+class Journal(object):
+    """The journal of a run over the library ``b``. With ``resume``, the
+    journal left behind by an earlier run is loaded and continued; otherwise,
+    a new journal is started."""
+
+    def __init__(self, b, resume=False):
+        self.path = os.path.join(b, journal_file)
+        self.entries = set()
+        self.lookups = {}
+        if resume and os.path.exists(self.path):
+            self._load()
+            logging.info('Resuming run: %d entries done, %d lookups known.' %
+                         (len(self.entries), len(self.lookups)))
+        self.file = open(self.path, 'a' if resume else 'w')
+        self.last_sync = time.time()
+
+    def is_done(self, f):
+        return f in self.entries
+
+    def done(self, *names):
+        """Records that the entries ``names`` are done."""
+        for f in names:
+            if f not in self.entries:
+                self.entries.add(f)
+                self._append({'done': storage.encode_name(f)})
+
+    def lookup(self, key):
+        """Returns a pair: whether the result of the lookup ``key`` is known,
+        and the result."""
+        if key not in self.lookups:
+            return False, None
+        return True, self.lookups[key]
+
+    def resolved(self, key, m):
+        """Records the movie ``m`` (or None) as result of the lookup ``key``."""
+        self.lookups[key] = m
+        self._append({'lookup': storage.encode_name(key),
+                      'movie': m is not None and storage.movie_fields(m)
+                      or None})
+
+    def close(self, complete=False):
+        """Closes the journal; with ``complete``, the run is done and the
+        journal is removed."""
+        self.file.close()
+        if complete:
+            os.remove(self.path)
+
+    def _append(self, record):
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        if time.time() - self.last_sync > sync_interval:
+            os.fsync(self.file.fileno())
+            self.last_sync = time.time()
+
+    def _load(self):
+        fh = open(self.path, 'r')
+        try:
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # The last line may be incomplete after a crash.
+                    continue
+                if 'done' in record:
+                    self.entries.add(storage.decode_name(record['done']))
+                elif 'lookup' in record:
+                    m = record['movie']
+                    key = storage.decode_name(record['lookup'])
+                    if m is not None:
+                        m = storage.movie_from_fields(m)
+                    self.lookups[key] = m
+        finally:
+            fh.close()
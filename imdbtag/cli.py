@@ -21,6 +21,35 @@ quietmode = False
 summary = False
 tvlabel = False
 recoverymode = False
+ratingsfile = None
+titlesfile = None
+jobs = 8
+recordfile = None
+replayfile = None
+replayfast = False
+showstats = False
+statsfile = None
+metricsfile = None
+tracefile = None
+showprogress = False
+traversal = 'memory'
+eventsfile = None
+writemanifest = False
+fix = False
+deadline = None
+resume = False
+autoaccept = None
+backend = 'tmdb'
+hedge = None
+hedgeafter = 1.0
+
+# Commands that can be given as first argument, instead of tagging the
+# directories and files on the command line.
+commands = ['refresh-ratings', 'audit', 'migrate-ids']
+command = None
+
+# Exit status of the program.
+exitstatus = 0
 
 
 def main():
@@ -29,10 +58,45 @@ def main():
     logging.basicConfig(
             format='%(levelname)s: %(message)s',
             level=logging.INFO)  # Default logging level
-    args = parse_options(sys.argv[1:])
+
+    global command
+    argv = sys.argv[1:]
+    if len(argv) > 0 and argv[0] in commands:
+        command = argv.pop(0)
+    args = parse_options(argv)
 
     setModuleConfig()
 
+    if tracefile is not None:
+        imdbtag.start_trace(tracefile)
+    if eventsfile is not None:
+        imdbtag.start_events(eventsfile)
+    try:
+        if command == 'refresh-ratings':
+            refresh_ratings(args)
+        elif command == 'audit':
+            audit(args)
+        elif command == 'migrate-ids':
+            migrate_ids(args)
+        else:
+            tag(args)
+    finally:
+        imdbtag.flush_manifests()
+        imdbtag.stop_events()
+        imdbtag.stop_trace()
+
+    if showstats:
+        imdbtag.print_stats()
+    if statsfile is not None:
+        imdbtag.write_stats(statsfile)
+    if metricsfile is not None:
+        imdbtag.write_metrics(metricsfile)
+
+    sys.exit(exitstatus)
+
+
+def tag(args):
+
     # Make sure argument is present
     if not (len(args) >= 1 or dirmode):
         logging.error("Syntax error.\n")
@@ -59,28 +123,107 @@ def main():
         imdbtag.print_offline_notifications()
 
 
+def refresh_ratings(args):
+    # The library directories can be given with -d or as arguments.
+    dirs = [a.rstrip('/') for a in args]
+    if dirmode:
+        dirs.append(directory)
+    if len(dirs) == 0:
+        logging.error("Syntax error.\n")
+        usage()
+        sys.exit(2)
+
+    for d in dirs:
+        imdbtag.refresh_ratings(d)
+
+
+def audit(args):
+    global exitstatus
+
+    dirs = [a.rstrip('/') for a in args]
+    if dirmode:
+        dirs.append(directory)
+    if len(dirs) == 0:
+        logging.error("Syntax error.\n")
+        usage()
+        sys.exit(2)
+
+    # Problems that are left make the audit fail, e.g. for cron jobs.
+    for d in dirs:
+        if imdbtag.audit(d, fix) > 0:
+            exitstatus = 1
+
+
+def migrate_ids(args):
+    global exitstatus
+
+    dirs = [a.rstrip('/') for a in args]
+    if dirmode:
+        dirs.append(directory)
+    if len(dirs) == 0:
+        logging.error("Syntax error.\n")
+        usage()
+        sys.exit(2)
+
+    for d in dirs:
+        if imdbtag.migrate_ids(d) > 0:
+            exitstatus = 1
+
+
 def setModuleConfig():
-    imdbtag.setConfig(
-            askmode,
-            clearmode,
-            forcemode,
-            offlinemode,
-            fileperm,
-            dirperm,
-            quietmode,
-            tvlabel,
-            recoverymode
-            )
+    # Backends without TMDb ids can't be used.
+    try:
+        imdbtag.setConfig(
+                askmode,
+                clearmode,
+                forcemode,
+                offlinemode,
+                fileperm,
+                dirperm,
+                quietmode,
+                tvlabel,
+                recoverymode,
+                ratingsfile,
+                jobs,
+                showprogress,
+                traversal,
+                writemanifest,
+                deadline,
+                resume,
+                autoaccept,
+                backend,
+                hedge,
+                hedgeafter,
+                titlesfile
+                )
+    except ValueError, e:
+        logging.error(str(e))
+        sys.exit(2)
+
+    if recordfile is not None:
+        imdbtag.use_cassette(recordfile)
+    elif replayfile is not None:
+        imdbtag.use_cassette(replayfile, replay=True,
+                             original_latency=not replayfast)
 
 
 def usage():
     print \
 """Usage: imdbtag [options] <directory|file> [, <directory|file>, ...]
              imdbtag [options] -d <directory>
+             imdbtag refresh-ratings [options] -d <directory>
+             imdbtag audit [options] -d <directory>
+             imdbtag migrate-ids [options] -d <directory>
 
 The first version renames the files and directories given on the command line.
 The second version renames all files and directories in the directory specified
-with -d.
+with -d. The third version updates the .rating files of all tagged directories
+in <directory>: from the local ratings dataset if --ratings is given, otherwise
+by fetching the movies that changed on TMDb since the last refresh. The fourth
+version checks the tagging files of all directories in <directory> for
+consistency, without any lookups, and exits with status 1 if problems are left.
+The fifth version replaces the IMDb ids in the .imdb files written by older
+versions of imdbtag by TMDb ids, and exits with status 1 if some are left.
 
 Options: -h      Display help text.
                  -i      Always ask for confirmation
@@ -102,6 +245,86 @@ Options: -h      Display help text.
                  -D <perm>
                              Explicitly specify directory permissions. This works like -F but
                              applies to created directories. E.g., -D 775
+                 -j <jobs>
+                             Number of lookups to run in parallel where possible
+                             (default 8). In interactive directory mode, the
+                             lookups for the next directories are started in the
+                             background.
+                 --ratings <file>
+                             Take ratings from IMDb's title.ratings.tsv dataset
+                             (https://datasets.imdbws.com/) instead of TMDb.
+                 --titles <file>
+                             Look up names in IMDb's title.basics.tsv dataset
+                             first, and only search TMDb if it has no clear
+                             match.
+                 --record <file>
+                             Record all API requests and responses, with their
+                             timing, to <file>.
+                 --replay <file>
+                             Serve all API requests from a file recorded with
+                             --record instead of the network, with the recorded
+                             latency.
+                 --replay-fast
+                             With --replay, serve responses without latency.
+                 --stats
+                             Print timing statistics at the end: time spent in
+                             each processing phase, API requests and latencies
+                             per endpoint, and cache hit rates.
+                 --stats-json <file>
+                             Write the statistics as JSON document to <file>
+                             ("-" for standard output).
+                 --metrics-file <file>
+                             Write metrics of the run to <file> in Prometheus
+                             format, e.g. for node-exporter's textfile collector.
+                 --progress
+                             In directory mode, show the progress, throughput and
+                             estimated remaining time on standard error.
+                 --resume
+                             In offline directory mode, continue a run that was
+                             killed or crashed: skip the entries it finished and
+                             reuse its lookups.
+                 --auto-accept <confidence>
+                             Take the best match without asking if its
+                             confidence (0 to 1) is at least <confidence>; in
+                             directory mode, ask about the other directories at
+                             the end. In offline mode, only tag directories with
+                             a match of at least <confidence>.
+                 --backend <name>
+                             Look up movies with the backend <name> (default
+                             tmdb, the only one so far).
+                 --hedge <name>
+                             Send lookups that the backend hasn't answered after
+                             --hedge-after seconds to the backend <name> too,
+                             and take the first answer. <name> can be the same
+                             backend.
+                 --hedge-after <seconds>
+                             Latency after which lookups are hedged (default
+                             1).
+                 --deadline <seconds>
+                             In directory mode, process the newest entries first
+                             and stop before <seconds> have passed. The next run
+                             with --deadline goes on where this one stopped.
+                 --stream
+                             In directory mode, process the entries in the order
+                             in which they are read, starting right away. For
+                             huge directories.
+                 --external-sort
+                             Like --stream, but process the entries in sorted
+                             order, sorting with temporary files.
+                 --manifest
+                             Keep the manifest file .imdbtag-manifest in the
+                             library directory up to date: one record per tagged
+                             directory, with name, ids, rating and original name.
+                 --fix
+                             With audit, fix the problems that can be fixed
+                             safely.
+                 --events <file>
+                             Append an event for every processed entry to <file>
+                             ("-" for standard output) as soon as it is done, as
+                             JSON lines.
+                 --trace <file>
+                             Write a trace of all processing phases and API
+                             requests to <file>, for chrome://tracing or Perfetto.
 """
 
 
@@ -112,12 +335,20 @@ def parse_options(args):
     global directory, offlinemode, clearmode
     global fileperm, dirperm
     global quietmode, summary, tvlabel
-    global recoverymode
+    global recoverymode, ratingsfile, titlesfile, jobs
+    global recordfile, replayfile, replayfast
+    global showstats, statsfile, metricsfile, tracefile, showprogress
+    global traversal, eventsfile, writemanifest, fix, deadline, resume
+    global autoaccept, backend, hedge, hedgeafter
 
     # Parse options using Getopt; display an error and exit if options could
     # not be parsed.
     try:
-        opts, args = getopt.getopt(args, "hvifcord:qstF:D:")
+        opts, args = getopt.getopt(args, "hvifcord:qstF:D:j:", [
+            "ratings=", "titles=", "record=", "replay=", "replay-fast", "stats",
+            "stats-json=", "metrics-file=", "trace=", "progress", "stream",
+            "external-sort", "events=", "manifest", "fix", "deadline=", "resume",
+            "auto-accept=", "backend=", "hedge=", "hedge-after="])
     except getopt.GetoptError, err:
         logging.error(str(err))
         usage()
@@ -189,6 +420,121 @@ def parse_options(args):
                 logging.debug('Setting directory permissions to ' +
                               oct(dirperm))
 
+        elif opt == "-j":
+            try:
+                jobs = max(1, int(val))
+            except ValueError:
+                logging.error('Illegal number of jobs.')
+            else:
+                logging.debug('Running up to %d lookups in parallel.' % jobs)
+
+        elif opt == "--ratings":
+            ratingsfile = val
+            logging.debug('Using ratings file "' + ratingsfile + '".')
+
+        elif opt == "--titles":
+            titlesfile = val
+            logging.debug('Using titles file "' + titlesfile + '".')
+
+        elif opt == "--record":
+            recordfile = val
+            logging.debug('Recording API traffic to "' + recordfile + '".')
+
+        elif opt == "--replay":
+            replayfile = val
+            logging.debug('Replaying API traffic from "' + replayfile + '".')
+
+        elif opt == "--replay-fast":
+            replayfast = True
+            logging.debug('Replaying without latency.')
+
+        elif opt == "--stats":
+            showstats = True
+            logging.debug('Statistics enabled.')
+
+        elif opt == "--stats-json":
+            statsfile = val
+            logging.debug('Writing statistics to "' + statsfile + '".')
+
+        elif opt == "--metrics-file":
+            metricsfile = val
+            logging.debug('Writing metrics to "' + metricsfile + '".')
+
+        elif opt == "--progress":
+            showprogress = True
+            logging.debug('Progress display enabled.')
+
+        elif opt == "--resume":
+            resume = True
+            logging.debug('Resuming an interrupted run.')
+
+        elif opt == "--deadline":
+            try:
+                deadline = float(val)
+            except ValueError:
+                logging.error('Illegal deadline.')
+            else:
+                logging.debug('Stopping after %g seconds.' % deadline)
+
+        elif opt == "--auto-accept":
+            try:
+                autoaccept = float(val)
+            except ValueError:
+                autoaccept = -1
+            if not 0 <= autoaccept <= 1:
+                logging.error('Illegal confidence for --auto-accept.')
+                autoaccept = None
+            else:
+                logging.debug('Auto-accepting matches with a confidence of '
+                              'at least %g.' % autoaccept)
+
+        elif opt == "--backend":
+            if val not in imdbtag.apis.backends:
+                logging.error('Unknown backend "' + val + '".')
+            else:
+                backend = val
+                logging.debug('Looking up movies with ' + val + '.')
+
+        elif opt == "--hedge":
+            if val not in imdbtag.apis.backends:
+                logging.error('Unknown backend "' + val + '".')
+            else:
+                hedge = val
+                logging.debug('Hedging slow lookups with ' + val + '.')
+
+        elif opt == "--hedge-after":
+            try:
+                hedgeafter = float(val)
+            except ValueError:
+                logging.error('Illegal latency for --hedge-after.')
+            else:
+                logging.debug('Hedging lookups after %g seconds.' %
+                              hedgeafter)
+
+        elif opt == "--stream":
+            traversal = 'stream'
+            logging.debug('Streaming traversal enabled.')
+
+        elif opt == "--external-sort":
+            traversal = 'external'
+            logging.debug('Streaming traversal with external sort enabled.')
+
+        elif opt == "--manifest":
+            writemanifest = True
+            logging.debug('Library manifest enabled.')
+
+        elif opt == "--fix":
+            fix = True
+            logging.debug('Fixing problems found by the audit.')
+
+        elif opt == "--events":
+            eventsfile = val
+            logging.debug('Writing events to "' + eventsfile + '".')
+
+        elif opt == "--trace":
+            tracefile = val
+            logging.debug('Writing trace to "' + tracefile + '".')
+
         else:
             assert False, "unhandled option"
 
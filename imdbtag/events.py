@@ -0,0 +1,76 @@
+"""Machine-readable log of the processing results, one event per entry.
+
+Every event is a JSON object on a line of its own, written (and flushed) as
+soon as the entry is processed, so that other programs can follow a run while
+it is going on:
+
+    {"time": "2024-05-01T20:15:02Z", "outcome": "renamed",
+     "old": "Heat.1995.1080p.BluRay", "new": "Heat (1995)", "tmdb_id": "949"}
+
+The outcome is one of "renamed", "unchanged", "unknown", "ignored", "cleared",
+"skipped", "deferred" and "error"; for errors, "message" contains the error
+message.
+"""
+
+import sys
+import json
+import time
+import threading
+
+_lock = threading.Lock()
+_file = None
+
+
+def start(path):
+    """Starts writing events to the file ``path``, or to standard output if
+    ``path`` is "-"."""
+    global _file
+    with _lock:
+        if path == '-':
+            _file = sys.stdout
+        else:
+            _file = open(path, 'a')
+
+
+def stop():
+    global _file
+    with _lock:
+        if _file is not None and _file is not sys.stdout:
+            _file.close()
+        _file = None
+
+
+def active():
+    return _file is not None
+
+
+def emit(outcome, old, new=None, **fields):
+    """Writes the event for the entry ``old`` with the outcome ``outcome``;
+    ``new`` is the name of the entry after processing. Further fields with a
+    value other than None are included as they are."""
+    if _file is None:
+        return
+
+    e = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'outcome': outcome,
+        'old': _text(old),
+        'new': _text(new if new is not None else old),
+        }
+    for k, v in fields.items():
+        if v is not None:
+            e[k] = _text(v)
+    s = json.dumps(e, sort_keys=True)
+
+    with _lock:
+        if _file is None:
+            return
+        _file.write(s + '\n')
+        _file.flush()
+
+
+def _text(s):
+    # File names are byte strings, but not necessarily valid UTF-8.
+    if isinstance(s, str):
+        return s.decode(sys.getfilesystemencoding() or 'utf-8', 'replace')
+    return s
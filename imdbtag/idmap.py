@@ -0,0 +1,94 @@
+"""Mapping of IMDb ids to TMDb ids.
+
+IMDb ids turn up in NFO files and names (see localids.py), and the .imdb files
+written by older versions of imdbtag, which used IMDb, contain IMDb ids
+("tt0113277") instead of TMDb ids ("tt949"). TMDb's find endpoint turns an
+IMDb id into a TMDb id. As the mapping never changes, the answers are kept in
+``~/.imdbtag/idmap.json``:
+
+    {"tt0113277": "949", "tt0000000": null}
+
+where null means that TMDb doesn't know the IMDb id. The file is rewritten at
+most every few seconds and at the end of a run.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+
+import storage
+
+# File in which the mapping is kept.
+idmap_file = os.path.expanduser(os.path.join('~', '.imdbtag', 'idmap.json'))
+
+# Minimum time between two writes of the mapping, in seconds.
+flush_interval = 10
+
+_lock = threading.Lock()
+_idmap = None   # IMDb id -> TMDb id, or None if TMDb doesn't know it
+_dirty = False
+_last_flush = time.time()
+
+
+def lookup(imdb_id):
+    """Returns the pair (known, tmdb_id) for the IMDb id ``imdb_id``, where
+    known tells whether the IMDb id was looked up before, and tmdb_id is None
+    if TMDb didn't know it."""
+    with _lock:
+        m = _load()
+        return imdb_id in m, m.get(imdb_id)
+
+
+def record(imdb_id, tmdb_id):
+    """Remembers the TMDb id ``tmdb_id`` (None if there is none) for the IMDb
+    id ``imdb_id``, and writes the mapping if it is due."""
+    global _dirty
+    with _lock:
+        _load()[imdb_id] = tmdb_id
+        _dirty = True
+        _flush(False)
+
+
+def flush():
+    """Writes the mapping if it has changes."""
+    with _lock:
+        _flush(True)
+
+
+def _load():
+    global _idmap
+    if _idmap is not None:
+        return _idmap
+
+    _idmap = {}
+    if os.path.exists(idmap_file):
+        fh = open(idmap_file, 'r')
+        try:
+            for k, v in json.load(fh).items():
+                _idmap[str(k)] = v is not None and str(v) or None
+        except ValueError:
+            logging.warning('Ignoring damaged id map "' + idmap_file + '".')
+        finally:
+            fh.close()
+    return _idmap
+
+
+def _flush(force):
+    global _dirty, _last_flush
+    if not _dirty:
+        return
+    if not force and time.time() - _last_flush < flush_interval:
+        return
+    d = os.path.dirname(idmap_file)
+    try:
+        if not os.path.isdir(d):
+            os.makedirs(d)
+        storage.atomic_write(idmap_file,
+                             json.dumps(_idmap, indent=2, sort_keys=True,
+                                        separators=(',', ': ')) + '\n')
+    except (IOError, OSError):
+        logging.error('Could not write the id map to "' + idmap_file + '".')
+    _dirty = False
+    _last_flush = time.time()
@@ -2,28 +2,52 @@ import sys
 import os
 import re
 import logging
-
-# To use TheMovieDB.org
+import datetime
+import time
+import threading
+import functools
+import collections
+from multiprocessing.pool import ThreadPool
+
+import aliases
+import checkpoint
+import events
+import idmap
+import localids
+import lookups
+import manifest
+import metrics
+import planner
+import probe
+import progress
+import ratings
+import releasename
+import schedule
+import scoring
+import spill
+import stats
+import storage
+import tracing
+import traversal
+
+# TheMovieDB.org, for the requests only TMDb has (changes, find, cassettes).
+# Movies are looked up with the backend chosen in setConfig(), see
+# apis/__init__.py. (However, know that as of today 2012-12-29, IMDB search
+# doesn't work anymore with IMDbPy.)
+import apis
 from apis import tmdbapi
-
-# Alternatively, to use IMDb, use the following import instead:
-# (However, know that as of today 2012-12-29, IMDB search doesn't work anymore
-# with IMDbPy.)
-# from apis.imdbapi import *
-
-# We use the useful parse-torrent-name library to parse the movie name; much
-# better way to do it than the old, manual, regex-based way.
-try:
-    import PTN
-except ImportError:
-    logging.error("You need to install the PTN package!\n")
-    logging.error("See github.com/divijbindlish/parse-torrent-name\n")
-    sys.exit(1)
+from apis import trigram
 
 import warnings
 warnings.filterwarnings('ignore', '.*no module named lxml.*')
 warnings.filterwarnings('ignore', 'falling back to "beautifulsoup"')
 
+# Collect timing statistics of all API requests, and of the time we had to
+# wait because of rate limiting.
+tmdbapi.api_add_observer(stats.http)
+tmdbapi.api_add_rate_limit_observer(
+        functools.partial(stats.add_time, 'rate limit wait'))
+
 # Global config object
 basicConfig = {
         'askmode': False,
@@ -35,20 +59,76 @@ basicConfig = {
         'quietmode': False,
         'tvlabel': False,
         'recoverymode': False,
+        'ratingsfile': None,
+        'jobs': 8,
+        'showprogress': False,
+        'traversal': 'memory',
+        'manifest': False,
+        'deadline': None,
+        'resume': False,
+        'autoaccept': None,
+        'backend': 'tmdb',
+        'hedge': None,
+        'hedgeafter': 1.0,
+        'titlesfile': None,
         }
 
+# Backend for movie lookups, see setConfig().
+lookup_backend = tmdbapi
+
 
 # Two lists for notifications in offline mode. The first is for notifications
 # of renamings done, the second for unknown movies (where no IMDb match was
-# found).
+# found). Only the most recent entries are kept in memory, the rest is
+# written to a temporary file.
 # Note: Using global variables is definitely not the nicest way to do this.
 # This will have to be part of a next refactoring round, so I am adding a TODO
 # marker for now.
-notifications_rename = []
-notifications_unknown = []
+notifications_rename = spill.SpillList()
+notifications_unknown = spill.SpillList()
 notifications_nb_unchanged = 0
 notifications_nb_ignored = 0
 
+# Outcome of the entry that is currently being processed, for the event log.
+current_outcome = None
+
+# Journal of the current offline run over a library, see checkpoint.py.
+journal = None
+
+# Background lookups for the next entries in interactive mode, and how many
+# entries ahead they are started.
+prefetcher = None
+prefetch_depth = 5
+
+# Number of candidates in the interactive picker for which details (runtime,
+# director, etc.) are shown.
+enrich_count = 10
+
+# Directories left for the user to decide on, once all others are done, when
+# matches above the auto-accept threshold are taken without asking.
+deferred = None
+
+# Start of the current streaming run: the traversal may come across the
+# directories that were created or renamed after it again. Their inode change
+# time tells them apart, so that their names need not be kept.
+stream_started = None
+
+# The local ratings table, opened on first use if a ratings file is configured.
+ratings_table = None
+
+# Ids found in the entries whose lookups were prefetched (see localids.py),
+# until the entries are tagged, so that their NFO files are only read once.
+prefetched_ids = {}
+
+# The local title index (see apis/trigram.py), loaded on first use if a titles
+# file is configured. It is first used by the background lookups, hence the
+# lock.
+titles_index = None
+titles_lock = threading.Lock()
+
+# Name of the file in a library directory that records the last rating refresh.
+refresh_file = '.imdbtag-refresh'
+
 
 # This method allows clients of the module to set certain global options. This
 # is probably not the most beautiful way to handle this. For now, it is
@@ -63,7 +143,19 @@ def setConfig(
         dirperm=None,
         quietmode=False,
         tvlabel=False,
-        recoverymode=False
+        recoverymode=False,
+        ratingsfile=None,
+        jobs=8,
+        showprogress=False,
+        traversal='memory',
+        manifest=False,
+        deadline=None,
+        resume=False,
+        autoaccept=None,
+        backend='tmdb',
+        hedge=None,
+        hedgeafter=1.0,
+        titlesfile=None
         ):
     basicConfig['askmode'] = askmode
     basicConfig['clearmode'] = clearmode
@@ -74,6 +166,57 @@ def setConfig(
     basicConfig['quietmode'] = quietmode
     basicConfig['tvlabel'] = tvlabel
     basicConfig['recoverymode'] = recoverymode
+    basicConfig['ratingsfile'] = ratingsfile
+    basicConfig['jobs'] = jobs
+    basicConfig['showprogress'] = showprogress
+    basicConfig['traversal'] = traversal
+    basicConfig['manifest'] = manifest
+    basicConfig['deadline'] = deadline
+    basicConfig['resume'] = resume
+    basicConfig['autoaccept'] = autoaccept
+    basicConfig['backend'] = backend
+    basicConfig['hedge'] = hedge
+    basicConfig['hedgeafter'] = hedgeafter
+    basicConfig['titlesfile'] = titlesfile
+
+    _check_traversal(traversal)
+
+    # With a hedge backend, lookups that the backend doesn't answer within
+    # hedgeafter seconds are sent to the hedge backend too.
+    global lookup_backend
+    lookup_backend = apis.get(backend)
+    # The .imdb files, the ids in NFO files and the id map all hold TMDb ids,
+    # which a backend with other ids would take for ids of other movies.
+    if lookup_backend.ids != 'tmdb':
+        raise ValueError('The ' + backend + ' backend uses ' +
+                         lookup_backend.ids + ' ids, but imdbtag needs a '
+                         'backend with TMDb ids.')
+    if hedge is not None:
+        lookup_backend = apis.hedged(lookup_backend, apis.get(hedge),
+                                     hedgeafter, _notice_hedge)
+
+
+def _check_traversal(kind):
+    # Without scandir, the streaming traversals would still read the whole
+    # directory at once, which is what they are meant to avoid.
+    if kind != 'memory' and traversal.scandir is None:
+        raise ValueError('Streaming traversals need os.scandir, install the '
+                         'scandir package.')
+
+
+def _notice_hedge(event):
+    if event == 'hedged':
+        stats.count('hedged lookups')
+    else:
+        stats.count('hedges won')
+
+
+def use_cassette(path, replay=False, original_latency=True):
+    """Records all API requests and responses, with their timing, to the file
+    ``path``. With ``replay``, the requests are served from a file recorded
+    earlier instead, with the recorded latency unless ``original_latency`` is
+    False."""
+    tmdbapi.api_use_cassette(path, replay, original_latency)
 
 
 def process_directory(b):
@@ -84,13 +227,565 @@ def process_directory(b):
         logging.error("Directory " + b + " does not exist.\n")
         return
 
+    global stream_started, journal, prefetcher, deferred
+
+    # In the default traversal, the whole directory is read and sorted before
+    # processing starts. For huge directories, the streaming traversals start
+    # right away and use a bounded amount of memory; the number of entries is
+    # then unknown in advance.
+    total = None
+    plan = None
+    if basicConfig['deadline'] is not None:
+        # With a time budget, the newest entries come first, see schedule.py.
+        with stats.phase('scan'):
+            plan = schedule.Schedule(b, os.listdir(b), basicConfig['deadline'])
+        entries = plan
+        total = len(plan)
+    elif basicConfig['traversal'] == 'stream':
+        entries = traversal.entries(b)
+        # File system times are coarser than time.time(); an entry changed in
+        # the second before the run is left for the next one.
+        stream_started = time.time() - 1
+    elif basicConfig['traversal'] == 'external':
+        entries = traversal.sorted_entries(b)
+    else:
+        with stats.phase('scan'):
+            entries = os.listdir(b)
+            entries.sort()
+        total = len(entries)
+
+    # Offline runs can be resumed if they don't get to finish.
+    if basicConfig['offlinemode']:
+        journal = checkpoint.Journal(b, basicConfig['resume'])
+
+    # In interactive mode, the lookups for the next entries run while the user
+    # answers the prompts for the current one.
+    elif not basicConfig['clearmode'] and not basicConfig['recoverymode']:
+        prefetcher = lookups.Lookups(_planned_query,
+                                     lookup_backend.api_get_movie,
+                                     basicConfig['jobs'])
+        entries = _prefetching(b, entries)
+        # Confident matches are taken right away; the user gets to decide on
+        # the others at the end, in one go.
+        if basicConfig['autoaccept'] is not None:
+            deferred = spill.SpillList()
+
+    if basicConfig['showprogress']:
+        progress.start(total)
+    complete = False
+    try:
+        for f in entries:
+            if stream_started is not None and \
+                    _changed_since(b, f, stream_started):
+                logging.debug('Skipping "' + f + '", created in this run.')
+                continue
+            if journal is not None and journal.is_done(f):
+                logging.debug('Skipping "' + f + '", done before resuming.')
+                stats.count('resumed')
+                progress.step()
+                continue
+            process(b, f)
+            progress.step()
+        if deferred:
+            queue, deferred = deferred, None
+            print "%d directories need your decision." % len(queue)
+            for d in _prefetching(b, queue):
+                process(b, d)
+            queue.close()
+        complete = plan is None or plan.complete
+    finally:
+        progress.finish()
+        stream_started = None
+        if deferred is not None:
+            deferred.close()
+            deferred = None
+        if plan is not None:
+            plan.finish()
+        if journal is not None:
+            journal.close(complete)
+            journal = None
+        if prefetcher is not None:
+            prefetcher.close()
+            prefetcher = None
+        prefetched_ids.clear()
+
+    # Directories that were removed or renamed behind our back.
+    if basicConfig['manifest']:
+        manifest.retain(b, traversal.entries(b))
+        flush_manifests()
+
+
+def _prefetching(b, entries):
+    """Returns the entries of ``entries``, starting the lookups for each one
+    ``prefetch_depth`` entries before it is returned."""
+    window = collections.deque()
+    for f in entries:
+        window.append(f)
+        _prefetch(b, f)
+        if len(window) > prefetch_depth:
+            yield window.popleft()
+    while window:
+        yield window.popleft()
+
+
+def _prefetch(b, f):
+    # Only the lookups that _tag() will make; see _get_correct_name().
+    if _is_ignored(b, f):
+        return
+    if _is_directory(os.path.join(b, f)):
+        if basicConfig['forcemode']:
+            prefetcher.prefetch_query(_search_query(b, f), enrich_count)
+        elif _has_name_file(b, f):
+            return
+        elif _has_legacy_imdb_file(b, f) or _has_ambiguous_imdb_file(b, f):
+            # The id is resolved when the entry is tagged.
+            return
+        elif _has_imdb_file(b, f):
+            prefetcher.prefetch_movie(_id_from_file(b, f))
+        else:
+            found = localids.find(b, f, _clean_query(f)[0])
+            prefetched_ids[f] = found
+            if found is None:
+                prefetcher.prefetch_query(_search_query(b, f), enrich_count)
+            elif found[0] == 'tmdb':
+                prefetcher.prefetch_movie(found[1])
+    elif _is_movie_file(f):
+        prefetcher.prefetch_query(_search_query(b, f), enrich_count)
+
+
+def reset_notifications():
+    """Forgets the notifications collected so far."""
+    global notifications_nb_unchanged, notifications_nb_ignored
+    notifications_rename.close()
+    notifications_unknown.close()
+    notifications_nb_unchanged = 0
+    notifications_nb_ignored = 0
+
+
+def refresh_ratings(b):
+    """Rewrites the .rating files of the tagged directories in ``b``.
+
+    With a local ratings dataset, all ratings are taken from the dataset,
+    without any API calls. Otherwise, we ask TMDb which movies changed since
+    the last refresh of ``b`` and only fetch those that are in ``b``.
+    """
+
+    if not _is_directory(b):
+        logging.error("Directory " + b + " does not exist.\n")
+        return
+
+    if _ratings_table() is not None:
+        _refresh_ratings_local(b)
+    else:
+        _refresh_ratings_changed(b)
+
+
+def _refresh_ratings_local(b):
+    table = _ratings_table()
     entries = os.listdir(b)
     entries.sort()
-    for f in entries:
-        process(b, f)
+    nb_updated = 0
+    for d in entries:
+        if _is_ignored(b, d) or not _is_directory(os.path.join(b, d)) or \
+                not _has_imdbid_file(b, d):
+            continue
+
+        r = table.lookup(_imdbid_from_file(b, d))
+        if r is None:
+            logging.debug('No rating found for "' + d + '".')
+        elif _update_rating_file(b, d, r):
+            nb_updated += 1
+
+    logging.info('%d ratings updated.' % nb_updated)
+
+
+def _refresh_ratings_changed(b):
+    # We remember the date of the last refresh in a file in the library
+    # directory itself (it starts with a dot, so it is never processed).
+    statefile = os.path.join(b, refresh_file)
+    today = datetime.date.today()
+
+    # Map TMDb ids to the directories tagged with them. Directories with an
+    # IMDb id in their .imdb file need a migration first.
+    tagged = {}
+    nb_legacy = 0
+    for d in os.listdir(b):
+        if _is_ignored(b, d) or not _is_directory(os.path.join(b, d)) or \
+                not _has_imdb_file(b, d):
+            continue
+        if _has_legacy_imdb_file(b, d):
+            nb_legacy += 1
+        else:
+            tagged.setdefault(_id_from_file(b, d), []).append(d)
+    if nb_legacy > 0:
+        logging.warning('Skipping %d directories with IMDb ids of an older '
+                        'version of imdbtag; run "imdbtag migrate-ids" first.'
+                        % nb_legacy)
+
+    if os.path.exists(statefile):
+        since = _date_from_file(statefile)
+        logging.info('Asking TMDb for movies changed since %s.' % since)
+        try:
+            changed = tmdbapi.api_changed_movies(since, today)
+        except Exception, e:
+            logging.error('Could not get changes from TMDb: %s' % e)
+            return
+        ids = [i for i in tagged if i in changed]
+    else:
+        logging.info('First refresh of "' + b + '", refreshing all ratings.')
+        ids = tagged.keys()
+
+    logging.info('%d of %d tagged movies need a refresh.' %
+                 (len(ids), len(tagged)))
+
+    def refresh(id):
+        try:
+            m = lookup_backend.api_get_movie(id)
+        except Exception, e:
+            logging.error('Could not get movie %s: %s' % (id, e))
+            return None
+        return [_update_rating_file(b, d, _movie_rating(m))
+                for d in tagged[id]]
+
+    pool = ThreadPool(basicConfig['jobs'])
+    try:
+        results = pool.map(refresh, ids)
+    finally:
+        pool.close()
+
+    logging.info('%d ratings updated.' %
+                 sum(sum(r) for r in results if r is not None))
+
+    # Only advance the refresh date if all lookups worked, so that failed
+    # ones are retried next time.
+    if None in results:
+        logging.error('Some ratings could not be refreshed.')
+    else:
+        storage.atomic_write(statefile, today.isoformat() + '\n')
+
+
+def audit(b, fix=False):
+    """Checks the tagging files of all directories in ``b`` for consistency,
+    without any lookups, and prints the problems found. With ``fix``, the
+    problems that can be fixed safely are fixed. Returns the number of
+    problems that are left."""
+
+    if not _is_directory(b):
+        logging.error("Directory " + b + " does not exist.\n")
+        return 0
+
+    entries = os.listdir(b)
+    entries.sort()
+
+    def check(d):
+        return d, _audit_directory(b, d)
+
+    nb_problems = 0
+    nb_fixed = 0
+    pool = ThreadPool(basicConfig['jobs'])
+    try:
+        # Fixes are made here, one directory at a time, since renamings could
+        # collide.
+        for d, problems in pool.imap(check, entries, 64):
+            n = d
+            for problem, message in problems:
+                fixed = fix and _audit_fix(b, n, problem)
+                if fixed:
+                    print '"' + d + '": ' + message + ' (fixed)'
+                    nb_fixed += 1
+                    n = fixed
+                else:
+                    print '"' + d + '": ' + message
+                    nb_problems += 1
+
+            if n != d and basicConfig['manifest']:
+                manifest.update(b, d, None)
+            if problems and basicConfig['manifest']:
+                manifest.update(b, n, _manifest_record(b, n))
+    finally:
+        pool.close()
+
+    logging.info('%d entries checked, %d problems found, %d fixed.' %
+                 (len(entries), nb_problems + nb_fixed, nb_fixed))
+    return nb_problems
+
+
+def _audit_directory(b, d):
+    """Returns the list of problems of the directory ``d``, as pairs of
+    problem and message."""
+    if not _is_directory(os.path.join(b, d)) or _is_ignored(b, d):
+        return []
+
+    problems = []
+    if _has_name_file(b, d):
+        n = _name_from_file(b, d)
+        if n != d:
+            problems.append(('name', 'Directory name differs from .name ("'
+                             + n + '").'))
+
+    # A custom name without a match leaves only a .name file, but a rating or
+    # an IMDb id is only written along with the .imdb file.
+    if not _has_imdb_file(b, d) and (_has_rating_file(b, d)
+                                     or _has_imdbid_file(b, d)):
+        problems.append(('no imdb', 'Missing .imdb file.'))
+
+    if _has_imdb_file(b, d):
+        i = _text_from_file(b, d, '.imdb')
+        if not re.match(r'^tt\d+$', i):
+            problems.append(('imdb', 'Malformed id in .imdb ("' + i + '").'))
+        elif _has_legacy_imdb_file(b, d):
+            problems.append(('legacy', 'IMDb id in .imdb ("' + i + '"), run '
+                             '"imdbtag migrate-ids".'))
+
+    if _has_imdbid_file(b, d):
+        i = _imdbid_from_file(b, d)
+        if not re.match(r'^tt\d+$', i):
+            problems.append(('imdbid', 'Malformed id in .imdbid ("' + i +
+                             '").'))
+
+    # An .original file is needed to recover the original name, but one that
+    # is empty or contains the current name is of no use.
+    if _has_original_file(b, d):
+        o = _original_from_file(b, d)
+        if o == '' or o == d:
+            problems.append(('original', 'Orphaned .original file.'))
+
+    return problems
+
+
+def _audit_fix(b, d, problem):
+    """Fixes ``problem`` of the directory ``d`` if that can be done safely.
+    Returns the name of the directory afterwards, or None if the problem was
+    not fixed."""
+    if problem == 'original':
+        _remove_file(b, d, '.original')
+        return d
+
+    if problem in ['imdb', 'imdbid']:
+        # Only fix ids that are unambiguous, e.g. " 123" or "TT123".
+        f = '.' + problem
+        m = re.match(r'^\s*(?:tt)?(\d+)\s*$', _text_from_file(b, d, f),
+                     re.IGNORECASE)
+        if m is None:
+            return None
+        _set_file(b, d, f, 'tt' + m.group(1))
+        return d
+
+    if problem == 'name':
+        n = _name_from_file(b, d)
+        if n == '' or '/' in n or os.path.exists(os.path.join(b, n)):
+            return None
+        try:
+            os.rename(os.path.join(b, d), os.path.join(b, n))
+        except OSError:
+            logging.error('Could not rename "' + d + '" to "' + n + '".')
+            return None
+        return n
+
+    return None
+
+
+def migrate_ids(b):
+    """Replaces the IMDb ids in the .imdb files of the directories in ``b``
+    that were tagged by older versions of imdbtag, which used IMDb, by their
+    TMDb ids, and writes the IMDb ids to .imdbid files. The ids are resolved
+    in parallel. Ids that could be IMDb ids as well as TMDb ids (see
+    _has_ambiguous_imdb_file()) are only reported, with the movie of each
+    reading. Returns the number of directories that could not be
+    migrated."""
+
+    if not _is_directory(b):
+        logging.error("Directory " + b + " does not exist.\n")
+        return 0
+
+    entries = [d for d in sorted(os.listdir(b))
+               if not _is_ignored(b, d) and
+               _is_directory(os.path.join(b, d)) and
+               (_has_legacy_imdb_file(b, d) or
+                _has_ambiguous_imdb_file(b, d))]
+
+    # Returns the outcome for d: 'migrate' with the TMDb id, 'ambiguous' with
+    # the movies of both readings (or None), 'kept' for ids that are only
+    # TMDb ids, 'unknown' or 'error'.
+    def resolve(d):
+        id = _id_from_file(b, d)
+        try:
+            tmdb_id = _tmdb_id_for_imdb_id('tt' + id)
+            if not _has_ambiguous_imdb_file(b, d):
+                return d, id, tmdb_id and 'migrate' or 'unknown', tmdb_id
+            if tmdb_id is None:
+                return d, id, 'kept', None
+            as_imdb_id = _movie_by_id(tmdb_id)
+            try:
+                as_tmdb_id = _movie_by_id(id)
+            except Exception:
+                as_tmdb_id = None
+            return d, id, 'ambiguous', (as_tmdb_id, as_imdb_id)
+        except Exception, e:
+            logging.error('Could not look up id tt' + id + ' of "' + d +
+                          '": ' + str(e))
+            return d, id, 'error', None
+
+    counts = dict.fromkeys(['migrate', 'ambiguous', 'kept', 'unknown',
+                            'error'], 0)
+    pool = ThreadPool(basicConfig['jobs'])
+    try:
+        for d, id, outcome, r in pool.imap(resolve, entries, 64):
+            counts[outcome] += 1
+            if outcome == 'unknown':
+                print '"' + d + '": tt' + id + ' not found on TMDb.'
+            elif outcome == 'ambiguous':
+                as_tmdb_id, as_imdb_id = r
+                print '"%s": tt%s is ambiguous (as TMDb id %s, as IMDb id ' \
+                    '"%s"), left as it is.' % (
+                        d, id, as_tmdb_id and '"' + as_tmdb_id.nice_title() +
+                        '"' or 'unknown', as_imdb_id.nice_title())
+            elif outcome == 'migrate':
+                _set_imdb_file(b, d, r)
+                _set_imdbid_file(b, d, 'tt' + id)
+                logging.debug('Migrated "' + d + '" from tt' + id +
+                              ' to TMDb id ' + r + '.')
+                if basicConfig['manifest']:
+                    manifest.update(b, d, _manifest_record(b, d))
+    finally:
+        pool.close()
+
+    logging.info('%d directories with possible IMDb ids, %d migrated, %d '
+                 'ambiguous, %d failed.' % (
+                     len(entries) - counts['kept'], counts['migrate'],
+                     counts['ambiguous'], counts['unknown'] + counts['error']))
+    return counts['unknown'] + counts['error']
+
+
+def _update_rating_file(b, d, r):
+    """Sets the .rating file of ``d`` to ``r``. Returns whether it changed."""
+    if r == '' or (_has_rating_file(b, d) and _rating_from_file(b, d) == r):
+        return False
+    logging.info('Updating rating of "' + d + '" to ' + r + '.')
+    _set_rating_file(b, d, r)
+    if basicConfig['manifest']:
+        manifest.update(b, d, _manifest_record(b, d))
+    return True
+
+
+def _date_from_file(f):
+    fh = open(f, 'r')
+    s = fh.readline().strip()
+    fh.close()
+    return datetime.datetime.strptime(s, '%Y-%m-%d').date()
 
 
 def process(b, f):
+    global current_outcome
+
+    stats.count('entries')
+    current_outcome = {'outcome': 'skipped', 'new': None, 'message': None,
+                       'thread': threading.current_thread().ident}
+    try:
+        with stats.phase('process', entry=f):
+            _process(b, f)
+    except Exception, e:
+        _notice_error(str(e) or type(e).__name__)
+        _finish_entry(b, f)
+        raise
+    _finish_entry(b, f)
+
+
+def _finish_entry(b, f):
+    global current_outcome
+    o, current_outcome = current_outcome, None
+    n = o['new'] or f
+    # Failed entries are left out of the journal, so that a resumed run
+    # tries them again.
+    if journal is not None and o['outcome'] != 'error':
+        journal.done(f, n)
+    if basicConfig['manifest']:
+        if n != f:
+            manifest.update(b, f, None)
+        manifest.update(b, n, _manifest_record(b, n))
+    _emit_event(b, f, n, o)
+
+
+def _emit_event(b, f, n, o):
+    if not events.active():
+        return
+
+    # The id is only known if the entry ended up as a tagged directory.
+    tmdb_id = imdb_id = None
+    if o['outcome'] in ['renamed', 'unchanged']:
+        if _has_legacy_imdb_file(b, n):
+            imdb_id = 'tt' + _id_from_file(b, n)
+        elif _has_imdb_file(b, n):
+            tmdb_id = _id_from_file(b, n) or None
+        if _has_imdbid_file(b, n):
+            imdb_id = _imdbid_from_file(b, n) or None
+    events.emit(o['outcome'], f, n, tmdb_id=tmdb_id, imdb_id=imdb_id,
+                message=o['message'])
+
+
+def _manifest_record(b, d):
+    """Returns the manifest record of the directory ``d``, or None if it is
+    not a tagged directory."""
+    if not _is_directory(os.path.join(b, d)) or _is_ignored(b, d) or \
+            not _has_name_file(b, d):
+        return None
+    r = {'name': _name_from_file(b, d)}
+    if _has_legacy_imdb_file(b, d):
+        r['imdb_id'] = 'tt' + _id_from_file(b, d)
+    elif _has_imdb_file(b, d):
+        r['tmdb_id'] = _id_from_file(b, d)
+    if _has_imdbid_file(b, d):
+        r['imdb_id'] = _imdbid_from_file(b, d)
+    if _has_rating_file(b, d):
+        r['rating'] = _rating_from_file(b, d)
+    if _has_original_file(b, d):
+        r['original'] = _original_from_file(b, d)
+    return r
+
+
+def flush_manifests():
+    """Writes the pending changes of all library manifests, and of the id
+    map."""
+    try:
+        manifest.flush()
+    except (IOError, OSError):
+        logging.error('Could not write the library manifest.')
+    idmap.flush()
+
+
+def _notice_outcome(outcome, new=None):
+    # An error sticks, even if processing went on afterwards.
+    if current_outcome is not None and current_outcome['outcome'] != 'error':
+        current_outcome['outcome'] = outcome
+        current_outcome['new'] = new
+
+
+def _notice_error(message):
+    if current_outcome is not None and current_outcome['outcome'] != 'error':
+        current_outcome['outcome'] = 'error'
+        current_outcome['message'] = message
+
+
+class _ErrorFilter(logging.Filter):
+    """Marks the entry that is being processed as failed when an error is
+    logged while processing it.
+
+    Errors logged by other threads are left out: the background lookups may
+    be for the next entries, and a failed lookup is made again by the
+    processing thread when its result is needed (see lookups.py)."""
+
+    def filter(self, record):
+        o = current_outcome
+        if record.levelno >= logging.ERROR and o is not None and \
+                record.thread == o['thread']:
+            _notice_error(record.getMessage().strip())
+        return True
+
+
+logging.getLogger().addFilter(_ErrorFilter())
+
+
+def _process(b, f):
     global notifications_nb_ignored
 
     # First check if the file or directory indicated by f actually exists.
@@ -100,6 +795,7 @@ def process(b, f):
 
     if _is_ignored(b, f):
         notifications_nb_ignored += 1
+        _notice_outcome('ignored')
         logging.info('Skipping "' + f + '".')
 
     # In clear mode, we remove all .imdb etc. files from directories.
@@ -107,6 +803,7 @@ def process(b, f):
         if _is_directory(os.path.join(b, f)):
             logging.debug('Clearning directory "' + f + '".')
             _clear_directory(b, f)
+            _notice_outcome('cleared')
     # For a directory, we process it unless it contains an ".ignore" file.
     elif _is_directory(os.path.join(b, f)):
         _tag(b, f)
@@ -154,7 +851,13 @@ def _tag(b, d):
                          '" in recovery mode; no .original file found.')
             return
 
-    n = _get_correct_name(b, d)
+    try:
+        n = _get_correct_name(b, d)
+    except _Deferred:
+        logging.debug('Deciding on "' + d + '" later.')
+        deferred.append(d)
+        _notice_outcome('deferred', d)
+        return
     logging.debug('_get_correct_name() returned "' + n + '".')
 
     # If get_correct_name returns an empty string, the user has indicated that
@@ -165,6 +868,7 @@ def _tag(b, d):
             _offline_notice_unknown(d)
         else:
             _mark_ignored(b, d)
+            _notice_outcome('ignored')
     else:
         # We can go ahead and rename.
         _rename_directory(b, d, n)
@@ -181,8 +885,11 @@ def _clear_directory(b, d):
         _remove_name_file(b, d)
     if _has_rating_file(b, d):
         _remove_rating_file(b, d)
+    if _has_imdbid_file(b, d):
+        _remove_imdbid_file(b, d)
 
 
+@stats.timed('rename')
 def _rename_directory(b, d, n):
     global notifications_nb_unchanged
 
@@ -192,6 +899,7 @@ def _rename_directory(b, d, n):
     if cmp(old, new) == 0:
         logging.info("Directory \"" + d + "\" is already named right.")
         notifications_nb_unchanged += 1
+        _notice_outcome('unchanged', n)
     elif os.path.exists(new):
         logging.error('Cannot rename "' + d + '" to "' + n +
                       '", directory already exists.')
@@ -210,6 +918,7 @@ def _rename_directory(b, d, n):
                 _set_original_file(b, n, d)
 
 
+@stats.timed('rename')
 def _mkdir_and_move(b, f):
     n, e = _split_filename(f)
     if basicConfig['askmode'] and not _confirm(
@@ -258,6 +967,8 @@ def _get_correct_name(b, d):
     # the list of notifications).
     # Otherwise, we set the .name file with the returned name.
 
+    stats.cache('name file', _has_name_file(b, d) and
+                not basicConfig['forcemode'])
     if (not _has_name_file(b, d)) or basicConfig['forcemode']:
         if _has_name_file(b, d):
             logging.debug('Looking up "' + d +
@@ -283,25 +994,44 @@ def _get_correct_name(b, d):
 
 
 def _get_movie_for_directory(b, d):
+        stats.cache('imdb file', not basicConfig['forcemode'] and
+                    _has_imdb_file(b, d))
+        m = None
         if not basicConfig['forcemode'] and _has_imdb_file(b, d):
             logging.debug('Found .imdb file for "' + d + '".')
             # We look up the movie on imdb according to its ID.  Because there
             # is an .imdb file but no .name file, it is reasonable to assume
             # that the script was already run once and the user chose not to
             # give a custom name.
-            m = _movie_by_id(_id_from_file(b, d))
-            n = m.nice_title()
-        else:
-            logging.debug('Looking up "' + d +
-                          '" on IMDb with the user\'s help.')
-            # Ask user to establish movie and custom name.
-            m, n = _movie_by_name(_clean_name(d))
+            id = _tmdb_id_from_file(b, d)
+            if id is not None:
+                m = _movie_by_id(id)
+                n = m.nice_title()
+            else:
+                logging.info('IMDb id in .imdb file of "' + d +
+                             '" not found on TMDb, searching instead.')
+        if m is None:
+            # An id in an NFO file or in a name identifies the movie without
+            # any search or question. In force mode, we search again, which
+            # gives the user a chance to correct it.
+            if not basicConfig['forcemode']:
+                m = _movie_by_local_id(b, d)
+
+            if m is not None:
+                n = m.nice_title()
+            else:
+                logging.debug('Looking up "' + d +
+                              '" on IMDb with the user\'s help.')
+                # Ask user to establish movie and custom name.
+                m, n = _movie_by_name(*_search_query(b, d))
 
         # If a corresponding IMDb movie was found, then we set the .imdb file
         # and the rating file.
         if m is not None:
             _set_imdb_file(b, d, m.id)
-            _set_rating_file(b, d, m.rating)
+            _set_rating_file(b, d, _movie_rating(m))
+            if m.imdb_id:
+                _set_imdbid_file(b, d, m.imdb_id)
 
         return n
 
@@ -310,10 +1040,11 @@ def _add_title_attributes(d, s):
         # If the name is not empty, we check if the original directory name
         # contained the words "unrated" or "director's cut" and if so then we
         # add the respective word to the title.
-        unrated = (re.search(r"unrated", d, re.I) is not None)
-        dircut = (re.search(r"director.?s.?cut", d, re.I) is not None)
-        telesync = (re.search(r"telesync", d, re.I) is not None)
-        remastered = (re.search(r"remastered", d, re.I) is not None)
+        info = releasename.parse(d)
+        unrated = info.get('unrated', False)
+        dircut = info.get('dircut', False)
+        telesync = info.get('telesync', False)
+        remastered = info.get('remastered', False)
 
         if unrated and dircut:
             s = s + " (Unrated Director's Cut)"
@@ -331,28 +1062,135 @@ def _add_title_attributes(d, s):
         return s
 
 
+def _movie_rating(m):
+    """Returns the rating for the movie ``m``. If a local ratings dataset is
+    configured and the IMDb id of the movie is known, the IMDb rating is taken
+    from the dataset, otherwise the rating reported by the API."""
+
+    table = _ratings_table()
+    if table is not None and m.imdb_id:
+        r = table.lookup(m.imdb_id)
+        stats.cache('ratings', r is not None)
+        if r is not None:
+            return r
+        logging.debug('No local rating found for ' + m.imdb_id + '.')
+
+    return m.rating
+
+
+def _ratings_table():
+    global ratings_table
+
+    if ratings_table is None and basicConfig['ratingsfile'] is not None:
+        try:
+            ratings_table = ratings.open_ratings(basicConfig['ratingsfile'])
+        except (IOError, OSError):
+            logging.error('Could not open ratings file "' +
+                          basicConfig['ratingsfile'] + '".')
+            basicConfig['ratingsfile'] = None
+
+    return ratings_table
+
+
+@stats.timed('fetch')
 def _movie_by_id(id):
     """Returns a Movie object corresponding to the IMDb id ``id``."""
 
+    if journal is not None:
+        known, m = journal.lookup('id:' + id)
+        if known:
+            logging.debug('Taking movie ' + id + ' from the journal.')
+            return m
+
     if not basicConfig['offlinemode']:
         print "Getting extended movie information..."
     else:
         logging.debug('Getting extended movie information for id ' +
                       id + '...')
 
-    return tmdbapi.api_get_movie(id)
+    if prefetcher is not None:
+        m = prefetcher.movie(id)
+    else:
+        m = lookup_backend.api_get_movie(id)
+    if journal is not None:
+        journal.resolved('id:' + id, m)
+    return m
 
 
-def _movie_by_name(s):
+def _movie_by_local_id(b, d):
+    """Returns the movie for the id found in the directory ``d`` (see
+    localids.py), or None."""
 
-    m = _imdb_search_movie(s)
+    if d in prefetched_ids:
+        found = prefetched_ids.pop(d)
+    else:
+        found = localids.find(b, d, _clean_query(d)[0])
+    stats.cache('local id', found is not None)
+    if found is None:
+        return None
+
+    source, id = found
+    if source == 'imdb':
+        imdb_id, id = id, _tmdb_id_for_imdb_id(id)
+        if id is None:
+            logging.info('IMDb id ' + imdb_id + ' of "' + d +
+                         '" not found on TMDb, searching instead.')
+            return None
+
+    m = _movie_by_id(id)
+    logging.info('Found "' + m.nice_title() + '" for "' + d + '" by its ' +
+                 source + ' id.')
+    return m
+
+
+def _tmdb_id_for_imdb_id(imdb_id):
+    """Returns the TMDb id for the IMDb id ``imdb_id``, or None if TMDb doesn't
+    know it. The answers are kept in the id map (see idmap.py)."""
+    known, id = idmap.lookup(imdb_id)
+    stats.cache('id map', known)
+    if not known:
+        id = _find_tmdb_id(imdb_id)
+        idmap.record(imdb_id, id)
+    return id
+
+
+@stats.timed('find')
+def _find_tmdb_id(imdb_id):
+    logging.debug('Asking TMDb for the movie with IMDb id ' + imdb_id + '.')
+    return tmdbapi.api_find_movie_id(imdb_id)
+
+
+def _movie_by_name(s, year=None):
+
+    # Offline lookups of an earlier, interrupted run can be reused.
+    key = 'name:' + s
+    if year is not None:
+        key += ' (' + year + ')'
+    if journal is not None:
+        known, m = journal.lookup(key)
+        if known:
+            logging.debug('Taking the lookup of "' + s + '" from the journal.')
+            return m, m is not None and m.nice_title() or ""
+
+    # The user may have chosen a movie for this name before. In force mode, we
+    # look it up again, which also gives the user a chance to change it.
+    if not basicConfig['forcemode']:
+        a = aliases.lookup(s, year, _movie_by_id)
+        if a is not None:
+            m, n = a
+            logging.info('Using the earlier choice "' + m.nice_title() +
+                         '" for "' + s + '".')
+            return m, n or m.nice_title()
+
+    m, confident = _imdb_search_movie(s, year)
 
     # We give the user the opportunity to add a custom title, but not in
-    # offline mode.
-    if not basicConfig['offlinemode']:
+    # offline mode, and not for matches that were accepted automatically.
+    if not basicConfig['offlinemode'] and not confident:
         n = _ask_custom_title(m)
     else:
         n = ""
+    custom = n
 
     # If the user hasn't chosen a custom title but m is a valid movie object,
     # we take the name from it.
@@ -363,33 +1201,67 @@ def _movie_by_name(s):
     # order to get the extended information such as the rating, unless speedy
     # mode is actived.
     if m is not None:
-        return _movie_by_id(m.id), n
-    else:
-        return m, n
+        m = _movie_by_id(m.id)
+    if journal is not None:
+        journal.resolved(key, m)
+
+    # If the user had to correct the search, remember the choice.
+    if not basicConfig['offlinemode'] and not confident and m is not None:
+        first = scoring.rank(s, year, _lookups().query((s, year)))
+        if custom != "" or len(first) == 0 or first[0][1].id != m.id:
+            aliases.learn(s, year, m, custom)
+
+    return m, n
 
 
-def _imdb_search_movie(s):
+class _Deferred(Exception):
+    """Raised when the user is to decide on a directory later."""
+
+
+def _imdb_search_movie(s, year=None):
+    """Returns a pair: the movie for the name ``s`` and the year ``year`` (or
+    None), and whether it was taken without asking the user."""
 
     if basicConfig['offlinemode']:
-        return _imdb_search_movie_offline(s)
+        return _imdb_search_movie_offline(s, year)
     else:
-        return _imdb_search_movie_interactive(s)
+        return _imdb_search_movie_interactive(s, year)
 
 
-def _imdb_search_movie_offline(s):
-    results = _imdb_query(s)
-    if len(results) == 0:
+def _imdb_search_movie_offline(s, year):
+    ranked = scoring.rank(s, year, _planned_query((s, year)))
+    if len(ranked) == 0:
         logging.debug('Offline mode: No match found on IMDb for "' + s + '".')
-        return None
-    else:
-        m = results[0]
-        logging.debug('Returning IMDb match "' + m.nice_title() +
-                      '" for query "' + s + '".')
-        return m
+        return None, False
+
+    c, m = ranked[0]
+    if basicConfig['autoaccept'] is not None and \
+            not scoring.acceptable(s, year, ranked, basicConfig['autoaccept']):
+        logging.debug('Offline mode: Best match "%s" for "%s" (confidence '
+                      '%.2f) is not certain enough.' % (m.nice_title(), s, c))
+        stats.count('not confident')
+        return None, False
+
+    logging.debug('Returning IMDb match "%s" for query "%s" (confidence '
+                  '%.2f).' % (m.nice_title(), s, c))
+    return m, True
+
+
+def _imdb_search_movie_interactive(s, year):
+    ranked = scoring.rank(s, year, _lookups().query((s, year)))
 
+    if basicConfig['autoaccept'] is not None and \
+            scoring.acceptable(s, year, ranked, basicConfig['autoaccept']):
+        c, m = ranked[0]
+        print 'Taking "%s" for "%s" (confidence %d%%).' % (m.nice_title(), s,
+                                                           round(100 * c))
+        stats.count('auto-accepted')
+        return m, True
 
-def _imdb_search_movie_interactive(s):
-    results = _imdb_query(s)
+    if deferred is not None:
+        raise _Deferred()
+
+    results = [m for c, m in ranked]
     print "Searching for movie '%s'" % s
     _print_movie_list(s, results)
 
@@ -408,7 +1280,7 @@ def _imdb_search_movie_interactive(s):
             Enter 'i' if you don't want to look up this movie in IMDb.
             """
 
-        a = raw_input("> ")
+        a = _read_input("> ")
 
         # Just pressing return is a shortcut for selecting the first movie in
         # the list (if the list is nonempty).
@@ -418,7 +1290,7 @@ def _imdb_search_movie_interactive(s):
         # If the user enters 'i', or if no movie is found and he presses just
         # enter, then no movie is returned (i stands for "ignore").
         if a == "i" or (a == "" and len(results) == 0):
-            return None
+            return None, False
 
         # If the user entered a number, take the corresponding entry from the
         # list.
@@ -449,7 +1321,7 @@ def _imdb_search_movie_interactive(s):
             _print_movie_list(a, results)
             continue
 
-    return m
+    return m, False
 
 
 def _ask_custom_title(m):
@@ -465,7 +1337,7 @@ def _ask_custom_title(m):
             fine.
             """
 
-        n = raw_input("> ")
+        n = _read_input("> ")
 
         if n != "":
             sys.stdout.write('You entered "' + n + '". Please confirm ')
@@ -561,6 +1433,28 @@ def _has_rating_file(b, d):
     return _has_file(b, d, '.rating')
 
 
+def _has_imdbid_file(b, d):
+    return _has_file(b, d, '.imdbid')
+
+
+def _has_legacy_imdb_file(b, d):
+    """Returns True if the .imdb file of ``d`` was written by an older version
+    of imdbtag, which used IMDb, and contains an IMDb id instead of a TMDb id.
+    Those versions wrote no .imdbid file, and only IMDb ids are padded with
+    zeros to seven digits."""
+    return _has_imdb_file(b, d) and not _has_imdbid_file(b, d) and \
+        re.match(r'^0\d{6,7}$', _id_from_file(b, d)) is not None
+
+
+def _has_ambiguous_imdb_file(b, d):
+    """Returns True if the .imdb file of ``d`` has no .imdbid file next to it
+    and an id of seven or eight digits without a leading zero: an IMDb id of
+    an older version of imdbtag, or a TMDb id (these have seven digits by
+    now) of a version that wrote no .imdbid file yet."""
+    return _has_imdb_file(b, d) and not _has_imdbid_file(b, d) and \
+        re.match(r'^[1-9]\d{6,7}$', _id_from_file(b, d)) is not None
+
+
 def _has_original_file(b, d):
     return _has_file(b, d, '.original')
 
@@ -579,14 +1473,44 @@ def _id_from_file(b, d):
     return re.sub('^tt', '', _text_from_file(b, d, '.imdb'))
 
 
+def _tmdb_id_from_file(b, d):
+    """Returns the TMDb id in the .imdb file of ``d``. An IMDb id in there (see
+    _has_legacy_imdb_file()) is resolved to its TMDb id; None is returned if
+    TMDb doesn't know it. An ambiguous id (see _has_ambiguous_imdb_file()) is
+    only taken as an IMDb id if the movie fits the name of ``d``."""
+    id = _id_from_file(b, d)
+    if _has_legacy_imdb_file(b, d):
+        return _tmdb_id_for_imdb_id('tt' + id)
+    if _has_ambiguous_imdb_file(b, d):
+        tmdb_id = _tmdb_id_for_imdb_id('tt' + id)
+        if tmdb_id is not None and _fits_name(b, d, _movie_by_id(tmdb_id)):
+            logging.debug('Taking id tt' + id + ' of "' + d +
+                          '" as IMDb id.')
+            return tmdb_id
+    return id
+
+
+def _fits_name(b, d, m):
+    """Returns True if the movie ``m`` fits the name of ``d`` (from its .name
+    file, if there is one) closely enough to be taken without asking."""
+    n = _has_name_file(b, d) and _name_from_file(b, d) or d
+    s, year = _clean_query(n)
+    return scoring.rank(s, year, [m])[0][0] >= planner.confident
+
+
 def _rating_from_file(b, d):
     return _text_from_file(b, d, '.rating')
 
 
+def _imdbid_from_file(b, d):
+    return _text_from_file(b, d, '.imdbid')
+
+
 def _original_from_file(b, d):
     return _text_from_file(b, d, '.original')
 
 
+@stats.timed('read')
 def _text_from_file(b, d, f):
     fullpath = os.path.join(b, d, f)
     logging.debug('Reading text from file "' + fullpath + '".')
@@ -609,10 +1533,15 @@ def _set_rating_file(b, d, r):
     _set_file(b, d, '.rating', r)
 
 
+def _set_imdbid_file(b, d, i):
+    _set_file(b, d, '.imdbid', i)
+
+
 def _set_original_file(b, d, s):
     _set_file(b, d, '.original', s)
 
 
+@stats.timed('write')
 def _set_file(b, d, f, s):
     fullpath = os.path.join(b, d, f)
     logging.debug('Writing text "' + s + '" to file "' + fullpath + '".')
@@ -643,10 +1572,16 @@ def _remove_rating_file(b, d):
     _remove_file(b, d, ".rating")
 
 
+def _remove_imdbid_file(b, d):
+    _remove_file(b, d, ".imdbid")
+
+
+@stats.timed('write')
 def _remove_file(b, d, n):
     os.remove(os.path.join(b, d, n))
 
 
+@stats.timed('write')
 def _touch_file(f):
     try:
         fh = open(f, 'w')
@@ -671,6 +1606,12 @@ def _print_movie_list(q, l):
         print header
         print "=" * len(header)
 
+    # The details of the first candidates are fetched in parallel; each line
+    # is printed as soon as its details are there.
+    lk = _lookups()
+    for m in l[:enrich_count]:
+        lk.prefetch_movie(m.id)
+
     c = 0
     for m in l:
         c += 1
@@ -682,9 +1623,119 @@ def _print_movie_list(q, l):
             except UnicodeDecodeError:
                 logging.error('There was an Unicode problem')
 
+        if c <= enrich_count:
+            t = t + _movie_details(lk, m)
+
         print "%2d: %s" % (c, t)
+        sys.stdout.flush()
+
 
+def _movie_details(lk, m):
+    """Returns the details of the candidate ``m`` for the picker, e.g.
+    " [aka Heat; 170 min; Michael Mann; 8.3]"."""
+    try:
+        d = lk.movie(m.id)
+    except Exception, e:
+        logging.debug('Could not get details of movie %s: %s' % (m.id, e))
+        return ""
 
+    details = []
+    if d.other_title:
+        details.append('aka ' + d.other_title)
+    if d.runtime:
+        details.append('%d min' % d.runtime)
+    if d.director:
+        details.append(d.director)
+    if d.rating:
+        details.append(d.rating)
+    if not details:
+        return ""
+    return ' [' + '; '.join(details) + ']'
+
+
+def _lookups():
+    """Returns the background lookups, starting them if necessary."""
+    global prefetcher
+    if prefetcher is None:
+        prefetcher = lookups.Lookups(_planned_query,
+                                     lookup_backend.api_get_movie,
+                                     basicConfig['jobs'])
+    return prefetcher
+
+
+def _planned_query(q):
+    """Returns the search results for the pair ``q`` of cleaned name and year
+    (or None), see planner.py."""
+    s, year = q
+    # Stop as soon as a match would be taken without asking.
+    c = max(planner.confident, basicConfig['autoaccept'] or 0)
+    # A clear match in the local titles saves the searches.
+    m = _local_match(s, year, c)
+    if m is not None:
+        return [m]
+    return planner.search(s, year, _search_tmdb, c)
+
+
+@stats.timed('local search')
+def _local_match(s, year, c):
+    """Returns the movie for the name ``s`` and the year ``year`` (or None) if
+    the local titles have a clear match with at least the confidence ``c``,
+    otherwise None."""
+    index = _titles_index()
+    if index is None:
+        return None
+
+    matches = trigram.LocalMovies(index, {'title': s, 'year': year},
+                                  2).get_ordered_matches()
+    # A tie, e.g. of a movie and its remake without a year in the name, is
+    # left to the search.
+    if len(matches) == 0 or (len(matches) > 1 and
+                             matches[1][0] >= matches[0][0]):
+        stats.cache('local titles', False)
+        return None
+
+    # The local titles have IMDb ids, which the id map turns into TMDb ids.
+    local = matches[0][1]
+    id = _tmdb_id_for_imdb_id(local['id'])
+    m = id is not None and trigram.to_movie(local, id) or None
+    hit = m is not None and scoring.acceptable(s, year,
+                                               scoring.rank(s, year, [m]), c)
+    stats.cache('local titles', hit)
+    if not hit:
+        return None
+    logging.debug('Taking "%s" for "%s" from the local titles.' %
+                  (m.nice_title(), s))
+    return m
+
+
+def _titles_index():
+    global titles_index
+
+    with titles_lock:
+        if titles_index is None and basicConfig['titlesfile'] is not None:
+            logging.info('Loading titles from "' + basicConfig['titlesfile'] +
+                         '"...')
+            try:
+                titles_index = trigram.load_title_basics(
+                        basicConfig['titlesfile'])
+            except (IOError, OSError, KeyError, ValueError):
+                logging.error('Could not load titles file "' +
+                              basicConfig['titlesfile'] + '".')
+                basicConfig['titlesfile'] = None
+
+    return titles_index
+
+
+@stats.timed('search')
+def _search_tmdb(s, year, primary):
+    in_encoding = sys.stdin.encoding or "UTF-8"
+    logging.debug('Searching for "%s" (year %s%s).' %
+                  (s, year, primary and ', first release' or ''))
+    return lookup_backend.api_search_movie(unicode(s, in_encoding, 'replace'),
+                                           year, primary)
+
+
+@stats.timed('search')
 def _imdb_query(n):
 
     in_encoding = sys.stdin.encoding or "UTF-8"
@@ -696,12 +1747,12 @@ def _imdb_query(n):
     if n.isdigit():
         id = int(n)
         r = []
-        m = tmdbapi.api_get_movie(id)
+        m = lookup_backend.api_get_movie(id)
         if m:
             r.append(m)
     else:
         title = unicode(n, in_encoding, 'replace')
-        r = tmdbapi.api_search_movie(title)
+        r = lookup_backend.api_search_movie(title)
 
     logging.debug("Found %d possible movies." % len(r))
 
@@ -725,10 +1776,69 @@ def _move_to_top_if_exists(r, n):
     return r
 
 
+def _search_query(b, f):
+    """Returns the cleaned name and the year (or None) to search for the
+    directory or movie file ``f``: the name, unless it lacks the title or the
+    year and the movie file has a title in its metadata (see probe.py)."""
+    p = os.path.join(b, f)
+    directory = _is_directory(p)
+    if directory:
+        s, year = _clean_query(f)
+    else:
+        s, year = _clean_query(_split_filename(f)[0])
+
+    # Release names come with a year; names without one, like "movie" or
+    # "rip", are more likely to be generic than the title in the file.
+    if s and year is not None:
+        return s, year
+
+    try:
+        if directory:
+            movies = [os.path.join(p, m) for m in os.listdir(p)
+                      if _is_movie_file(m)]
+        else:
+            movies = [p]
+        # Other movie files are usually samples or extras.
+        movie = movies and max(movies, key=os.path.getsize) or None
+    except OSError:
+        movie = None
+
+    info = movie is not None and _probe(movie) or {}
+    stats.cache('probe', 'title' in info)
+    if 'title' in info:
+        t = releasename.parse(info['title'])
+        if t['title']:
+            logging.debug('Found title "' + info['title'] + '" in "' + movie +
+                          '".')
+            s = t['title']
+            year = t.get('year') or info.get('year') or year
+            year = year is not None and str(year) or None
+    return s, year
+
+
+@stats.timed('probe')
+def _probe(f):
+    return probe.probe(f)
+
+
+def _clean_query(s):
+    """Returns the cleaned name and the year (or None) to search for the
+    release name ``s``."""
+    return planner.split_year(_clean_name(s), _clean_year(s))
+
+
+@stats.timed('parse')
+def _clean_year(s):
+    """Returns the year in the name ``s`` as string, or None."""
+    year = releasename.parse(s).get('year')
+    return year is not None and str(year) or None
+
+
+@stats.timed('parse')
 def _clean_name(s):
 
     logging.debug('Determining clean name for "' + s + '"')
-    info = PTN.parse(s)
+    info = releasename.parse(s)
     title = info['title']
     logging.debug('Clean name is "' + title + '"')
 
@@ -736,18 +1846,16 @@ def _clean_name(s):
 
 
 def _offline_notice_unknown(s):
-    global notifications_unknown
     notifications_unknown.append(s)
+    _notice_outcome('unknown', s)
 
 
 def _offline_notice_renamed(a, b):
-    global notifications_rename
-    notifications_rename.append([a, b])
+    notifications_rename.append((a, b))
+    _notice_outcome('renamed', b)
 
 
 def print_offline_notifications():
-    global notifications_rename, notifications_unknown
-
     # If nothing has been renamed and quiet mode is enabled, just return.
     if len(notifications_rename) == 0 and basicConfig['quietmode']:
             return
@@ -781,6 +1889,66 @@ def print_offline_notifications():
         print str(notifications_nb_ignored) + " directories ignored."
 
 
+def print_stats():
+    print_banner("Statistics", 0)
+    for l in stats.report():
+        print l
+
+
+def write_stats(f):
+    """Writes the statistics as JSON document to the file ``f``, or to
+    standard output if ``f`` is "-"."""
+    if f == '-':
+        print stats.as_json()
+        return
+
+    try:
+        storage.atomic_write(f, stats.as_json() + '\n')
+    except (IOError, OSError):
+        logging.error('Could not write statistics to "' + f + '".')
+
+
+def start_trace(f):
+    """Starts writing spans of all processing phases and API requests to the
+    file ``f``, in the Trace Event Format (for chrome://tracing or Perfetto)."""
+    try:
+        tracing.start(f)
+    except IOError:
+        logging.error('Could not write trace to "' + f + '".')
+
+
+def stop_trace():
+    tracing.stop()
+
+
+def start_events(f):
+    """Starts writing an event for every processed entry to the file ``f``, or
+    to standard output if ``f`` is "-", as JSON lines."""
+    try:
+        events.start(f)
+    except IOError:
+        logging.error('Could not write events to "' + f + '".')
+
+
+def stop_events():
+    events.stop()
+
+
+def write_metrics(f):
+    """Writes the metrics of the run so far to the file ``f``, in the format
+    of Prometheus (and node-exporter's textfile collector)."""
+    outcomes = {
+            'renamed': len(notifications_rename),
+            'unknown': len(notifications_unknown),
+            'unchanged': notifications_nb_unchanged,
+            'ignored': notifications_nb_ignored,
+            }
+    try:
+        storage.atomic_write(f, metrics.render(outcomes, stats.as_dict()))
+    except (IOError, OSError):
+        logging.error('Could not write metrics to "' + f + '".')
+
+
 def print_banner(s, w):
     # Default banner width is 80 characters.
     if w == 0:
@@ -799,10 +1967,25 @@ def _limit_string(s, l):
         return s[0:l - 3] + "..."
 
 
+@stats.timed('prompt')
+def _read_input(prompt):
+    with progress.paused():
+        return raw_input(prompt)
+
+
 def _is_directory(d):
     return os.path.exists(d) and os.path.isdir(d)
 
 
+def _changed_since(b, f, t):
+    """Returns whether the entry ``f`` was created, renamed or moved at or
+    after the time ``t``."""
+    try:
+        return os.lstat(os.path.join(b, f)).st_ctime >= t
+    except OSError:
+        return False
+
+
 def _confirm(prompt=None, resp=False):
         """prompts for yes or no response from the user. Returns True for yes and
         False for no.
@@ -831,7 +2014,7 @@ def _confirm(prompt=None, resp=False):
                 prompt = '%s [%s]|%s: ' % (prompt, 'n', 'y')
 
         while True:
-                ans = raw_input(prompt)
+                ans = _read_input(prompt)
                 if not ans:
                         return resp
                 if ans not in ['y', 'Y', 'n', 'N']:
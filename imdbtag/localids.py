@@ -0,0 +1,107 @@
+"""Movie ids found in a directory, so that no search is needed.
+
+Many releases come with an NFO file, written by the release group or by
+Kodi, that contains the IMDb id of the movie ("tt0113277", often as part of an
+IMDb link) or its TMDb id. Media servers also put ids into names, e.g.
+"Heat (1995) {imdb-tt0113277}" or "Heat (1995) [tmdbid-949]". ``find()`` looks
+for such ids in the name of the directory and the names of the files in it,
+and then in the NFO files, of which only the first ``nfo_read_size`` bytes are
+read.
+
+Names are trusted, NFO files less so: some list the ids of other movies too,
+e.g. of the sequels or of the group's other releases. The ids in an NFO file
+are only taken if it has a single TMDb id and a single IMDb id at most, or if
+the title in the file (Kodi's ``<title>``) agrees with the name of the
+directory.
+"""
+
+import os
+import re
+import logging
+
+# Number of bytes read from the beginning of each NFO file.
+nfo_read_size = 64 * 1024
+
+_imdb_id = re.compile(r"(?<![a-z0-9])(tt\d{7,8})(?!\d)", re.I)
+_tmdb_id_in_name = re.compile(r"\btmdb(?:id)?[-=](\d+)\b", re.I)
+_tmdb_id_in_nfo = re.compile(r"""
+    themoviedb\.org/movie/(\d+)
+  | <tmdbid>\s*(\d+)\s*</tmdbid>
+  | <uniqueid[^>]*type="tmdb"[^>]*>\s*(\d+)\s*</uniqueid>
+    """, re.I | re.X)
+_nfo_title = re.compile(
+        r"<(?:original)?title>\s*([^<]*?)\s*</(?:original)?title>", re.I)
+_word = re.compile(r"[^\W_]+", re.U)
+
+
+def find(b, d, title=None):
+    """Returns the pair (source, id) for the first id found for the directory
+    ``d`` in ``b``, where source is "tmdb" or "imdb", or None. TMDb ids are
+    preferred, since they need no further lookup. ``title`` is the cleaned
+    name of ``d``, which the title of an NFO file with several ids has to
+    agree with."""
+    path = os.path.join(b, d)
+    try:
+        files = sorted(os.listdir(path))
+    except OSError:
+        return None
+
+    names = [d] + files
+    for source, pattern in [('tmdb', _tmdb_id_in_name), ('imdb', _imdb_id)]:
+        ids = _ids(pattern, names)
+        if ids:
+            return _found(source, ids[0], d)
+
+    for f in files:
+        if not f.lower().endswith('.nfo'):
+            continue
+        text = _read_nfo(os.path.join(path, f))
+        found = [('tmdb', _ids(_tmdb_id_in_nfo, [text])),
+                 ('imdb', _ids(_imdb_id, [text]))]
+        if max(len(ids) for source, ids in found) > 1 and not (
+                title is not None and
+                any(_words(t) == _words(title)
+                    for t in _nfo_title.findall(text))):
+            logging.debug('Ignoring the ids in "%s", which has several and '
+                          'does not name the movie.' % f)
+            continue
+        for source, ids in found:
+            if ids:
+                return _found(source, ids[0], d)
+    return None
+
+
+def _ids(pattern, texts):
+    """Returns the distinct ids matched by ``pattern`` in ``texts``, in the
+    order of their first occurrence."""
+    ids = []
+    for s in texts:
+        for m in pattern.finditer(s):
+            id = [g for g in m.groups() if g][0].lower()
+            if id not in ids:
+                ids.append(id)
+    return ids
+
+
+def _found(source, id, d):
+    logging.debug('Found %s id %s for "%s".' % (source, id, d))
+    return source, id
+
+
+def _words(s):
+    """Returns the lowercase words of ``s`` (bytes are decoded as UTF-8)."""
+    if isinstance(s, str):
+        s = s.decode('utf-8', 'replace')
+    return _word.findall(s.lower())
+
+
+def _read_nfo(f):
+    try:
+        fh = open(f, 'rb')
+        try:
+            return fh.read(nfo_read_size)
+        finally:
+            fh.close()
+    except (IOError, OSError):
+        logging.warning('Could not read "' + f + '".')
+        return ''
@@ -0,0 +1,77 @@
+"""Lookups that run in the background before their results are needed.
+
+In interactive mode, most of the time per directory is spent waiting for the
+search and for the details of the chosen movie. ``Lookups`` starts these for
+the next directories while the user answers the prompts for the current one,
+so that the results are there when they are needed. Results are kept in two
+bounded caches, one for searches and one for movie details.
+"""
+
+import threading
+import collections
+from multiprocessing.pool import ThreadPool
+
+import stats
+
+# Number of results kept in each cache.
+cache_size = 256
+
+
+class Lookups(object):
+    """Runs searches with ``search(query)`` and fetches movie details with
+    ``fetch(id)``, up to ``jobs`` at a time."""
+
+    def __init__(self, search, fetch, jobs):
+        self.search = search
+        self.fetch = fetch
+        self.pool = ThreadPool(jobs)
+        self.lock = threading.Lock()
+        self.queries = collections.OrderedDict()   # query -> AsyncResult
+        self.movies = collections.OrderedDict()    # id -> AsyncResult
+
+    def prefetch_query(self, q, details=1):
+        """Starts the search for ``q``, and fetching the details of its first
+        ``details`` results."""
+        def run():
+            r = self.search(q)
+            for m in r[:details]:
+                self.prefetch_movie(m.id)
+            return r
+        self._submit(self.queries, q, run)
+
+    def prefetch_movie(self, id):
+        """Starts fetching the details of the movie ``id``."""
+        self._submit(self.movies, str(id), lambda: self.fetch(id))
+
+    def query(self, q):
+        """Returns the results of the search for ``q``."""
+        return self._get(self.queries, q, lambda: self.search(q))
+
+    def movie(self, id):
+        """Returns the details of the movie ``id``."""
+        return self._get(self.movies, str(id), lambda: self.fetch(id))
+
+    def close(self):
+        # Lookups that are still running are of no use anymore.
+        self.pool.terminate()
+
+    def _submit(self, cache, key, f):
+        with self.lock:
+            if key in cache:
+                return
+            cache[key] = self.pool.apply_async(f)
+            while len(cache) > cache_size:
+                cache.popitem(last=False)
+
+    def _get(self, cache, key, f):
+        with self.lock:
+            a = cache.get(key)
+        stats.cache('prefetch', a is not None)
+        if a is None:
+            return f()
+        # Failed lookups are retried, like lookups that were never started.
+        if a.ready() and not a.successful():
+            with self.lock:
+                cache.pop(key, None)
+            return f()
+        return a.get()
@@ -0,0 +1,135 @@
+"""Manifest of a library: one record per tagged directory, in a single file.
+
+The manifest is the JSON file ``.imdbtag-manifest`` in the library directory:
+
+    {
+      "version": 1,
+      "updated": "2024-05-01T20:15:02Z",
+      "directories": {
+        "Heat (1995)": {
+          "name": "Heat (1995)",
+          "tmdb_id": "949",
+          "imdb_id": "tt0113277",
+          "rating": "8.3",
+          "original": "Heat.1995.1080p.BluRay"
+        }
+      }
+    }
+
+Fields that are not known are left out. The records are updated as
+directories are processed; the file is rewritten atomically, at most every
+few seconds and at the end of a run, so readers always see a complete
+manifest.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+
+import storage
+
+# Name of the manifest file in the library directory.
+manifest_file = '.imdbtag-manifest'
+
+# Minimum time between two writes of the manifest, in seconds.
+flush_interval = 10
+
+_lock = threading.Lock()
+_manifests = {}   # library directory -> Manifest
+
+
+class Manifest(object):
+
+    def __init__(self, b):
+        self.path = os.path.join(b, manifest_file)
+        self.directories = {}
+        # A new manifest is written even if there is nothing in it.
+        self.dirty = not os.path.exists(self.path)
+        self.last_flush = time.time()
+        if not self.dirty:
+            fh = open(self.path, 'r')
+            try:
+                self.directories = json.load(fh).get('directories', {})
+            except ValueError:
+                # It is rebuilt as the directories are processed.
+                logging.warning('Ignoring damaged manifest "' + self.path +
+                                '".')
+            finally:
+                fh.close()
+
+    def set(self, d, record):
+        """Sets the record of the directory ``d``, or removes it if
+        ``record`` is None."""
+        d = _text(d)
+        if record is None:
+            if self.directories.pop(d, None) is not None:
+                self.dirty = True
+            return
+
+        record = dict((k, _text(v)) for k, v in record.items() if v)
+        if self.directories.get(d) != record:
+            self.directories[d] = record
+            self.dirty = True
+
+    def retain(self, names):
+        """Removes the records of all directories not in ``names``."""
+        keep = set(_text(d) for d in names)
+        for d in self.directories.keys():
+            if d not in keep:
+                del self.directories[d]
+                self.dirty = True
+
+    def flush(self, force=False):
+        if not self.dirty:
+            return
+        if not force and time.time() - self.last_flush < flush_interval:
+            return
+        doc = {
+            'version': 1,
+            'updated': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'directories': self.directories,
+            }
+        storage.atomic_write(self.path,
+                             json.dumps(doc, indent=2, sort_keys=True,
+                                        separators=(',', ': ')) + '\n')
+        self.dirty = False
+        self.last_flush = time.time()
+
+
+def update(b, d, record):
+    """Sets the record of the directory ``d`` in the manifest of the library
+    ``b`` (None removes it), and writes the manifest if it is due."""
+    with _lock:
+        m = _get(b)
+        m.set(d, record)
+        m.flush()
+
+
+def retain(b, names):
+    """Removes the records of all directories of ``b`` not in ``names``."""
+    with _lock:
+        _get(b).retain(names)
+
+
+def flush():
+    """Writes all manifests with changes."""
+    with _lock:
+        for m in _manifests.values():
+            m.flush(force=True)
+
+
+def _get(b):
+    b = os.path.abspath(b)
+    if b not in _manifests:
+        _manifests[b] = Manifest(b)
+    return _manifests[b]
+
+
+def _text(s):
+    # File names are byte strings, but not necessarily valid UTF-8.
+    if isinstance(s, str):
+        return s.decode(sys.getfilesystemencoding() or 'utf-8', 'replace')
+    return s
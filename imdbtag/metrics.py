@@ -0,0 +1,89 @@
+"""Metrics of a run in the Prometheus text exposition format.
+
+The output is meant for node-exporter's textfile collector: the file is
+rewritten at the end of every run, so all metrics describe the last run and
+are gauges (or summaries) rather than counters.
+"""
+
+import time
+
+
+def render(outcomes, s):
+    """Returns the metrics text for a run.
+
+    ``outcomes`` maps the outcomes "renamed", "unknown", "unchanged" and
+    "ignored" to the number of directories; ``s`` is the dictionary returned by
+    ``stats.as_dict()``.
+    """
+    lines = []
+
+    _metric(lines, 'imdbtag_directories', 'gauge',
+            'Directories processed in the last run, by outcome.',
+            [({'outcome': o}, n) for o, n in sorted(outcomes.items())])
+
+    _metric(lines, 'imdbtag_entries', 'gauge',
+            'Directory entries looked at in the last run.',
+            [({}, s['counters'].get('entries', 0))])
+
+    _metric(lines, 'imdbtag_run_duration_seconds', 'gauge',
+            'Duration of the last run.', [({}, s['duration'])])
+
+    requests = sorted(s['requests'].items())
+    _metric(lines, 'imdbtag_api_requests', 'gauge',
+            'API requests made in the last run, by endpoint.',
+            [({'endpoint': e}, r['count']) for e, r in requests])
+
+    _metric(lines, 'imdbtag_api_errors', 'gauge',
+            'API requests in the last run that failed, by endpoint.',
+            [({'endpoint': e}, r['errors']) for e, r in requests])
+
+    samples = []
+    for e, r in requests:
+        for q, key in [('0.5', 'p50'), ('0.9', 'p90'), ('0.99', 'p99')]:
+            samples.append(({'endpoint': e, 'quantile': q}, r[key]))
+        samples.append(({'endpoint': e}, r['total'], '_sum'))
+        samples.append(({'endpoint': e}, r['count'], '_count'))
+    _metric(lines, 'imdbtag_api_request_duration_seconds', 'summary',
+            'Latency of the API requests in the last run, by endpoint.',
+            samples)
+
+    count, seconds = 0, 0.0
+    if 'rate limit wait' in s['phases']:
+        count = s['phases']['rate limit wait']['count']
+        seconds = s['phases']['rate limit wait']['total']
+    _metric(lines, 'imdbtag_rate_limit_waits', 'gauge',
+            'Times the last run had to wait because of API rate limiting.',
+            [({}, count)])
+    _metric(lines, 'imdbtag_rate_limit_wait_seconds', 'gauge',
+            'Time the last run waited because of API rate limiting.',
+            [({}, seconds)])
+
+    _metric(lines, 'imdbtag_last_run_timestamp_seconds', 'gauge',
+            'Time at which the last run finished.', [({}, int(time.time()))])
+
+    return '\n'.join(lines) + '\n'
+
+
+def _metric(lines, name, type, help, samples):
+    lines.append('# HELP %s %s' % (name, help))
+    lines.append('# TYPE %s %s' % (name, type))
+    for sample in samples:
+        labels, value = sample[0], sample[1]
+        suffix = len(sample) > 2 and sample[2] or ''
+        if labels:
+            l = ','.join('%s="%s"' % (k, _escape(v))
+                         for k, v in sorted(labels.items()))
+            lines.append('%s%s{%s} %s' % (name, suffix, l, _value(value)))
+        else:
+            lines.append('%s%s %s' % (name, suffix, _value(value)))
+
+
+def _escape(v):
+    return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n',
+                                                                    '\\n')
+
+
+def _value(v):
+    if isinstance(v, float):
+        return repr(v)
+    return str(v)
@@ -0,0 +1,86 @@
+"""Searches for a movie with as few queries as possible.
+
+A directory name gives a cleaned title and often a year. Instead of a single
+search for the title, which for common titles returns long lists of results,
+the planner makes a list of queries, most specific (and so cheapest to choose
+from) first:
+
+1. the title, for movies first released in the year,
+2. the title, for movies released in the year in any country,
+3. the title alone,
+4. variants of the title, without a leading article, without punctuation or
+   without a sequel number, with the year and alone.
+
+Queries are made in this order until the best result is confident enough (see
+scoring.py); the results of all queries made are returned together.
+"""
+
+import re
+import datetime
+
+import scoring
+
+# Confidence of the best result at which no more queries are made.
+confident = 0.95
+
+_article = re.compile(r"^(the|a|an)\s+", re.I)
+_punctuation = re.compile(r"[^\w\s]+", re.UNICODE)
+_sequel = re.compile(r"\s+(\d{1,2}|[IVX]{1,4}|part\s+\w+)$", re.I)
+_trailing_year = re.compile(r"^(.+?)\s+\(?((?:19|20)\d\d)\)?$")
+
+
+def search(title, year, lookup, confident=confident):
+    """Returns the results of the queries for ``title`` and ``year`` (or
+    None), made with ``lookup(query, year, primary)`` (see queries()) until
+    the best result has at least the confidence ``confident``."""
+    results = []
+    seen = set()
+    for q, y, primary in queries(title, year):
+        for m in lookup(q, y, primary):
+            if m.id not in seen:
+                seen.add(m.id)
+                results.append(m)
+        ranked = scoring.rank(title, year, results)
+        if ranked and ranked[0][0] >= confident:
+            break
+    return results
+
+
+def queries(title, year):
+    """Returns the queries for ``title`` and ``year`` (or None) in the order in
+    which they are made, as triples: the title to search for, the year (or
+    None) and whether the year is the year of the first release."""
+    out = []
+    for t in [title] + variants(title):
+        if year is not None:
+            out.append((t, year, True))
+            if t == title:
+                out.append((t, year, False))
+        out.append((t, None, False))
+    return out
+
+
+def variants(title):
+    """Returns other spellings of ``title`` that may find the movie."""
+    out = []
+    for v in [_article.sub('', title),
+              _space(_punctuation.sub(' ', title)),
+              _sequel.sub('', title)]:
+        if v and v != title and v not in out:
+            out.append(v)
+    return out
+
+
+def split_year(title, year):
+    """Returns ``title`` and ``year``; if ``year`` is None, but ``title`` ends
+    with a year that has passed (which release name parsers sometimes miss),
+    that year is taken from the title."""
+    if year is None:
+        m = _trailing_year.match(title)
+        if m is not None and int(m.group(2)) <= datetime.date.today().year:
+            return m.group(1), m.group(2)
+    return title, year
+
+
+def _space(s):
+    return ' '.join(s.split())
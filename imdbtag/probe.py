@@ -0,0 +1,179 @@
+"""Title metadata from the headers of Matroska and MP4 movie files.
+
+Some releases have meaningless file and directory names ("movie.mkv"), but
+the movie file itself carries a proper title: Matroska files in the Title
+element of the segment information, MP4 files in the iTunes-style "\xa9nam"
+(title) and "\xa9day" (release date) atoms under moov/udta/meta/ilst.
+
+``probe()`` memory-maps only the first ``probe_size`` bytes of the file and
+parses the EBML elements or MP4 atoms in there; it never reads the whole
+file. The header is usually at the start of the file; MP4 files that keep the
+moov atom at the end are not probed.
+"""
+
+import os
+import re
+import mmap
+import struct
+import logging
+import datetime
+
+# Number of bytes at the start of the file that are looked at.
+probe_size = 4 * 1024 * 1024
+
+# Matroska element ids.
+_EBML = 0x1A45DFA3
+_SEGMENT = 0x18538067
+_INFO = 0x1549A966
+_CLUSTER = 0x1F43B675
+_TITLE = 0x7BA9
+_DATE_UTC = 0x4461
+
+# Matroska dates are in nanoseconds since this date.
+_mkv_epoch = datetime.datetime(2001, 1, 1)
+
+# MP4 atoms on the way to the metadata, and the metadata atoms we want.
+_mp4_path = ['moov', 'udta', 'meta', 'ilst']
+_mp4_fields = {'\xa9nam': 'title', '\xa9day': 'year'}
+
+# Titles that are an advertisement of the release group instead.
+_junk_title = re.compile(r"www\.|https?:|\.(?:com|net|org|to)\b|^\W*$", re.I)
+
+
+def probe(path):
+    """Returns the metadata found in the movie file ``path``, as a dictionary
+    with the keys 'title' (a UTF-8 string), 'year' (MP4 only) and 'date' (the
+    date the Matroska file was made, not the date of the movie), if they are
+    found."""
+    info = {}
+    try:
+        fh = open(path, 'rb')
+    except IOError:
+        return info
+    try:
+        n = min(os.fstat(fh.fileno()).st_size, probe_size)
+        if n < 16:
+            return info
+        m = mmap.mmap(fh.fileno(), n, access=mmap.ACCESS_READ)
+        try:
+            if m[0:4] == struct.pack('>I', _EBML):
+                info = _mkv(m, n)
+            elif m[4:8] in ['ftyp', 'moov', 'free', 'mdat', 'wide']:
+                info = _mp4(m, n)
+        finally:
+            m.close()
+    except (ValueError, IndexError, OverflowError, struct.error,
+            EnvironmentError), e:
+        # Damaged or truncated headers, or files that can't be mapped.
+        logging.debug('Could not probe "' + path + '": ' + str(e))
+    finally:
+        fh.close()
+
+    if 'title' in info:
+        info['title'] = info['title'].strip()
+        if _junk_title.search(info['title']):
+            del info['title']
+    return info
+
+
+def _mkv(m, n):
+    info = {}
+    for id, start, end in _elements(m, 0, n):
+        if id != _SEGMENT:
+            continue
+        for id, start, end in _elements(m, start, end):
+            if id == _INFO:
+                for id, start, end in _elements(m, start, end):
+                    if id == _TITLE:
+                        info['title'] = m[start:end].rstrip('\0')
+                    elif id == _DATE_UTC and end - start == 8:
+                        ns = struct.unpack('>q', m[start:end])[0]
+                        date = _mkv_epoch + datetime.timedelta(
+                                microseconds=ns // 1000)
+                        info['date'] = date.strftime('%Y-%m-%d')
+                return info
+            if id == _CLUSTER:
+                # The segment information comes before the first cluster.
+                return info
+    return info
+
+
+def _elements(m, start, end):
+    """Yields the id, the start and the end of the contents of each EBML
+    element between ``start`` and ``end``."""
+    i = start
+    while i < end:
+        id, i = _vint(m, i, True)
+        size, i = _vint(m, i, False)
+        # Elements of unknown size (all value bits set) go on to the end.
+        if size is None or i + size > end:
+            yield id, i, end
+            return
+        yield id, i, i + size
+        i += size
+
+
+def _vint(m, i, marker):
+    """Returns an EBML variable length integer at ``i``, and the position
+    after it. Ids keep the length marker bit; for sizes, it is removed, and
+    None is returned for unknown sizes."""
+    first = ord(m[i])
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8:
+        raise ValueError('invalid EBML integer')
+    value = first if marker else first & (0xFF >> length)
+    unknown = value == (0xFF >> length)
+    for c in m[i + 1:i + length]:
+        value = (value << 8) | ord(c)
+        unknown = unknown and ord(c) == 0xFF
+    if len(m[i + 1:i + length]) != length - 1:
+        raise IndexError('truncated EBML integer')
+    if not marker and unknown:
+        return None, i + length
+    return value, i + length
+
+
+def _mp4(m, n):
+    info = {}
+    start, end = 0, n
+    for name in _mp4_path:
+        for type, s, e in _atoms(m, start, end):
+            if type == name:
+                # The meta atom has version and flags before its children.
+                start, end = (name == 'meta' and s + 4 or s), e
+                break
+        else:
+            return info
+
+    for type, s, e in _atoms(m, start, end):
+        if type in _mp4_fields:
+            # The value is in a data atom, after its type and locale.
+            for t, ds, de in _atoms(m, s, e):
+                if t == 'data':
+                    value = m[ds + 8:de].rstrip('\0')
+                    if type == '\xa9day':
+                        value = value[0:4]
+                        if not value.isdigit():
+                            continue
+                    info[_mp4_fields[type]] = value
+    return info
+
+
+def _atoms(m, start, end):
+    """Yields the type, the start and the end of the contents of each MP4 atom
+    between ``start`` and ``end``."""
+    i = start
+    while i + 8 <= end:
+        size, type = struct.unpack('>I4s', m[i:i + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', m[i + 8:i + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - i
+        if size < header:
+            return
+        yield type, i + header, min(i + size, end)
+        i += size
@@ -0,0 +1,195 @@
+"""Progress display for long runs.
+
+On a terminal, a single status line on standard error is redrawn a few times
+per second by a background thread, so that the elapsed time and the lookups in
+flight stay current while an entry is processed. Otherwise (e.g. when the
+output goes to a log file), a status line is written every 30 seconds instead.
+The status line is removed before anything else is written to standard output
+or logged, and while the user is asked something (see ``paused()``).
+
+The status shows the number of processed entries, the throughput, the number
+of lookups currently in flight, the overall cache hit rate and the estimated
+time until the run is finished (if the number of entries is known).
+"""
+
+import sys
+import time
+import logging
+import threading
+import contextlib
+
+import stats
+
+# Minimum time between two updates, in seconds.
+tty_interval = 0.2
+log_interval = 30
+
+_display = None
+
+
+class _Display(object):
+
+    def __init__(self, total, stream):
+        self.total = total
+        self.done = 0
+        self.stream = stream
+        self.tty = hasattr(stream, 'isatty') and stream.isatty()
+        self.interval = self.tty and tty_interval or log_interval
+        self.start = time.time()
+        self.last = 0
+        self.shown = False
+        self.finished = False
+        self.paused = 0
+        self.lock = threading.RLock()
+        self.stopped = threading.Event()
+        self.ticker = threading.Thread(target=self.tick)
+        self.ticker.daemon = True
+
+    def tick(self):
+        # Event.wait() with a timeout polls in Python 2, so we sleep instead.
+        while not self.stopped.is_set():
+            time.sleep(tty_interval)
+            self.show()
+
+    def status(self):
+        elapsed = time.time() - self.start
+        rate = elapsed > 0 and self.done / elapsed or 0
+        if self.total is None:
+            s = '%d entries, %.1f/s' % (self.done, rate)
+        else:
+            s = '%d/%d entries, %.1f/s' % (self.done, self.total, rate)
+
+        lookups = stats.running('search') + stats.running('fetch')
+        s += ', %d lookup%s in flight' % (lookups, lookups != 1 and 's' or '')
+
+        h = stats.hit_rate()
+        if h is not None:
+            s += ', cache hit rate %d%%' % round(100 * h)
+
+        if self.finished:
+            s += ', done in ' + _duration(elapsed)
+        elif self.total is not None and rate > 0:
+            s += ', ETA ' + _duration(max(self.total - self.done, 0) / rate)
+        return s
+
+    def show(self, force=False):
+        with self.lock:
+            now = time.time()
+            if self.paused or not force and now - self.last < self.interval:
+                return
+            self.last = now
+            if self.tty:
+                # Overwrite the current line, then clear what's left of it.
+                self.stream.write('\r' + self.status() + '\x1b[K')
+                self.shown = True
+            else:
+                self.stream.write('Progress: ' + self.status() + '\n')
+            self.stream.flush()
+
+    def clear(self):
+        with self.lock:
+            if self.tty and self.shown:
+                self.stream.write('\r\x1b[K')
+                self.stream.flush()
+                self.shown = False
+                # Redraw with the next update.
+                self.last = 0
+
+
+class _ClearingStream(object):
+    """Standard output, which clears the status line before anything is
+    written to it."""
+
+    def __init__(self, stream, display):
+        self.stream = stream
+        self.display = display
+
+    def write(self, s):
+        # The lock keeps the status line from being redrawn in between.
+        with self.display.lock:
+            self.display.clear()
+            self.stream.write(s)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class _ClearFilter(logging.Filter):
+    """Clears the status line before a log message is written, so that the
+    message doesn't end up in the middle of it."""
+
+    def filter(self, record):
+        clear()
+        return True
+
+
+_filter = _ClearFilter()
+
+
+def start(total, stream=sys.stderr):
+    """Starts displaying the progress of a run over ``total`` entries, or an
+    unknown number of entries if ``total`` is None."""
+    global _display
+    _display = _Display(total, stream)
+    for h in logging.getLogger().handlers:
+        h.addFilter(_filter)
+    if _display.tty:
+        sys.stdout = _ClearingStream(sys.stdout, _display)
+    _display.show(force=True)
+    _display.ticker.start()
+
+
+def step(n=1):
+    """Records that ``n`` more entries have been processed."""
+    if _display is not None:
+        _display.done += n
+        _display.show()
+
+
+def clear():
+    """Removes the status line until the next update."""
+    if _display is not None:
+        _display.clear()
+
+
+@contextlib.contextmanager
+def paused():
+    """Removes the status line while the block runs, e.g. while the user is
+    asked something, and shows it again afterwards."""
+    d = _display
+    if d is None:
+        yield
+        return
+    with d.lock:
+        d.paused += 1
+        d.clear()
+    try:
+        yield
+    finally:
+        with d.lock:
+            d.paused -= 1
+        d.show(force=True)
+
+
+def finish():
+    global _display
+    if _display is None:
+        return
+    _display.stopped.set()
+    _display.ticker.join()
+    if isinstance(sys.stdout, _ClearingStream):
+        sys.stdout = sys.stdout.stream
+    _display.finished = True
+    _display.show(force=True)
+    if _display.tty:
+        _display.stream.write('\n')
+        _display.stream.flush()
+    for h in logging.getLogger().handlers:
+        h.removeFilter(_filter)
+    _display = None
+
+
+def _duration(seconds):
+    seconds = int(seconds)
+    return '%d:%02d:%02d' % (seconds // 3600, seconds // 60 % 60,
+                             seconds % 60)
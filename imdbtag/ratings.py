@@ -0,0 +1,102 @@
+"""Local lookup of IMDb ratings.
+
+IMDb publishes the ratings of all titles as ``title.ratings.tsv`` (see
+https://datasets.imdbws.com/). Parsing that file on every run would take longer
+than the lookups it replaces, so we convert it once into a compact binary table
+next to it (``title.ratings.tsv.idx``): fixed-size records of the numeric IMDb
+id and the rating times ten, sorted by id. The table is memory-mapped and
+searched by bisection, so only the few pages touched by a lookup are ever read.
+"""
+
+import os
+import mmap
+import struct
+import logging
+
+# Record layout: numeric IMDb id (without "tt"), rating * 10.
+_record = struct.Struct('<IH')
+
+
+class RatingsTable(object):
+
+    def __init__(self, path):
+        self.path = path
+        self._fh = open(path, 'rb')
+        size = os.fstat(self._fh.fileno()).st_size
+        self._n = size // _record.size
+        if self._n > 0:
+            self._map = mmap.mmap(self._fh.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        else:
+            # An empty file cannot be mapped.
+            self._map = None
+
+    def __len__(self):
+        return self._n
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._fh.close()
+
+    def lookup(self, imdb_id):
+        """Returns the rating of ``imdb_id`` ("tt0137523" or 137523) as a
+        string like "8.8", or None if the id is not in the table."""
+        try:
+            key = int(str(imdb_id).lstrip('t'))
+        except ValueError:
+            return None
+
+        lo, hi = 0, self._n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            i, r = _record.unpack_from(self._map, mid * _record.size)
+            if i < key:
+                lo = mid + 1
+            elif i > key:
+                hi = mid
+            else:
+                return "%.1f" % (r / 10.0)
+        return None
+
+
+def build_table(tsv, table):
+    """Converts the ratings file ``tsv`` into the binary table ``table``."""
+    logging.info('Building ratings table from "' + tsv + '".')
+    records = []
+    fh = open(tsv, 'r')
+    try:
+        fh.readline()  # Skip the header line
+        for line in fh:
+            f = line.split('\t')
+            try:
+                records.append((int(f[0][2:]),
+                                int(round(float(f[1]) * 10))))
+            except (ValueError, IndexError):
+                logging.debug('Skipping malformed ratings line "' +
+                              line.rstrip('\n') + '".')
+    finally:
+        fh.close()
+    records.sort()
+
+    # Write to a temporary file first, so that a concurrent run never maps a
+    # half-written table.
+    tmp = table + '.tmp'
+    fh = open(tmp, 'wb')
+    try:
+        for i, r in records:
+            fh.write(_record.pack(i, r))
+    finally:
+        fh.close()
+    os.rename(tmp, table)
+    logging.debug('Wrote %d ratings to "%s".' % (len(records), table))
+
+
+def open_ratings(tsv):
+    """Opens the ratings table for the ratings file ``tsv``, building or
+    rebuilding the table first if necessary."""
+    table = tsv + '.idx'
+    if not os.path.exists(table) or \
+            os.path.getmtime(table) < os.path.getmtime(tsv):
+        build_table(tsv, table)
+    return RatingsTable(table)
@@ -0,0 +1,98 @@
+"""Parser for release names like "Heat.1995.DIRECTORS.CUT.1080p.BluRay-GRP".
+
+``parse()`` returns a dictionary like the one of the parse-torrent-name
+package (PTN), which imdbtag used before, but only with the fields imdbtag
+needs:
+
+    {'title': 'Heat', 'year': 1995, 'dircut': True}
+
+The title is the part of the name before the first release attribute (year,
+resolution, source, codec, etc.). The year is the last year in the name that
+is not at its start and not in the future, so that "2001 A Space Odyssey
+1968" and "Blade Runner 2049 2017" come out right. The other fields are
+'season' and 'episode', and the editions 'unrated', 'dircut' (director's cut),
+'telesync' and 'remastered'; fields that don't apply are left out.
+
+Some attributes are also ordinary words or parts of titles ("Line", "Ts",
+"R2", "Hc"); these only end the title once the year or another attribute has
+been found before them.
+
+All attributes are found with a single regular expression in a single pass,
+and the results are memoized, as the same names are parsed again and again.
+"""
+
+import re
+import datetime
+
+# Number of names whose results are kept.
+cache_size = 10000
+
+_attributes = re.compile(r"""
+    (?P<year>[\[(]?\b(?:19|20)\d\d\b[\])]?)
+  | \b(?:s(?P<season>\d{1,2})e(?P<episode>\d{1,2})|\d{1,2}x\d{2})\b
+  | (?P<unrated>unrated)
+  | (?P<dircut>director.?s.?cut)
+  | (?P<telesync>telesync)
+  | (?P<remastered>remastered)
+  | \b(?:\d{3,4}p|(?:PPV\.)?[HP]DTV|(?:HD)?CAM|B[DR]Rip|WEB-?DL|HDRip
+       |DVDRip|DVDR|CamRip|W[EB]BRip|BluRay|DvDScr|xvid|divx|[hx]\.?26[45]
+       |MP3|DD5\.?1|Dual[- ]Audio|AAC(?:\.?2\.0)?|AC3(?:\.5\.1)?
+       |EXTENDED(?:.CUT)?|PROPER|REPACK|MKV|AVI|rus\.eng|(?:Half-)?SBS)\b
+  | \b(?P<weak>TS|LiNE|H?DTS|R[0-9]|HC|WS)\b
+    """, re.I | re.X)
+
+_website = re.compile(r"^\[ ?[^\]]+? ?\]")
+
+_editions = ['unrated', 'dircut', 'telesync', 'remastered']
+
+_cache = {}
+
+
+def parse(name):
+    """Returns the title and the attributes of the release name ``name``."""
+    info = _cache.get(name)
+    if info is None:
+        info = _parse(name)
+        if len(_cache) >= cache_size:
+            _cache.clear()
+        _cache[name] = info
+    return info
+
+
+def _parse(name):
+    info = {}
+    # Underscores separate words, just like dots and spaces.
+    s = name.replace('_', ' ')
+    w = _website.match(s)
+    start = w is not None and w.end() or 0
+    end = len(s)
+    last_year = datetime.date.today().year + 1
+
+    year = None
+    for m in _attributes.finditer(s, start):
+        kind = m.lastgroup
+        if kind == 'weak' and year is None and end == len(s):
+            continue
+        if kind == 'year':
+            y = int(m.group().strip('[]()'))
+            # A year at the start, or in the future, is part of the title.
+            if m.start() == start or y > last_year:
+                continue
+            year = (m.start(), y)
+            continue
+        if kind in _editions:
+            info[kind] = True
+        elif m.group('season') is not None:
+            info['season'] = int(m.group('season'))
+            info['episode'] = int(m.group('episode'))
+        end = min(end, m.start())
+
+    if year is not None:
+        info['year'] = year[1]
+        end = min(end, year[0])
+
+    title = s[start:end].split('(')[0].lstrip(' -.')
+    if ' ' not in title and '.' in title:
+        title = title.replace('.', ' ')
+    info['title'] = re.sub(r"([\[(]|\s-)$", '', title.strip()).strip()
+    return info
@@ -0,0 +1,177 @@
+"""Time-budgeted processing of a library, newest entries first.
+
+A run with a deadline processes the entries of a library in the order of
+their modification time, newest first, and stops when the next entry would
+probably not be done in time. Where it stopped is remembered in the file
+``.imdbtag-schedule`` in the library directory, so that the next run goes on
+from there. Each run processes:
+
+1. the entries that changed since the previous run started (fresh downloads),
+2. the entries the previous runs haven't got to yet (the backlog),
+3. all other entries.
+
+A pass over the library is complete once the backlog is empty; the next run
+then starts a new pass.
+
+The modification time of a directory is that of the newest file in it, not
+counting the tagging files (.name, .imdb, etc.): writing these changes the
+time of the directory itself, which would make every directory tagged by a
+run look fresh to the next one.
+"""
+
+import os
+import json
+import stat
+import time
+import logging
+
+import storage
+
+# Name of the file in the library directory that records where the last run
+# stopped.
+state_file = '.imdbtag-schedule'
+
+# How many times the average time per entry must be left of the budget to
+# start another entry.
+safety_factor = 2.0
+
+# Minimum time between two checkpoints, in seconds.
+checkpoint_interval = 30
+
+FRESH, BACKLOG, REST = range(3)
+
+
+class Schedule(object):
+    """Iterates over the entries ``entries`` of the library ``b`` in the order
+    described above, as long as there is time left of ``deadline`` seconds
+    (counted from the creation of the schedule). Use ``finish()`` afterwards
+    to save the state for the next run."""
+
+    def __init__(self, b, entries, deadline):
+        self.path = os.path.join(b, state_file)
+        self.deadline = deadline
+        self.start = time.time()
+        self.average = None
+        self.group = FRESH       # group of the entry being processed
+        self.complete = False    # whether all entries have been processed
+        self.last_save = self.start
+
+        self.state = _load(self.path)
+        self.cursor = self.state.get('cursor')
+        finished = self.state.get('started')
+
+        self.order = []
+        for f in entries:
+            try:
+                key = (entry_mtime(os.path.join(b, f)), f)
+            except OSError:
+                continue
+            if finished is not None and key[0] > finished:
+                group = FRESH
+            elif self.cursor is None or key < self.cursor:
+                group = BACKLOG
+            else:
+                group = REST
+            self.order.append((group, key))
+        # Within each group, newest first, i.e. by descending key, which is
+        # the order that the cursor test above relies on. The second sort is
+        # stable, so it keeps that order within each group.
+        self.order.sort(key=lambda e: e[1], reverse=True)
+        self.order.sort(key=lambda e: e[0])
+
+        logging.debug('Schedule: %d fresh, %d backlog, %d other entries.' %
+                      tuple(sum(1 for g, k in self.order if g == group)
+                            for group in [FRESH, BACKLOG, REST]))
+
+    def __len__(self):
+        return len(self.order)
+
+    def __iter__(self):
+        for group, key in self.order:
+            self.group = group
+            if not self._time_left():
+                logging.info('Deadline reached, stopping before "' + key[1] +
+                             '".')
+                return
+
+            t = time.time()
+            yield key[1]
+            self._add_time(time.time() - t)
+
+            if group == BACKLOG:
+                self.cursor = key
+            if time.time() - self.last_save > checkpoint_interval:
+                self._save(self._next_state())
+        self.complete = True
+
+    def finish(self):
+        """Saves where the run stopped."""
+        self._save(self._next_state())
+
+    def _time_left(self):
+        if self.average is None:
+            return time.time() - self.start < self.deadline
+        left = self.deadline - (time.time() - self.start)
+        return left > safety_factor * self.average
+
+    def _add_time(self, seconds):
+        # Exponential moving average, to follow changes in the mix of entries.
+        if self.average is None:
+            self.average = seconds
+        else:
+            self.average = 0.8 * self.average + 0.2 * seconds
+
+    def _next_state(self):
+        if self.complete or self.group == REST:
+            # The backlog is done, the next run starts a new pass.
+            return {'started': self.start}
+        if self.group == BACKLOG:
+            return {'started': self.start, 'cursor': self.cursor}
+        # Fresh entries are left; they are still fresh next time.
+        return self.state
+
+    def _save(self, state):
+        self.last_save = time.time()
+        s = dict(state)
+        if s.get('cursor') is not None:
+            s['cursor'] = _encode_key(s['cursor'])
+        try:
+            storage.atomic_write(self.path, json.dumps(s) + '\n')
+        except (IOError, OSError):
+            logging.error('Could not write "' + self.path + '".')
+
+
+def entry_mtime(p):
+    """Returns the modification time of the library entry ``p``: for a
+    directory, that of the newest file in it other than the tagging files
+    (whose names start with a dot), or of the directory if there is none."""
+    st = os.lstat(p)
+    if not stat.S_ISDIR(st.st_mode):
+        return st.st_mtime
+    times = [os.lstat(os.path.join(p, f)).st_mtime for f in os.listdir(p)
+             if not f.startswith('.')]
+    return max(times or [st.st_mtime])
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return {}
+    fh = open(path, 'r')
+    try:
+        state = json.load(fh)
+    except ValueError:
+        logging.warning('Ignoring damaged schedule "' + path + '".')
+        return {}
+    finally:
+        fh.close()
+    if state.get('cursor') is not None:
+        state['cursor'] = _decode_key(state['cursor'])
+    return state
+
+
+def _encode_key(key):
+    return [key[0], storage.encode_name(key[1])]
+
+
+def _decode_key(key):
+    return (key[0], storage.decode_name(key[1]))
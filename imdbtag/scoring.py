@@ -0,0 +1,111 @@
+"""Confidence scores for search results.
+
+Every result of a search is scored on three features:
+
+- how similar its title is to the name searched for (the fuzzywuzzy ratio of
+  the normalized names, as in ``get_ordered_matches`` of the tmdb package),
+- whether its year agrees with the year in the directory name, if there is
+  one (release dates often differ by a year between countries),
+- how popular it is, as a tie breaker between movies of the same name.
+
+The features are combined linearly, and the results are compared with each
+other and with the possibility that none of them is the movie searched for
+(a softmax over the results and a "none" option of score 0). The confidence
+of a result is thus low if it matches badly, but also if another result
+matches just as well. The weights were fitted on the synthetic library of the
+benchmarks (see benchmarks/calibrate.py), not on real names.
+
+The confidence can only compare the results that the search returned, so a
+single result with the exact title gets a high confidence even if it is the
+remake of the movie searched for. ``acceptable()`` therefore takes a result
+without asking only if its year agrees with the name, or if it clearly beats
+the runner-up.
+"""
+
+import math
+
+import fuzzywuzzy.fuzz
+
+import aliases
+
+# Weights of the features, and the bias.
+bias = -6.0
+title_weight = 10.0
+year_weight = 3.0
+popularity_weight = 1.0
+
+# Popularity at which the popularity feature is 1; TMDb popularity is open
+# ended, most movies are well below this.
+popular = 100.0
+
+# Score by which the best result has to beat the runner-up to be taken
+# without asking if the year doesn't confirm it; a title ratio of 0.2.
+margin = 2.0
+
+
+def rank(q, year, results):
+    """Returns pairs (confidence, movie) for the search results ``results`` of
+    the name ``q`` with year ``year`` (or None), best first. The confidences
+    add up to less than 1."""
+    if not results:
+        return []
+    scores = [score(q, year, m) for m in results]
+    # Subtracting the maximum avoids overflows; the "none" option becomes
+    # exp(-top) then.
+    top = max(scores + [0.0])
+    weights = [math.exp(s - top) for s in scores]
+    total = math.exp(-top) + sum(weights)
+    ranked = [(w / total, m) for w, m in zip(weights, results)]
+    # Stable sort: the order of the search breaks ties.
+    ranked.sort(key=lambda e: -e[0])
+    return ranked
+
+
+def acceptable(q, year, ranked, threshold):
+    """Returns whether the best of the results ``ranked`` (as returned by
+    rank()) for the name ``q`` and the year ``year`` (or None) may be taken
+    without asking: its confidence is at least ``threshold``, and its year
+    agrees with ``year`` (give or take a year), or its score is at least
+    ``margin`` above that of the runner-up. A single result for a name without
+    a year is never taken, as there may be other movies of the same title that
+    the search didn't return."""
+    if not ranked or ranked[0][0] < threshold:
+        return False
+    best = ranked[0][1]
+    if _year(year, best) > 0:
+        return True
+    if len(ranked) < 2:
+        return False
+    return score(q, year, best) - score(q, year, ranked[1][1]) >= margin
+
+
+def score(q, year, m):
+    """Returns the score of the movie ``m`` for the name ``q`` and the year
+    ``year`` (or None)."""
+    return (bias + title_weight * _title(q, m) +
+            year_weight * _year(year, m) +
+            popularity_weight * _popularity(m))
+
+
+def _title(q, m):
+    q = aliases.normalize(q)
+    titles = [t for t in [m.title, m.other_title] if t] or ['']
+    return max(fuzzywuzzy.fuzz.ratio(q, aliases.normalize(t))
+               for t in titles) / 100.0
+
+
+def _year(year, m):
+    try:
+        d = abs(int(year) - int(m.year))
+    except (TypeError, ValueError):
+        # No year in the name, or the movie has no release date.
+        return 0.0
+    if d == 0:
+        return 1.0
+    if d == 1:
+        return 0.5
+    return -1.0
+
+
+def _popularity(m):
+    return min(1.0, math.log1p(m.popularity) / math.log1p(popular))
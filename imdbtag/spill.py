@@ -0,0 +1,74 @@
+"""Lists that keep a bounded number of items in memory.
+
+Items beyond the limit are written to an anonymous temporary file, so the
+memory use of a list stays the same no matter how many items are added.
+Iteration returns the items in the order in which they were added.
+
+Items can be anything that the ``marshal`` module can serialize; for imdbtag,
+these are strings and tuples of strings.
+"""
+
+import marshal
+import tempfile
+
+# Number of items kept in memory by default.
+default_limit = 1000
+
+
+class SpillList(object):
+
+    def __init__(self, limit=None):
+        self.limit = limit or default_limit
+        self.items = []
+        self.file = None
+        self.spilled = 0
+
+    def append(self, item):
+        self.items.append(item)
+        if len(self.items) >= self.limit:
+            self._spill()
+
+    def __len__(self):
+        return self.spilled + len(self.items)
+
+    def __iter__(self):
+        if self.file is not None:
+            self.file.flush()
+            for item in read(self.file):
+                yield item
+        for item in list(self.items):
+            yield item
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.items = []
+        self.spilled = 0
+
+    def _spill(self):
+        if self.file is None:
+            self.file = tempfile.TemporaryFile(prefix='imdbtag.')
+        # Always append, even if a reader has moved the file position.
+        self.file.seek(0, 2)
+        write(self.file, self.items)
+        self.spilled += len(self.items)
+        self.items = []
+
+
+def write(fh, items):
+    """Appends ``items`` to the file ``fh``."""
+    for item in items:
+        marshal.dump(item, fh)
+
+
+def read(fh):
+    """Returns a generator over all items in the file ``fh``, from the start.
+    Reading shares the file position, so don't write to ``fh`` while the
+    generator is in use."""
+    fh.seek(0)
+    while True:
+        try:
+            yield marshal.load(fh)
+        except EOFError:
+            return
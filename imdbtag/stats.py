@@ -0,0 +1,226 @@
+"""Timers and counters for the processing path.
+
+The processing functions wrap their work in ``phase()`` blocks (or are
+decorated with ``timed()``), and the API layer reports every HTTP request with
+``http()``. Phases can be nested; the time of a phase includes the time of the
+phases nested in it. At the end of a run, the collected numbers can be printed
+with ``report()`` or exported with ``as_dict()`` or ``as_json()``.
+
+If a trace is active (see the tracing module), phases, cache lookups and HTTP
+requests are also recorded as spans.
+
+The percentiles of the request latencies are estimated from a uniform sample
+of at most ``sample_size`` requests per endpoint, so that the memory does not
+grow with the length of a run; the count, total and maximum are exact.
+
+All functions are thread-safe.
+"""
+
+import time
+import json
+import random
+import threading
+import contextlib
+
+import tracing
+
+_lock = threading.Lock()
+_start = time.time()
+_phases = {}     # phase name -> [number of calls, total seconds]
+_counters = {}   # counter name -> value
+_requests = {}   # endpoint -> [count, total, max, errors, sample of latencies]
+_caches = {}     # cache name -> [hits, misses]
+_running = {}    # phase name -> number of threads currently in it
+_random = random.Random(0)
+
+sample_size = 1000
+
+
+def reset():
+    global _start, _phases, _counters, _requests, _caches
+    with _lock:
+        _start = time.time()
+        _phases = {}
+        _counters = {}
+        _requests = {}
+        _caches = {}
+
+
+def timed(name):
+    """Decorator that measures all calls of a function as the phase
+    ``name``."""
+    def decorate(f):
+        def timed_f(*args, **kwargs):
+            with phase(name):
+                return f(*args, **kwargs)
+        timed_f.__name__ = f.__name__
+        timed_f.__doc__ = f.__doc__
+        return timed_f
+    return decorate
+
+
+@contextlib.contextmanager
+def phase(name, **args):
+    """Measures the wall-clock time spent in the ``with`` block as part of the
+    phase ``name``. The keyword arguments are added to the trace span."""
+    traced = tracing.active()
+    if traced:
+        tracing.open_span().update(args)
+    with _lock:
+        _running[name] = _running.get(name, 0) + 1
+    start = time.time()
+    try:
+        yield
+    finally:
+        elapsed = time.time() - start
+        if traced:
+            tracing.close_span(name, start, elapsed)
+        with _lock:
+            _running[name] -= 1
+        add_time(name, elapsed)
+
+
+def add_time(name, seconds):
+    """Adds ``seconds`` to the phase ``name``, as if it was measured."""
+    with _lock:
+        p = _phases.setdefault(name, [0, 0.0])
+        p[0] += 1
+        p[1] += seconds
+
+
+def running(name):
+    """Returns the number of threads currently in the phase ``name``."""
+    with _lock:
+        return _running.get(name, 0)
+
+
+def hit_rate():
+    """Returns the hit rate over all caches, or None if there were no cache
+    lookups yet."""
+    with _lock:
+        hits = sum(h for h, m in _caches.values())
+        total = sum(h + m for h, m in _caches.values())
+    if total == 0:
+        return None
+    return float(hits) / total
+
+
+def count(name, n=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def cache(name, hit):
+    """Records a hit (or a miss, if ``hit`` is False) of the cache ``name``."""
+    tracing.annotate(name + ' hit', hit)
+    with _lock:
+        c = _caches.setdefault(name, [0, 0])
+        c[0 if hit else 1] += 1
+
+
+def http(endpoint, seconds, ok):
+    """Records a request to the API ``endpoint`` that took ``seconds``."""
+    tracing.record('GET ' + endpoint, time.time() - seconds, seconds,
+                   {'ok': ok})
+    with _lock:
+        r = _requests.setdefault(endpoint, [0, 0.0, 0.0, 0, []])
+        r[0] += 1
+        r[1] += seconds
+        r[2] = max(r[2], seconds)
+        if not ok:
+            r[3] += 1
+        # Reservoir sampling: every request so far is in the sample with the
+        # same probability.
+        sample = r[4]
+        if len(sample) < sample_size:
+            sample.append(seconds)
+        else:
+            i = _random.randint(0, r[0] - 1)
+            if i < sample_size:
+                sample[i] = seconds
+
+
+def percentile(values, p):
+    """Returns the ``p``-th percentile of the sorted list ``values``."""
+    if not values:
+        return 0.0
+    i = int(round(p / 100.0 * (len(values) - 1)))
+    return values[i]
+
+
+def as_dict():
+    with _lock:
+        requests = {}
+        for endpoint, r in _requests.items():
+            n, total, slowest, errors, sample = r
+            l = sorted(sample)
+            requests[endpoint] = {
+                'count': n,
+                'errors': errors,
+                'total': round(total, 6),
+                'p50': round(percentile(l, 50), 6),
+                'p90': round(percentile(l, 90), 6),
+                'p99': round(percentile(l, 99), 6),
+                'max': round(slowest, 6),
+                }
+
+        caches = {}
+        for name, (hits, misses) in _caches.items():
+            caches[name] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(float(hits) / (hits + misses), 4),
+                }
+
+        return {
+            'duration': round(time.time() - _start, 6),
+            'phases': dict((name, {'count': c, 'total': round(t, 6)})
+                           for name, (c, t) in _phases.items()),
+            'counters': dict(_counters),
+            'requests': requests,
+            'caches': caches,
+            }
+
+
+def as_json():
+    return json.dumps(as_dict(), indent=2, sort_keys=True)
+
+
+def report():
+    """Returns the statistics as a list of lines for display."""
+    d = as_dict()
+    lines = ['Run time: %.2fs' % d['duration']]
+
+    if d['phases']:
+        lines.append('')
+        lines.append('%-20s %8s %10s %10s' % ('Phase', 'Count', 'Total',
+                                              'Average'))
+        for name, p in sorted(d['phases'].items(),
+                              key=lambda i: -i[1]['total']):
+            lines.append('%-20s %8d %9.3fs %9.2fms' % (
+                name, p['count'], p['total'],
+                1000 * p['total'] / max(p['count'], 1)))
+
+    if d['requests']:
+        lines.append('')
+        lines.append('%-20s %8s %6s %9s %9s %9s %9s' % (
+            'Endpoint', 'Requests', 'Errors', 'p50', 'p90', 'p99', 'Max'))
+        for endpoint, r in sorted(d['requests'].items()):
+            lines.append('%-20s %8d %6d %7.1fms %7.1fms %7.1fms %7.1fms' % (
+                endpoint, r['count'], r['errors'], 1000 * r['p50'],
+                1000 * r['p90'], 1000 * r['p99'], 1000 * r['max']))
+
+    if d['caches']:
+        lines.append('')
+        lines.append('%-20s %8s %8s %9s' % ('Cache', 'Hits', 'Misses',
+                                            'Hit rate'))
+        for name, c in sorted(d['caches'].items()):
+            lines.append('%-20s %8d %8d %8.1f%%' % (
+                name, c['hits'], c['misses'], 100 * c['hit_rate']))
+
+    if d['counters']:
+        lines.append('')
+        for name, n in sorted(d['counters'].items()):
+            lines.append('%-20s %8d' % (name, n))
+
+    return lines
@@ -0,0 +1,55 @@
+"""Helpers for imdbtag's own state files."""
+
+import os
+import tempfile
+
+from apis.movie import Movie
+
+
+def atomic_write(path, s):
+    """Writes the string ``s`` to the file ``path`` atomically: readers see
+    either the old or the new content, never a partially written file."""
+    d = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.',
+                               dir=d)
+    try:
+        fh = os.fdopen(fd, 'w')
+        try:
+            fh.write(s)
+            fh.flush()
+            os.fsync(fh.fileno())
+        finally:
+            fh.close()
+        # mkstemp() creates the file readable only by us.
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp, 0o666 & ~umask)
+        os.rename(tmp, path)
+    except:
+        os.remove(tmp)
+        raise
+
+
+# File names are byte strings without a known encoding; Latin-1 maps every
+# byte to a character and back, so names survive the round trip through JSON.
+def encode_name(s):
+    """Returns the file name ``s`` as unicode string, e.g. for JSON."""
+    return s.decode('latin-1')
+
+
+def decode_name(s):
+    """Inverse of ``encode_name()``."""
+    return s.encode('latin-1')
+
+
+def movie_fields(m):
+    """Returns the fields of the movie ``m`` as dictionary, e.g. for JSON."""
+    return dict(vars(m))
+
+
+def movie_from_fields(fields):
+    """Inverse of ``movie_fields()``."""
+    # Strings come back from JSON as unicode, but titles are byte strings
+    # everywhere else.
+    return Movie(**dict((str(k), isinstance(v, unicode) and v.encode('utf-8')
+                         or v) for k, v in fields.items()))
@@ -0,0 +1,102 @@
+"""Export of spans in the Trace Event Format.
+
+The resulting file can be loaded into chrome://tracing or the Perfetto UI
+(https://ui.perfetto.dev). Spans are emitted by ``stats.phase()`` and for
+every API request while a trace is active; each span shows up on the thread
+that executed it, so concurrent lookups are visible as such.
+
+Events are written to the file as they complete, so a trace of a long run does
+not need any memory.
+"""
+
+import os
+import json
+import time
+import threading
+
+_lock = threading.Lock()
+_file = None
+_first = True
+_start = 0.0
+_local = threading.local()
+
+
+def start(path):
+    """Starts writing a trace to the file ``path``."""
+    global _file, _first, _start
+    with _lock:
+        _file = open(path, 'w')
+        _file.write('[\n')
+        _first = True
+        _start = time.time()
+
+
+def stop():
+    """Finishes the trace file."""
+    global _file
+    with _lock:
+        if _file is not None:
+            _file.write('\n]\n')
+            _file.close()
+            _file = None
+
+
+def active():
+    return _file is not None
+
+
+def open_span():
+    """Opens a span on the current thread; returns its attribute dictionary,
+    which can be extended until the span is closed."""
+    args = {}
+    _stack().append(args)
+    return args
+
+
+def close_span(name, start, seconds):
+    """Closes the innermost span of the current thread and records it with
+    the name ``name``, having started at ``start`` and taken ``seconds``."""
+    args = _stack().pop()
+    record(name, start, seconds, args)
+
+
+def annotate(key, value):
+    """Adds an attribute to the innermost open span of the current thread."""
+    stack = _stack()
+    if stack:
+        stack[-1][key] = value
+
+
+def record(name, start, seconds, args=None):
+    """Records a span that has already completed."""
+    global _first
+    if _file is None:
+        return
+
+    e = {
+        'name': name,
+        'ph': 'X',
+        'ts': int((start - _start) * 1e6),
+        'dur': int(seconds * 1e6),
+        'pid': os.getpid(),
+        'tid': threading.current_thread().ident,
+        }
+    if args:
+        e['args'] = args
+    s = json.dumps(e)
+
+    with _lock:
+        if _file is None:
+            return
+        if not _first:
+            _file.write(',\n')
+        _file.write(s)
+        _first = False
+
+
+def _stack():
+    try:
+        return _local.stack
+    except AttributeError:
+        _local.stack = []
+        return _local.stack
@@ -0,0 +1,84 @@
+"""Streaming traversal of large directories.
+
+``entries()`` returns the names in a directory as they are read from the file
+system, so processing can start right away and the memory use doesn't depend
+on the size of the directory. ``sorted_entries()`` returns them in sorted
+order, using an external merge sort: the names are sorted in chunks of
+bounded size, which are written to temporary files and then merged.
+
+``os.scandir`` is used (Python 3.5, or the ``scandir`` package on Python 2).
+Without it, ``entries()`` falls back to ``os.listdir``, which reads the whole
+directory at once; setConfig() refuses the streaming traversals then.
+"""
+
+import os
+import heapq
+import tempfile
+
+import spill
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+# Maximum number of names that sorted_entries() keeps in memory.
+sort_chunk = 50000
+
+
+def entries(b):
+    """Returns a generator over the names in the directory ``b``, in the order
+    of the file system."""
+    if scandir is None:
+        for f in os.listdir(b):
+            yield f
+        return
+
+    it = scandir(b)
+    try:
+        for e in it:
+            yield e.name
+    finally:
+        # Only the scandir() of Python 3.6 and later can be closed.
+        if hasattr(it, 'close'):
+            it.close()
+
+
+def sorted_entries(b, chunk=None):
+    """Returns a generator over the names in the directory ``b`` in sorted
+    order, keeping at most ``chunk`` names in memory."""
+    chunk = chunk or sort_chunk
+
+    runs = []
+    names = []
+    try:
+        for f in entries(b):
+            names.append(f)
+            if len(names) >= chunk:
+                runs.append(_write_run(names))
+                names = []
+        names.sort()
+
+        if not runs:
+            # Everything fit into memory.
+            for f in names:
+                yield f
+            return
+
+        iterators = [spill.read(fh) for fh in runs]
+        iterators.append(iter(names))
+        for f in heapq.merge(*iterators):
+            yield f
+    finally:
+        for fh in runs:
+            fh.close()
+
+
+def _write_run(names):
+    names.sort()
+    fh = tempfile.TemporaryFile(prefix='imdbtag.')
+    spill.write(fh, names)
+    return fh
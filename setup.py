@@ -15,11 +15,11 @@ setup(
     long_description=description,
     packages=find_packages(),
     install_requires=[
-        "parse-torrent-name",
-        "simplejson",         # transitive dependency of tmdb
-        "fuzzywuzzy",         # transitive dependency of tmdb
-        "requests",           # transitive dependency of tmdb
-        "python-Levenshtein"  # transitive dependency of tmdb
+        "simplejson",          # transitive dependency of tmdb
+        "fuzzywuzzy",          # transitive dependency of tmdb
+        "requests",            # transitive dependency of tmdb
+        "python-Levenshtein",  # transitive dependency of tmdb
+        "scandir; python_version < '3.5'"  # streaming traversals
         ],
     entry_points={
         "console_scripts": ["imdbtag = imdbtag.cli:main"]
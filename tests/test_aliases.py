@@ -0,0 +1,99 @@
+"""Tests of the aliases learned from the user's choices
+(imdbtag/aliases.py)."""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'imdbtag'))
+import aliases
+from apis.movie import Movie
+
+movies = {
+    '949': Movie('Heat', '1995', '', '949', '', '8.3'),
+    '3043': Movie('Heat', '1986', '', '3043', '', '5.9'),
+    }
+
+
+class AliasesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='imdbtag-test-')
+        self.file = aliases.aliases_file
+        aliases.aliases_file = os.path.join(self.dir, 'aliases.json')
+        aliases._aliases = None
+        self.fetched = []
+
+    def tearDown(self):
+        aliases.aliases_file = self.file
+        aliases._aliases = None
+        shutil.rmtree(self.dir)
+
+    def movie(self, id):
+        self.fetched.append(id)
+        return movies[id]
+
+    def lookup(self, s, year=None):
+        a = aliases.lookup(s, year, self.movie)
+        return a and (a[0].id, a[1])
+
+    def reload(self):
+        aliases._aliases = None
+
+    def test_normalize(self):
+        self.assertEqual(aliases.normalize('  Heat:  The_Movie! '),
+                         'heat the movie')
+        self.assertEqual(aliases.normalize('\xc3\x89t\xc3\xa9 Fran\xc3\xa7ais'),
+                         '\xc3\xa9t\xc3\xa9 fran\xc3\xa7ais')
+        self.assertEqual(aliases.normalize(u'\xc9t\xe9'), '\xc3\xa9t\xc3\xa9')
+        # Not UTF-8: taken as Latin-1.
+        self.assertEqual(aliases.normalize('\xc9t\xe9'), '\xc3\xa9t\xc3\xa9')
+
+    def test_learn_and_lookup(self):
+        aliases.learn('Heat', '1995', movies['949'], 'Heat (Director\'s Cut)')
+        self.reload()
+        self.assertEqual(self.lookup('heat', '1995'),
+                         ('949', 'Heat (Director\'s Cut)'))
+        self.assertIsNone(self.lookup('Heat', '1986'))
+        self.assertIsNone(self.lookup('Heat'))
+
+    def test_only_the_id_is_kept(self):
+        aliases.learn('Heat', '1995', movies['949'])
+        doc = json.load(open(aliases.aliases_file))
+        self.assertEqual(doc, {'heat (1995)': {'id': '949', 'name': ''}})
+        self.lookup('Heat', '1995')
+        self.assertEqual(self.fetched, ['949'])
+
+    def test_without_year(self):
+        aliases.learn('Heat', None, movies['3043'])
+        self.assertEqual(self.lookup('Heat'), ('3043', ''))
+        self.assertEqual(self.lookup('Heat', '1986'), ('3043', ''))
+        self.assertIsNone(self.lookup('Heat', '1995'))
+
+    def test_non_ascii_names(self):
+        aliases.learn('\xc3\x89t\xc3\xa9', None, movies['949'])
+        self.reload()
+        self.assertEqual(self.lookup('\xc3\xa9t\xc3\xa9'), ('949', ''))
+
+    def test_old_files(self):
+        fh = open(aliases.aliases_file, 'w')
+        json.dump({'heat (1995)': {'movie': {'id': '949', 'title': 'Heat',
+                                             'rating': '7.0'},
+                                   'name': ''}}, fh)
+        fh.close()
+        self.assertEqual(self.lookup('Heat', '1995'), ('949', ''))
+
+    def test_damaged_file(self):
+        open(aliases.aliases_file, 'w').write('{"heat": {}}')
+        self.assertIsNone(self.lookup('Heat'))
+
+    def test_empty_name(self):
+        aliases.learn('...', None, movies['949'])
+        self.assertFalse(os.path.exists(aliases.aliases_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""Tests of the journal of offline runs (imdbtag/checkpoint.py)."""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'imdbtag'))
+import checkpoint
+from apis.movie import Movie
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.lib = tempfile.mkdtemp(prefix='imdbtag-test-')
+        self.path = os.path.join(self.lib, checkpoint.journal_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.lib)
+
+    def test_resume(self):
+        j = checkpoint.Journal(self.lib)
+        j.done('Heat (1995)', 'Heat.1995.720p')
+        j.resolved('name:Heat (1995)', Movie('Heat', '1995', '', '949', '',
+                                             '8.3'))
+        j.resolved('name:Nothing', None)
+        j.close()
+
+        j = checkpoint.Journal(self.lib, resume=True)
+        self.assertTrue(j.is_done('Heat.1995.720p'))
+        self.assertFalse(j.is_done('Other'))
+        known, m = j.lookup('name:Heat (1995)')
+        self.assertTrue(known)
+        self.assertEqual((m.title, m.year, m.id, m.rating),
+                         ('Heat', '1995', '949', '8.3'))
+        self.assertEqual(j.lookup('name:Nothing'), (True, None))
+        self.assertEqual(j.lookup('name:Other'), (False, None))
+        j.close()
+
+    def test_new_run_starts_over(self):
+        j = checkpoint.Journal(self.lib)
+        j.done('Heat (1995)')
+        j.close()
+        j = checkpoint.Journal(self.lib)
+        self.assertFalse(j.is_done('Heat (1995)'))
+        j.close()
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+    def test_complete_run_removes_journal(self):
+        j = checkpoint.Journal(self.lib)
+        j.done('Heat (1995)')
+        j.close(complete=True)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(
+                checkpoint.Journal(self.lib, resume=True).is_done('Heat (1995)'))
+
+    def test_resumed_run_appends(self):
+        j = checkpoint.Journal(self.lib)
+        j.done('a')
+        j.close()
+        j = checkpoint.Journal(self.lib, resume=True)
+        j.done('a', 'b')
+        j.close()
+        self.assertEqual(len(open(self.path).readlines()), 2)
+        j = checkpoint.Journal(self.lib, resume=True)
+        self.assertTrue(j.is_done('a') and j.is_done('b'))
+        j.close()
+
+    def test_incomplete_last_line(self):
+        j = checkpoint.Journal(self.lib)
+        j.done('a')
+        j.close()
+        open(self.path, 'a').write('{"done": "b')
+        j = checkpoint.Journal(self.lib, resume=True)
+        self.assertTrue(j.is_done('a'))
+        self.assertFalse(j.is_done('b'))
+        j.close()
+
+    def test_non_ascii_names(self):
+        j = checkpoint.Journal(self.lib)
+        j.done('Am\xc3\xa9lie (2001)', 'Am\xe9lie.2001')
+        j.close()
+        j = checkpoint.Journal(self.lib, resume=True)
+        self.assertTrue(j.is_done('Am\xc3\xa9lie (2001)'))
+        self.assertTrue(j.is_done('Am\xe9lie.2001'))
+        j.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
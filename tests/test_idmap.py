@@ -0,0 +1,67 @@
+"""Tests of the mapping of IMDb ids to TMDb ids (imdbtag/idmap.py)."""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'imdbtag'))
+import idmap
+
+
+class IdMapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='imdbtag-test-')
+        self.saved = idmap.idmap_file, idmap.flush_interval
+        idmap.idmap_file = os.path.join(self.dir, 'imdbtag', 'idmap.json')
+        self.reload()
+
+    def tearDown(self):
+        idmap.idmap_file, idmap.flush_interval = self.saved
+        self.reload()
+        shutil.rmtree(self.dir)
+
+    def reload(self):
+        idmap._idmap = None
+        idmap._dirty = False
+
+    def test_lookup(self):
+        self.assertEqual(idmap.lookup('tt0113277'), (False, None))
+        idmap.record('tt0113277', '949')
+        idmap.record('tt0000000', None)
+        self.assertEqual(idmap.lookup('tt0113277'), (True, '949'))
+        self.assertEqual(idmap.lookup('tt0000000'), (True, None))
+
+    def test_flush(self):
+        idmap.flush_interval = 3600
+        idmap.record('tt0113277', '949')
+        idmap.record('tt0000000', None)
+        # Not written before it is due.
+        self.assertFalse(os.path.exists(idmap.idmap_file))
+        idmap.flush()
+        self.assertEqual(json.load(open(idmap.idmap_file)),
+                         {'tt0113277': '949', 'tt0000000': None})
+        self.reload()
+        self.assertEqual(idmap.lookup('tt0113277'), (True, '949'))
+        self.assertEqual(idmap.lookup('tt0000000'), (True, None))
+
+    def test_written_when_due(self):
+        idmap.flush_interval = 0
+        idmap.record('tt0113277', '949')
+        self.assertTrue(os.path.exists(idmap.idmap_file))
+
+    def test_flush_without_changes(self):
+        idmap.flush()
+        self.assertFalse(os.path.exists(idmap.idmap_file))
+
+    def test_damaged_file(self):
+        os.mkdir(os.path.dirname(idmap.idmap_file))
+        open(idmap.idmap_file, 'w').write('{"tt0113277": ')
+        self.assertEqual(idmap.lookup('tt0113277'), (False, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""Tests of the ids found in directories (imdbtag/localids.py)."""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'imdbtag'))
+import localids
+
+kodi_nfo = """<?xml version="1.0" encoding="UTF-8" standalone="yes" ?>
+<movie>
+    <title>Heat</title>
+    <originaltitle>Heat</originaltitle>
+    <uniqueid type="imdb">tt0113277</uniqueid>
+    <uniqueid type="tmdb" default="true">949</uniqueid>
+    <tmdbid>949</tmdbid>
+</movie>
+"""
+
+scene_nfo = """Heat (1995)
+
+    IMDb ....: https://www.imdb.com/title/tt0113277/
+    Also from us: https://www.imdb.com/title/tt0090142/
+"""
+
+
+class FindTest(unittest.TestCase):
+
+    def setUp(self):
+        self.lib = tempfile.mkdtemp(prefix='imdbtag-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.lib)
+
+    def entry(self, name, files={}):
+        d = os.path.join(self.lib, name)
+        os.mkdir(d)
+        for f, text in files.items():
+            fh = open(os.path.join(d, f), 'w')
+            fh.write(text)
+            fh.close()
+        return name
+
+    def find(self, d, title=None):
+        return localids.find(self.lib, d, title)
+
+    def test_nothing(self):
+        self.assertIsNone(self.find(self.entry('Heat.1995',
+                                               {'heat.mkv': ''})))
+        self.assertIsNone(self.find('missing'))
+
+    def test_names(self):
+        self.assertEqual(self.find(self.entry('Heat (1995) [tmdbid-949]')),
+                         ('tmdb', '949'))
+        self.assertEqual(self.find(self.entry('Heat (1995) {imdb-TT0113277}')),
+                         ('imdb', 'tt0113277'))
+        d = self.entry('Heat.1995', {'Heat (1995) {tmdb-949}.mkv': ''})
+        self.assertEqual(self.find(d), ('tmdb', '949'))
+
+    def test_names_before_nfo(self):
+        d = self.entry('Heat (1995) {imdb-tt0113277}',
+                       {'movie.nfo': '<tmdbid>5</tmdbid>'})
+        self.assertEqual(self.find(d), ('imdb', 'tt0113277'))
+
+    def test_kodi_nfo(self):
+        d = self.entry('Heat.1995', {'movie.nfo': kodi_nfo})
+        self.assertEqual(self.find(d), ('tmdb', '949'))
+
+    def test_single_imdb_id(self):
+        d = self.entry('Heat.1995', {'heat.nfo': scene_nfo.split('Also')[0]})
+        self.assertEqual(self.find(d), ('imdb', 'tt0113277'))
+
+    def test_several_ids(self):
+        d = self.entry('Heat.1995', {'heat.nfo': scene_nfo})
+        self.assertIsNone(self.find(d, 'Heat'))
+
+    def test_several_ids_and_agreeing_title(self):
+        nfo = kodi_nfo.replace('</movie>', '<set><tmdbid>1</tmdbid></set>\n'
+                               '</movie>')
+        d = self.entry('Heat.1995', {'movie.nfo': nfo})
+        self.assertEqual(self.find(d, 'Heat'), ('tmdb', '949'))
+        self.assertIsNone(self.find(d, 'Heated'))
+        self.assertIsNone(self.find(d))
+
+    def test_later_nfo(self):
+        d = self.entry('Heat.1995', {'a.nfo': scene_nfo,
+                                     'b.NFO': 'themoviedb.org/movie/949'})
+        self.assertEqual(self.find(d, 'Heat'), ('tmdb', '949'))
+
+    def test_read_size(self):
+        size = localids.nfo_read_size
+        localids.nfo_read_size = 100
+        try:
+            d = self.entry('Heat.1995',
+                           {'heat.nfo': ' ' * 100 + '<tmdbid>949</tmdbid>'})
+            self.assertIsNone(self.find(d))
+        finally:
+            localids.nfo_read_size = size
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+"""Tests of the search planner (imdbtag/planner.py)."""
+
+import os
+import sys
+import datetime
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'imdbtag'))
+import planner
+from apis.movie import Movie
+
+
+class QueriesTest(unittest.TestCase):
+
+    def test_with_year(self):
+        self.assertEqual(planner.queries('Heat', '1995'),
+                         [('Heat', '1995', True), ('Heat', '1995', False),
+                          ('Heat', None, False)])
+
+    def test_without_year(self):
+        self.assertEqual(planner.queries('Heat', None),
+                         [('Heat', None, False)])
+
+    def test_variants(self):
+        self.assertEqual(planner.variants('The Matrix'), ['Matrix'])
+        self.assertEqual(planner.variants('Wall-E'), ['Wall E'])
+        self.assertEqual(planner.variants('Rocky 2'), ['Rocky'])
+        self.assertEqual(planner.variants('Heat'), [])
+        # Variants are searched with the year and alone.
+        self.assertEqual(planner.queries('The Matrix', '1999')[3:],
+                         [('Matrix', '1999', True), ('Matrix', None, False)])
+
+    def test_split_year(self):
+        self.assertEqual(planner.split_year('Brazil 1985', None),
+                         ('Brazil', '1985'))
+        self.assertEqual(planner.split_year('Brazil (1985)', None),
+                         ('Brazil', '1985'))
+        self.assertEqual(planner.split_year('Brazil 1985', '1986'),
+                         ('Brazil 1985', '1986'))
+        future = str(datetime.date.today().year + 1)
+        self.assertEqual(planner.split_year('Movie ' + future, None),
+                         ('Movie ' + future, None))
+
+
+class SearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.made = []
+
+    def lookup(self, results):
+        """Returns a lookup function that answers each query with the
+        results in ``results`` (query -> list of movies)."""
+        def lookup(q, year, primary):
+            self.made.append((q, year, primary))
+            return results.get((q, year, primary), [])
+        return lookup
+
+    def test_stops_when_confident(self):
+        heat = Movie('Heat', '1995', '', '1', '', '')
+        r = planner.search('Heat', '1995',
+                           self.lookup({('Heat', '1995', True): [heat]}))
+        self.assertEqual(r, [heat])
+        self.assertEqual(self.made, [('Heat', '1995', True)])
+
+    def test_goes_on_until_found(self):
+        matrix = Movie('The Matrix', '1999', '', '1', '', '')
+        r = planner.search('The Matrix', '1999',
+                           self.lookup({('Matrix', '1999', True): [matrix]}))
+        self.assertEqual(r, [matrix])
+        self.assertEqual(len(self.made), 4)
+
+    def test_collects_all_results(self):
+        a = Movie('Heat Wave', '1990', '', '1', '', '')
+        b = Movie('Heated', '1993', '', '2', '', '')
+        r = planner.search('Heat', '1995', self.lookup({
+                ('Heat', '1995', False): [a],
+                ('Heat', None, False): [a, b]}))
+        # Duplicates are dropped, the order of the queries is kept.
+        self.assertEqual([m.id for m in r], ['1', '2'])
+        self.assertEqual(len(self.made), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
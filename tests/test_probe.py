@@ -0,0 +1,122 @@
+"""Tests of the title metadata of movie files (imdbtag/probe.py)."""
+
+import os
+import sys
+import struct
+import shutil
+import datetime
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'imdbtag'))
+import probe
+
+
+def element(id, payload):
+    """Returns a Matroska element with the id ``id`` (bytes, with the length
+    marker) and an 8-byte size."""
+    return id + '\x01' + struct.pack('>Q', len(payload))[1:] + payload
+
+
+def mkv(title=None, date=None, cluster_first=False):
+    """Returns the header of a Matroska file with the given title and date,
+    in a segment of unknown size."""
+    fields = element('\x2a\xd7\xb1', '\x0f\x42\x40')
+    if title is not None:
+        fields += element('\x7b\xa9', title)
+    if date is not None:
+        d = date - datetime.datetime(2001, 1, 1)
+        ns = (d.days * 86400 + d.seconds) * 10 ** 9
+        fields += element('\x44\x61', struct.pack('>q', ns))
+    info = element('\x15\x49\xa9\x66', fields)
+    cluster = element('\x1f\x43\xb6\x75', 'c' * 100)
+    seeks = element('\x11\x4d\x9b\x74', 'x' * 30)
+    body = cluster_first and seeks + cluster + info or seeks + info + cluster
+    return (element('\x1a\x45\xdf\xa3', element('\x42\x82', 'matroska')) +
+            '\x18\x53\x80\x67\x01\xff\xff\xff\xff\xff\xff\xff' + body)
+
+
+def atom(type, payload):
+    return struct.pack('>I', 8 + len(payload)) + type + payload
+
+
+def mp4(title=None, day=None, moov_at_end=False):
+    """Returns an MP4 file with the given iTunes title and date."""
+    def data(v):
+        return atom('data', '\0\0\0\1' + '\0\0\0\0' + v)
+    fields = ''
+    if title is not None:
+        fields += atom('\xa9nam', data(title))
+    if day is not None:
+        fields += atom('\xa9day', data(day))
+    meta = atom('meta', '\0\0\0\0' + atom('hdlr', '\0' * 25) +
+                atom('ilst', fields))
+    moov = atom('moov', atom('mvhd', '\0' * 100) + atom('udta', meta))
+    mdat = atom('mdat', 'm' * 1000)
+    ftyp = atom('ftyp', 'isom\0\0\0\0')
+    return moov_at_end and ftyp + mdat + moov or ftyp + moov + mdat
+
+
+class ProbeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='imdbtag-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def probe(self, contents, name='movie.mkv'):
+        path = os.path.join(self.dir, name)
+        fh = open(path, 'wb')
+        fh.write(contents)
+        fh.close()
+        return probe.probe(path)
+
+    def test_mkv(self):
+        info = self.probe(mkv('Heat (1995)', datetime.datetime(2015, 6, 1)))
+        self.assertEqual(info, {'title': 'Heat (1995)', 'date': '2015-06-01'})
+
+    def test_mkv_without_title(self):
+        self.assertEqual(self.probe(mkv()), {})
+
+    def test_mkv_info_after_cluster(self):
+        self.assertEqual(self.probe(mkv('Heat', cluster_first=True)), {})
+
+    def test_mp4(self):
+        info = self.probe(mp4(' Fight Club ', '1999-10-15T00:00:00Z'),
+                          'movie.mp4')
+        self.assertEqual(info, {'title': 'Fight Club', 'year': '1999'})
+
+    def test_mp4_bad_date(self):
+        self.assertEqual(self.probe(mp4('Fight Club', 'unknown'), 'movie.mp4'),
+                         {'title': 'Fight Club'})
+
+    def test_mp4_moov_beyond_probe_size(self):
+        size = probe.probe_size
+        probe.probe_size = 1024
+        try:
+            info = self.probe(mp4('Fight Club', moov_at_end=True), 'movie.mp4')
+        finally:
+            probe.probe_size = size
+        self.assertEqual(info, {})
+        self.assertEqual(self.probe(mp4('Fight Club', moov_at_end=True),
+                                    'movie.mp4'), {'title': 'Fight Club'})
+
+    def test_junk_titles(self):
+        for title in ['www.Example.com', 'Visit https://example.org',
+                      'GROUP.to', ' -- ', '']:
+            self.assertEqual(self.probe(mkv(title)), {}, title)
+
+    def test_damaged_files(self):
+        self.assertEqual(self.probe(mkv('Heat')[:30]), {})
+        self.assertEqual(self.probe(''), {})
+        self.assertEqual(self.probe('\x1a\x45\xdf\xa3' + '\0' * 100), {})
+        # Random bytes never raise.
+        for i in range(20):
+            self.assertIsInstance(self.probe(os.urandom(5000)), dict)
+        self.assertEqual(probe.probe(os.path.join(self.dir, 'missing.mkv')),
+                         {})
+
+
+if __name__ == '__main__':
+    unittest.main()
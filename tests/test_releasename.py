@@ -0,0 +1,119 @@
+"""Tests of the release name parser (imdbtag/releasename.py)."""
+
+import os
+import sys
+import datetime
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'imdbtag'))
+import releasename
+
+try:
+    import PTN
+except ImportError:
+    PTN = None
+
+corpus_file = os.path.join(os.path.dirname(__file__), '..', 'benchmarks',
+                           'releasenames.txt')
+
+
+def corpus():
+    """Returns triples (name, title, year) of the names in releasenames.txt."""
+    out = []
+    fh = open(corpus_file, 'r')
+    for line in fh:
+        line = line.rstrip('\n')
+        if line and not line.startswith('#'):
+            name, title, year = line.split('\t')
+            out.append((name, title, year and int(year) or None))
+    fh.close()
+    return out
+
+
+def title_and_year(parse, name):
+    info = parse(name)
+    return info['title'], info.get('year')
+
+
+class CorpusTest(unittest.TestCase):
+
+    def test_corpus(self):
+        for name, title, year in corpus():
+            self.assertEqual(title_and_year(releasename._parse, name),
+                             (title, year), name)
+
+    @unittest.skipIf(PTN is None, 'PTN (parse-torrent-name) not installed')
+    def test_no_worse_than_ptn(self):
+        # Every name that PTN gets right, the parser gets right too.
+        for name, title, year in corpus():
+            if title_and_year(PTN.parse, name) == (title, year):
+                self.assertEqual(title_and_year(releasename._parse, name),
+                                 (title, year), name)
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_attribute_words_in_titles(self):
+        self.assertEqual(
+                title_and_year(releasename._parse,
+                               'The.Thin.Red.Line.1998.1080p'),
+                ('The Thin Red Line', 1998))
+        self.assertEqual(title_and_year(releasename._parse, 'Ts.2001'),
+                         ('Ts', 2001))
+        self.assertEqual(title_and_year(releasename._parse, 'R2.D2.2015'),
+                         ('R2 D2', 2015))
+        self.assertEqual(
+                title_and_year(releasename._parse, 'Hc.Andersen.2003'),
+                ('Hc Andersen', 2003))
+        self.assertEqual(title_and_year(releasename._parse, 'Ws Dts Line'),
+                         ('Ws Dts Line', None))
+
+    def test_attribute_words_after_year(self):
+        self.assertEqual(
+                title_and_year(releasename._parse, 'Avatar.2009.R5.LiNE'),
+                ('Avatar', 2009))
+        self.assertEqual(title_and_year(releasename._parse, 'Dune.720p.TS'),
+                         ('Dune', None))
+
+    def test_years(self):
+        self.assertEqual(title_and_year(releasename._parse, '1917.2019'),
+                         ('1917', 2019))
+        self.assertEqual(
+                title_and_year(releasename._parse,
+                               '2001.A.Space.Odyssey.1968.1080p'),
+                ('2001 A Space Odyssey', 1968))
+        future = str(datetime.date.today().year + 2)
+        self.assertEqual(
+                title_and_year(releasename._parse, 'Movie.' + future),
+                ('Movie ' + future, None))
+
+    def test_editions(self):
+        info = releasename._parse(
+                'Heat.1995.DIRECTORS.CUT.UNRATED.REMASTERED.TELESYNC.XviD')
+        for edition in ['dircut', 'unrated', 'remastered', 'telesync']:
+            self.assertTrue(info.get(edition), edition)
+        self.assertNotIn('dircut', releasename._parse('Heat.1995.XviD'))
+
+    def test_episodes(self):
+        info = releasename._parse('Some.Show.S02E05.720p.HDTV.x264')
+        self.assertEqual((info['title'], info['season'], info['episode']),
+                         ('Some Show', 2, 5))
+
+    def test_website_prefix(self):
+        self.assertEqual(
+                title_and_year(releasename._parse,
+                               '[ www.Example.com ] - Heat.1995.720p'),
+                ('Heat', 1995))
+
+    def test_underscores(self):
+        self.assertEqual(
+                title_and_year(releasename._parse, 'Kill_Bill_Vol_1_2003'),
+                ('Kill Bill Vol 1', 2003))
+
+    def test_memoized(self):
+        name = 'Memo.Test.2004.DVDRip'
+        self.assertIs(releasename.parse(name), releasename.parse(name))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""Tests of the time-budgeted schedule (imdbtag/schedule.py)."""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'imdbtag'))
+import schedule
+
+
+class ScheduleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.lib = tempfile.mkdtemp(prefix='imdbtag-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.lib)
+
+    def entry(self, name, mtime):
+        """Creates the directory ``name`` with a movie file of the time
+        ``mtime``."""
+        d = os.path.join(self.lib, name)
+        os.mkdir(d)
+        f = os.path.join(d, 'movie.mkv')
+        open(f, 'w').close()
+        os.utime(f, (mtime, mtime))
+
+    def entries(self):
+        return [f for f in os.listdir(self.lib) if f != schedule.state_file]
+
+    def run_schedule(self, count=None):
+        """Processes up to ``count`` entries and saves the state; returns the
+        entries processed."""
+        plan = schedule.Schedule(self.lib, self.entries(), 3600)
+        done = []
+        it = iter(plan)
+        for f in it:
+            done.append(f)
+            if len(done) == count:
+                # The schedule notes that an entry is done when the next one
+                # is asked for, as at the deadline.
+                next(it, None)
+                break
+        plan.finish()
+        return done
+
+    def test_newest_first(self):
+        self.entry('a', 1000)
+        self.entry('b', 3000)
+        self.entry('c', 2000)
+        self.assertEqual(self.run_schedule(), ['b', 'c', 'a'])
+
+    def test_same_time(self):
+        # Entries of the same time are in descending order of their names,
+        # the order of the cursor.
+        for name in ['a', 'b', 'c', 'd']:
+            self.entry(name, 1000)
+        self.assertEqual(self.run_schedule(2), ['d', 'c'])
+        self.assertEqual(self.run_schedule(), ['b', 'a', 'd', 'c'])
+
+    def test_backlog(self):
+        for i, name in enumerate(['a', 'b', 'c', 'd', 'e']):
+            self.entry(name, 1000 + i)
+        self.assertEqual(self.run_schedule(2), ['e', 'd'])
+        self.assertEqual(self.run_schedule(2), ['c', 'b'])
+        # The rest of the backlog, then a new pass.
+        self.assertEqual(self.run_schedule(), ['a', 'e', 'd', 'c', 'b'])
+        self.assertEqual(self.run_schedule(1), ['e'])
+
+    def test_fresh_entries(self):
+        self.entry('a', 1000)
+        self.entry('b', 2000)
+        self.assertEqual(self.run_schedule(1), ['b'])
+        self.entry('new', time.time() + 60)
+        self.assertEqual(self.run_schedule(), ['new', 'a', 'b'])
+
+    def test_tagging_files_are_not_fresh(self):
+        self.entry('a', 1000)
+        self.entry('b', 2000)
+        self.assertEqual(self.run_schedule(1), ['b'])
+        # Tagging b changes the time of its directory, not of its files.
+        open(os.path.join(self.lib, 'b', '.name'), 'w').close()
+        os.utime(os.path.join(self.lib, 'b'), None)
+        self.assertEqual(self.run_schedule(), ['a', 'b'])
+
+    def test_entry_mtime(self):
+        self.entry('a', 1000)
+        tagging = os.path.join(self.lib, 'a', '.imdb')
+        open(tagging, 'w').close()
+        os.utime(tagging, (5000, 5000))
+        self.assertEqual(schedule.entry_mtime(os.path.join(self.lib, 'a')),
+                         1000)
+        os.mkdir(os.path.join(self.lib, 'empty'))
+        os.utime(os.path.join(self.lib, 'empty'), (3000, 3000))
+        self.assertEqual(
+                schedule.entry_mtime(os.path.join(self.lib, 'empty')), 3000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""Tests of the confidence scores of search results (imdbtag/scoring.py)."""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'imdbtag'))
+import scoring
+from apis.movie import Movie
+
+
+def movie(title, year, id='1', popularity=0.0):
+    return Movie(title, year, '', id, '', '', popularity=popularity)
+
+
+class RankTest(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertEqual(scoring.rank('Heat', '1995', []), [])
+
+    def test_best_first(self):
+        a = movie('Heated', '1995', '1')
+        b = movie('Heat', '1995', '2')
+        ranked = scoring.rank('Heat', '1995', [a, b])
+        self.assertEqual([m.id for c, m in ranked], ['2', '1'])
+        self.assertTrue(ranked[0][0] > ranked[1][0])
+
+    def test_confidences_below_one(self):
+        ranked = scoring.rank('Heat', '1995', [movie('Heat', '1995', '1'),
+                                               movie('Heat', '1986', '2')])
+        total = sum(c for c, m in ranked)
+        self.assertTrue(0 < total < 1)
+
+    def test_year(self):
+        right = scoring.score('Heat', '1995', movie('Heat', '1995'))
+        close = scoring.score('Heat', '1995', movie('Heat', '1996'))
+        wrong = scoring.score('Heat', '1995', movie('Heat', '1986'))
+        none = scoring.score('Heat', None, movie('Heat', '1986'))
+        self.assertTrue(right > close > none > wrong)
+
+    def test_no_release_date(self):
+        self.assertEqual(scoring.score('Heat', '1995', movie('Heat', '')),
+                         scoring.score('Heat', None, movie('Heat', '')))
+
+    def test_ties_keep_search_order(self):
+        a = movie('Heat', '1995', '1')
+        b = movie('Heat', '1995', '2')
+        self.assertEqual([m.id for c, m in scoring.rank('Heat', None, [a, b])],
+                         ['1', '2'])
+
+    def test_popularity_breaks_ties(self):
+        a = movie('Heat', '1986', '1', popularity=1.0)
+        b = movie('Heat', '1995', '2', popularity=50.0)
+        self.assertEqual(scoring.rank('Heat', None, [a, b])[0][1].id, '2')
+
+    def test_other_title(self):
+        m = Movie('Le Fabuleux Destin', '2001', '', '1', '', '',
+                  other_title='Amelie')
+        self.assertEqual(scoring.rank('Amelie', '2001', [m])[0][1].id, '1')
+        self.assertTrue(scoring.score('Amelie', '2001', m) >
+                        scoring.score('Destin', '2001', m))
+
+
+class AcceptableTest(unittest.TestCase):
+
+    def accept(self, q, year, results, threshold=0.9):
+        return scoring.acceptable(q, year, scoring.rank(q, year, results),
+                                  threshold)
+
+    def test_nothing(self):
+        self.assertFalse(scoring.acceptable('Heat', None, [], 0.9))
+
+    def test_year_agrees(self):
+        self.assertTrue(self.accept('Heat', '1995', [movie('Heat', '1995')]))
+        self.assertTrue(self.accept('Heat', '1995', [movie('Heat', '1996')]))
+
+    def test_single_result_without_year(self):
+        # The search may have missed the remake.
+        ranked = scoring.rank('Heat', None, [movie('Heat', '1995')])
+        self.assertTrue(ranked[0][0] >= 0.9)
+        self.assertFalse(scoring.acceptable('Heat', None, ranked, 0.9))
+
+    def test_single_result_of_other_year(self):
+        self.assertFalse(self.accept('The Thing', '2011',
+                                     [movie('The Thing', '1982')], 0.5))
+
+    def test_margin_over_runner_up(self):
+        self.assertTrue(self.accept('Heat', None,
+                                    [movie('Heat', '1995', '1'),
+                                     movie('Hot Pursuit', '1987', '2')]))
+        self.assertFalse(self.accept('Heat', None,
+                                     [movie('Heat', '1995', '1'),
+                                      movie('Heat', '1986', '2')], 0.0))
+
+    def test_threshold(self):
+        ranked = scoring.rank('Heat', '1995', [movie('Heat', '1995')])
+        self.assertFalse(scoring.acceptable('Heat', '1995', ranked,
+                                            ranked[0][0] + 0.001))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+"""Tests of the local title index (imdbtag/apis/trigram.py)."""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'imdbtag'))
+from apis import trigram
+
+basics = [
+    ['tt0137523', 'movie', 'Fight Club', 'Fight Club', '1999'],
+    ['tt0211915', 'movie', 'Amelie', 'Le fabuleux destin d\'Amelie Poulain',
+     '2001'],
+    ['tt0113277', 'movie', 'Heat', 'Heat', '1995'],
+    ['tt0090142', 'movie', 'Heat', 'Heat', '1986'],
+    ['tt0903747', 'tvSeries', 'Breaking Bad', 'Breaking Bad', '2008'],
+    ['tt0000001', 'short', 'Carmencita', 'Carmencita', '1894'],
+    ['tt10872600', 'movie', 'Spider-Man: No Way Home',
+     'Spider-Man: No Way Home', '\\N'],
+    ]
+
+
+class TrigramsTest(unittest.TestCase):
+
+    def test_padding(self):
+        self.assertEqual(trigram.trigrams('Up'),
+                         set([u'  u', u' up', u'up ']))
+
+    def test_words_and_case(self):
+        self.assertEqual(trigram.trigrams('UP, up!'), trigram.trigrams('up'))
+
+    def test_utf8(self):
+        self.assertIn(u' \xe9t', trigram.trigrams('\xc3\x89t\xc3\xa9'))
+
+
+class TrigramIndexTest(unittest.TestCase):
+
+    def test_search(self):
+        index = trigram.TrigramIndex()
+        index.add('The Matrix', 0)
+        index.add('Matrix Reloaded', 1)
+        index.add('Heat', 2)
+        r = index.search('The Matrix')
+        self.assertEqual([doc for score, doc in r], [0, 1])
+        self.assertEqual(r[0][0], 1.0)
+        self.assertEqual(index.search('Nothing Alike'), [])
+
+    def test_documents_with_several_titles(self):
+        index = trigram.TrigramIndex()
+        index.add('Amelie', 0)
+        index.add('Le fabuleux destin', 0)
+        index.add('Amelia', 1)
+        self.assertEqual(len(index), 3)
+        r = index.search('Amelie')
+        # Each document once, with the score of its best title.
+        self.assertEqual([doc for score, doc in r], [0, 1])
+        self.assertEqual(r[0][0], 1.0)
+        self.assertEqual(index.search('Le Fabuleux Destin')[0], (1.0, 0))
+
+    def test_limit_and_threshold(self):
+        index = trigram.TrigramIndex()
+        for i in range(10):
+            index.add('Movie %d' % i, i)
+        self.assertEqual(len(index.search('Movie', limit=3)), 3)
+        self.assertEqual(index.search('Movie 1', threshold=0.99),
+                         [(1.0, 1)])
+
+
+class TitlesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='imdbtag-test-')
+        path = os.path.join(self.dir, 'title.basics.tsv')
+        fh = open(path, 'w')
+        fh.write('tconst\ttitleType\tprimaryTitle\toriginalTitle\tisAdult\t'
+                 'startYear\tendYear\truntimeMinutes\tgenres\n')
+        for tconst, kind, title, original, year in basics:
+            fh.write('\t'.join([tconst, kind, title, original, '0', year,
+                                '\\N', '90', 'Drama']) + '\n')
+        fh.close()
+        self.titles = trigram.load_title_basics(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_load(self):
+        # Shorts are left out.
+        self.assertEqual(len(self.titles), 6)
+        self.assertEqual(self.titles.movie(1), {
+            'id': 'tt0211915',
+            'title': 'Amelie',
+            'original_title': 'Le fabuleux destin d\'Amelie Poulain',
+            'release_date': '2001',
+            'kind': 'movie',
+            })
+        m = self.titles.movie(5)
+        self.assertEqual((m['id'], m['release_date'], m['original_title']),
+                         ('tt10872600', '', 'Spider-Man: No Way Home'))
+
+    def test_original_title(self):
+        r = self.titles.search('Le Fabuleux Destin d Amelie Poulain')
+        self.assertEqual(r[0][1]['id'], 'tt0211915')
+        self.assertEqual(len([m for s, m in self.titles.search('Amelie')
+                              if m['id'] == 'tt0211915']), 1)
+
+    def test_local_movies(self):
+        best = trigram.LocalMovies(self.titles,
+                                   {'title': 'Fight Club', 'year': 1999})
+        self.assertEqual(best.get_best_match()[1]['id'], 'tt0137523')
+        self.assertEqual(best.get_total_results(), 1)
+
+    def test_year_reranks(self):
+        for year, id in [(1995, 'tt0113277'), (1986, 'tt0090142')]:
+            matches = trigram.LocalMovies(
+                    self.titles, {'title': 'Heat', 'year': year}
+                    ).get_ordered_matches()
+            self.assertEqual(matches[0][1]['id'], id)
+            self.assertTrue(matches[0][0] > matches[1][0])
+
+    def test_series(self):
+        m = trigram.LocalMovies(
+                self.titles, {'title': 'Breaking Bad', 'season': 1}
+                ).get_best_match()
+        self.assertEqual(m[1]['kind'], 'tvSeries')
+
+    def test_no_match(self):
+        self.assertIsNone(trigram.LocalMovies(
+                self.titles, {'title': 'Zzyzx'}).get_best_match())
+
+    def test_to_movie(self):
+        m = trigram.to_movie(self.titles.movie(1), 194)
+        self.assertEqual((m.id, m.imdb_id, m.title, m.other_title),
+                         ('194', 'tt0211915',
+                          'Le fabuleux destin d\'Amelie Poulain', 'Amelie'))
+
+
+if __name__ == '__main__':
+    unittest.main()